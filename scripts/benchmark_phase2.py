@@ -0,0 +1,95 @@
+﻿import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+from classifier_pipeline.benchmark import (
+    CASES,
+    DEFAULT_FIXTURE_DIR,
+    DEFAULT_RESULTS_PATH,
+    DEFAULT_SCALES,
+    append_results,
+    ensure_fixture,
+    git_revision,
+    load_results,
+    previous_result,
+    run_case,
+    run_case_isolated,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark Phase 2 extraction and Phase 1 childes-db queries on a synthetic SQLite fixture"
+    )
+    parser.add_argument(
+        "--scales",
+        nargs="+",
+        type=int,
+        default=list(DEFAULT_SCALES),
+        help="Fixture sizes in tokens (e.g. 100000 1000000 10000000)",
+    )
+    parser.add_argument(
+        "--cases",
+        nargs="+",
+        choices=CASES,
+        default=list(CASES),
+        help="Benchmark cases to run",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=13,
+        help="Random seed for the synthetic fixture",
+    )
+    parser.add_argument(
+        "--fixture-dir",
+        default=str(DEFAULT_FIXTURE_DIR),
+        help="Directory for cached fixture databases",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="reports/benchmarks/output",
+        help="Directory for the CSVs written by the extraction case",
+    )
+    parser.add_argument(
+        "--results-path",
+        default=str(DEFAULT_RESULTS_PATH),
+        help="JSONL file the results are appended to",
+    )
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Run cases in this process (faster, but peak RSS then covers every earlier case)",
+    )
+
+    args = parser.parse_args()
+    results_path = Path(args.results_path)
+    history = load_results(results_path)
+    revision = git_revision(ROOT)
+    run = run_case if args.in_process else run_case_isolated
+
+    results = []
+    for tokens in args.scales:
+        fixture = ensure_fixture(Path(args.fixture_dir), tokens, args.seed)
+        for case in args.cases:
+            result = run(case, fixture, tokens, Path(args.output_dir))
+            results.append(result)
+            line = (
+                f"{case} tokens={tokens} rows={result.rows} seconds={result.seconds} "
+                f"rows_per_second={result.rows_per_second} first_row_seconds={result.first_row_seconds} "
+                f"peak_rss_mb={result.peak_rss_mb}"
+            )
+            previous = previous_result(history, case, tokens, revision)
+            if previous and previous.get("seconds"):
+                line += f" vs {previous['git']}: {result.seconds / previous['seconds']:.2f}x time"
+            print(line)
+
+    append_results(results_path, results, revision)
+    print(f"results_path={results_path} git={revision}")
+
+
+if __name__ == "__main__":
+    main()
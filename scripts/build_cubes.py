@@ -0,0 +1,54 @@
+﻿import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+from classifier_pipeline.cubes import build_cubes, write_cubes
+from classifier_pipeline.parallel_csv import read_table
+from classifier_pipeline.phase3_sampling import iter_rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-aggregate Phase 2/3 outputs into the cubes behind the website profile")
+    parser.add_argument(
+        "--phase2-path",
+        default="reports/phase2/phase2_extraction.csv",
+        help="Phase 2 extraction CSV (read once, streamed)",
+    )
+    parser.add_argument(
+        "--phase3-path",
+        default=None,
+        help="Optional Phase 3 results CSV joined on utterance_id/classifier_token_order for overuse and nouns",
+    )
+    parser.add_argument(
+        "--output-path",
+        default="website/data/profile_cubes.json",
+        help="Cube file read by website/profiling.qmd",
+    )
+    parser.add_argument(
+        "--read-workers",
+        type=int,
+        default=1,
+        help="Parse the Phase 2 CSV in this many processes into columns instead of streaming it",
+    )
+
+    args = parser.parse_args()
+
+    annotations = iter_rows(Path(args.phase3_path)) if args.phase3_path else None
+    if args.read_workers > 1:
+        rows = read_table(Path(args.phase2_path), workers=args.read_workers).rows()
+    else:
+        rows = iter_rows(Path(args.phase2_path))
+    cubes = build_cubes(rows, annotations)
+    sources = {"phase2": args.phase2_path}
+    if args.phase3_path:
+        sources["phase3"] = args.phase3_path
+    write_cubes(Path(args.output_path), cubes, sources)
+    summary = cubes["summary"]
+    print(f"rows={summary['rows']} annotated_rows={summary['annotated_rows']} output={args.output_path}")
+
+
+if __name__ == "__main__":
+    main()
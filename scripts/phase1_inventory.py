@@ -6,6 +6,7 @@ from pathlib import Path
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT / "src"))
 
+from classifier_pipeline import instrumentation
 from classifier_pipeline.phase1_inventory import (
     DEFAULT_LANGUAGE_FILTER,
     run_phase1_inventory,
@@ -52,24 +53,26 @@ def main() -> None:
         default=DEFAULT_CLASSIFIERS,
         help="Classifier tokens to count",
     )
+    instrumentation.add_arguments(parser)
 
     args = parser.parse_args()
 
-    if args.source == "talkbank":
-        sections = set(args.sections) if args.sections else None
-        rows = run_phase1_inventory(
-            output_dir=args.output_dir,
-            classifiers=args.classifiers,
-            sections=sections,
-        )
-    else:
-        languages = args.languages or list(DEFAULT_LANGUAGE_FILTER)
-        rows = run_phase1_inventory_db(
-            output_dir=args.output_dir,
-            classifiers=args.classifiers,
-            languages=languages,
-            db_name=args.db_name,
-        )
+    with instrumentation.session("phase1_inventory", args.timing_report, args.profile, args.profile_path):
+        if args.source == "talkbank":
+            sections = set(args.sections) if args.sections else None
+            rows = run_phase1_inventory(
+                output_dir=args.output_dir,
+                classifiers=args.classifiers,
+                sections=sections,
+            )
+        else:
+            languages = args.languages or list(DEFAULT_LANGUAGE_FILTER)
+            rows = run_phase1_inventory_db(
+                output_dir=args.output_dir,
+                classifiers=args.classifiers,
+                languages=languages,
+                db_name=args.db_name,
+            )
 
     print(json.dumps({"rows": len(rows), "output_dir": args.output_dir}, ensure_ascii=False))
 
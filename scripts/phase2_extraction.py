@@ -5,6 +5,8 @@ from pathlib import Path
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT / "src"))
 
+from classifier_pipeline import instrumentation
+from classifier_pipeline.artifact_io import COMPRESSIONS, resolve_artifact, with_compression
 from classifier_pipeline.phase2_extraction import (
     DEFAULT_CLASSIFIERS,
     DEFAULT_COLLECTIONS,
@@ -62,32 +64,47 @@ def main() -> None:
         default=list(DEFAULT_COLLECTIONS),
         help="Collection names to include (defaults to Chinese)",
     )
+    parser.add_argument(
+        "--compression",
+        choices=COMPRESSIONS,
+        default="none",
+        help="Compress the outputs (adds .gz / .zst to the paths); readers detect it automatically",
+    )
+    parser.add_argument(
+        "--max-part-mb",
+        type=float,
+        default=None,
+        help="Split the extraction into part files of about this many MB on disk, listed in <output>.manifest.json",
+    )
     parser.add_argument(
         "--db-name",
         default=None,
         help="Childes-db version (defaults to current)",
     )
+    instrumentation.add_arguments(parser)
 
     args = parser.parse_args()
-    output_path = Path(args.output_path)
+    output_path = with_compression(Path(args.output_path), args.compression)
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    rejected_output_path = Path(args.rejected_output_path)
+    rejected_output_path = with_compression(Path(args.rejected_output_path), args.compression)
     rejected_output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    rows_written = write_phase2_csv(
-        output_path=str(output_path),
-        classifiers=args.classifiers,
-        include_langs=args.include_langs,
-        exclude_langs=args.exclude_langs,
-        include_collections=args.include_collections,
-        rejected_output_path=str(rejected_output_path) if args.rejected_sample_size > 0 else None,
-        rejected_sample_size=args.rejected_sample_size,
-        rejected_seed=args.rejected_seed,
-        db_name=args.db_name,
-    )
+    with instrumentation.session("phase2_extraction", args.timing_report, args.profile, args.profile_path):
+        rows_written = write_phase2_csv(
+            output_path=str(output_path),
+            classifiers=args.classifiers,
+            include_langs=args.include_langs,
+            exclude_langs=args.exclude_langs,
+            include_collections=args.include_collections,
+            rejected_output_path=str(rejected_output_path) if args.rejected_sample_size > 0 else None,
+            rejected_sample_size=args.rejected_sample_size,
+            rejected_seed=args.rejected_seed,
+            db_name=args.db_name,
+            max_part_bytes=int(args.max_part_mb * 1024 * 1024) if args.max_part_mb else None,
+        )
 
-    print(f"rows_written={rows_written}")
+    print(f"rows_written={rows_written} output_path={resolve_artifact(output_path)}")
 
 
 if __name__ == "__main__":
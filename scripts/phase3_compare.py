@@ -0,0 +1,100 @@
+﻿import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+from classifier_pipeline.phase3_compare import (
+    AGREEMENT_FIELDS,
+    KAPPA_FIELDS,
+    compare_runs,
+    confusion_table,
+    diff_rows,
+    write_confusion,
+    write_report,
+)
+from classifier_pipeline.phase3_review import load_result_runs
+from classifier_pipeline.phase3_sampling import write_rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Agreement, kappa and confusion tables across Phase 3 result files")
+    parser.add_argument(
+        "--results",
+        nargs="+",
+        required=True,
+        help="Phase 3 result CSVs (two or more); runs are named by file stem",
+    )
+    parser.add_argument(
+        "--output-path",
+        default="reports/phase3/phase3_compare.json",
+        help="Path to the JSON agreement report",
+    )
+    parser.add_argument(
+        "--fields",
+        nargs="*",
+        default=list(AGREEMENT_FIELDS),
+        help="Fields to compare",
+    )
+    parser.add_argument(
+        "--kappa-fields",
+        nargs="*",
+        default=list(KAPPA_FIELDS),
+        help="Fields to compute Cohen's (pairwise) and Fleiss' (all runs) kappa for",
+    )
+    parser.add_argument(
+        "--confusion-field",
+        default="overuse_of_ge",
+        help="Field for the confusion table between the first two runs",
+    )
+    parser.add_argument(
+        "--confusion-path",
+        default=None,
+        help="Optional CSV path for the confusion table",
+    )
+    parser.add_argument(
+        "--diff-path",
+        default=None,
+        help="Optional CSV of rows the runs disagree on, with each run's values",
+    )
+
+    args = parser.parse_args()
+    if len(args.results) < 2:
+        parser.error("--results needs at least two files")
+
+    try:
+        runs = load_result_runs([Path(path) for path in args.results])
+    except ValueError as exc:
+        parser.error(str(exc))
+    report = compare_runs(runs, fields=args.fields, kappa_fields=args.kappa_fields)
+
+    left, right = list(runs)[:2]
+    table = confusion_table(runs, left, right, args.confusion_field)
+    report["confusion"] = {
+        "field": args.confusion_field,
+        "left": left,
+        "right": right,
+        "counts": [[a, b, count] for (a, b), count in sorted(table.items())],
+    }
+    write_report(Path(args.output_path), report)
+    if args.confusion_path:
+        write_confusion(Path(args.confusion_path), table, left, right)
+
+    diffs = 0
+    if args.diff_path:
+        rows = list(diff_rows(runs, fields=args.fields))
+        diffs = len(rows)
+        if rows:
+            write_rows(Path(args.diff_path), rows)
+
+    for stats in report["fields"]:
+        line = f"{stats['field']}: agreement={stats['agreement_all_runs']}"
+        if stats["fleiss_kappa"] is not None:
+            line += f" fleiss_kappa={stats['fleiss_kappa']}"
+        print(line)
+    print(f"rows_all_runs={report['rows_all_runs']} rows_any_run={report['rows_any_run']} diff_rows={diffs}")
+
+
+if __name__ == "__main__":
+    main()
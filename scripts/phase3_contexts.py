@@ -0,0 +1,75 @@
+﻿import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+from classifier_pipeline.columns import ANNOTATED_HEADERS
+from classifier_pipeline.phase3_contexts import (
+    CONTEXT_HEADERS,
+    MAPPING_HEADERS,
+    compact_rows,
+    expand_annotations,
+    write_csv,
+)
+from classifier_pipeline.phase3_sampling import iter_rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Collapse Phase 2 rows to unique contexts and expand annotations back")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compact = subparsers.add_parser("compact", help="Write the unique-context table and row mapping")
+    compact.add_argument(
+        "--input-path",
+        default="reports/phase2/phase2_extraction.csv",
+        help="Path to Phase 2 CSV",
+    )
+    compact.add_argument(
+        "--contexts-path",
+        default="reports/phase2/phase2_contexts.csv",
+        help="Path for the unique-context CSV",
+    )
+    compact.add_argument(
+        "--mapping-path",
+        default="reports/phase2/phase2_context_map.csv",
+        help="Path for the row -> context mapping CSV",
+    )
+
+    expand = subparsers.add_parser("expand", help="Join context annotations back onto all rows")
+    expand.add_argument(
+        "--input-path",
+        default="reports/phase2/phase2_extraction.csv",
+        help="Path to Phase 2 CSV",
+    )
+    expand.add_argument(
+        "--annotations-path",
+        required=True,
+        help="Phase 3 output produced from the context table",
+    )
+    expand.add_argument(
+        "--output-path",
+        default="reports/phase3/phase3_full_results.csv",
+        help="Path to the expanded output CSV",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        contexts, mapping = compact_rows(iter_rows(Path(args.input_path)))
+        write_csv(Path(args.contexts_path), CONTEXT_HEADERS, contexts)
+        write_csv(Path(args.mapping_path), MAPPING_HEADERS, mapping)
+        print(f"rows={len(mapping)} contexts={len(contexts)}")
+        return
+
+    expanded, missing = expand_annotations(
+        iter_rows(Path(args.input_path)),
+        iter_rows(Path(args.annotations_path)),
+    )
+    write_csv(Path(args.output_path), ANNOTATED_HEADERS, expanded)
+    print(f"rows_written={len(expanded)} missing_annotations={missing}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+﻿import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+from classifier_pipeline.phase3_daemon import PRIORITY_CLASSES, AnnotationDaemon, submit_job
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Phase 3 annotation daemon with a shared rate limit and priority classes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="Run the daemon and process queued jobs")
+    serve.add_argument(
+        "--queue-dir",
+        default="reports/phase3/queue",
+        help="Directory holding pending/running/done/failed job specs",
+    )
+    serve.add_argument(
+        "--env-path",
+        default=".env",
+        help="Path to .env file",
+    )
+    serve.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=10,
+        help="Total concurrent requests shared by all jobs",
+    )
+    serve.add_argument(
+        "--reserved-slots",
+        type=int,
+        default=1,
+        help="Slots that never run bulk rows, kept free for interactive/normal jobs",
+    )
+    serve.add_argument(
+        "--poll-seconds",
+        type=float,
+        default=2.0,
+        help="How often to look for new jobs",
+    )
+    serve.add_argument(
+        "--until-idle",
+        action="store_true",
+        help="Exit once no job is pending or running",
+    )
+
+    submit = subparsers.add_parser("submit", help="Queue a job for a running daemon")
+    submit.add_argument(
+        "--queue-dir",
+        default="reports/phase3/queue",
+        help="Directory holding pending/running/done/failed job specs",
+    )
+    submit.add_argument(
+        "--input-path",
+        required=True,
+        help="Path to the CSV to annotate",
+    )
+    submit.add_argument(
+        "--output-path",
+        required=True,
+        help="Path to output CSV",
+    )
+    submit.add_argument(
+        "--priority",
+        choices=PRIORITY_CLASSES,
+        default="normal",
+        help="Priority class (interactive rows are always served first)",
+    )
+    submit.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Number of rows to process (default: all)",
+    )
+    submit.add_argument(
+        "--fast-path",
+        action="store_true",
+        help="Resolve deterministic OMITTED rows without the LLM",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        daemon = AnnotationDaemon(
+            Path(args.queue_dir),
+            env_path=Path(args.env_path),
+            max_concurrent=args.max_concurrent,
+            reserved_slots=args.reserved_slots,
+        )
+        daemon.serve(poll_seconds=args.poll_seconds, until_idle=args.until_idle)
+        return
+
+    job_id = submit_job(
+        Path(args.queue_dir),
+        Path(args.input_path),
+        Path(args.output_path),
+        priority=args.priority,
+        limit=args.limit,
+        fast_path=args.fast_path,
+    )
+    print(f"job_id={job_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,11 @@ ROOT = Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT / "src"))
 
 from classifier_pipeline.phase3_sampling import (
+    iter_rows,
     read_rows,
     select_focus_samples,
     select_random_samples,
+    select_stratified_samples,
     write_rows,
 )
 
@@ -43,6 +45,18 @@ def main() -> None:
         default=10,
         help="Maximum number of flower examples",
     )
+    parser.add_argument(
+        "--priority-terms",
+        nargs="*",
+        default=None,
+        help="Terms drawn first, bounded by --flower-min/--flower-max (defaults to 花)",
+    )
+    parser.add_argument(
+        "--focus-terms",
+        nargs="*",
+        default=None,
+        help="Terms sampled once each after the priority terms (defaults to FOCUS_NOUNS)",
+    )
     parser.add_argument(
         "--seed",
         type=int,
@@ -51,14 +65,43 @@ def main() -> None:
     )
     parser.add_argument(
         "--mode",
-        choices=["focus", "random"],
+        choices=["focus", "random", "stratified"],
         default="focus",
         help="Sampling mode",
     )
+    parser.add_argument(
+        "--strata",
+        nargs="*",
+        default=["Classifier"],
+        help="Stratum columns for stratified mode (any column, or age_band / corpus)",
+    )
+    parser.add_argument(
+        "--per-stratum",
+        type=int,
+        default=5,
+        help="Rows drawn per stratum in stratified mode",
+    )
+    parser.add_argument(
+        "--read-workers",
+        type=int,
+        default=1,
+        help="Processes used to parse the input CSV in focus and random modes",
+    )
 
     args = parser.parse_args()
 
-    rows = read_rows(Path(args.input_path))
+    if args.mode == "stratified":
+        sample = select_stratified_samples(
+            iter_rows(Path(args.input_path)),
+            strata=args.strata,
+            per_stratum=args.per_stratum,
+            seed=args.seed,
+        )
+        write_rows(Path(args.output_path), sample)
+        print(f"rows_written={len(sample)}")
+        return
+
+    rows = read_rows(Path(args.input_path), workers=args.read_workers)
     if args.mode == "random":
         sample = select_random_samples(rows, total=args.total, seed=args.seed)
     else:
@@ -68,6 +111,8 @@ def main() -> None:
             flower_min=args.flower_min,
             flower_max=args.flower_max,
             seed=args.seed,
+            focus_terms=args.focus_terms,
+            priority_terms=args.priority_terms,
         )
     write_rows(Path(args.output_path), sample)
     print(f"rows_written={len(sample)}")
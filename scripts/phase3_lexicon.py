@@ -0,0 +1,59 @@
+﻿import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+from classifier_pipeline.phase3_lexicon import NounLexicon
+from classifier_pipeline.phase3_sampling import iter_rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the noun -> conventional classifier lexicon from Phase 3 results")
+    parser.add_argument(
+        "--results",
+        nargs="+",
+        required=True,
+        help="Annotated Phase 3 result CSVs",
+    )
+    parser.add_argument(
+        "--output-path",
+        default="reports/phase3/noun_lexicon.csv",
+        help="Path to the lexicon CSV (rebuilt from --results; see --merge)",
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="Add --results to the existing lexicon instead of rebuilding it; only for results it has not counted yet",
+    )
+    parser.add_argument(
+        "--min-count",
+        type=int,
+        default=3,
+        help="Annotations needed before a noun can be settled",
+    )
+    parser.add_argument(
+        "--min-agreement",
+        type=float,
+        default=0.9,
+        help="Share of annotations the top classifier needs for a noun to be settled",
+    )
+
+    args = parser.parse_args()
+
+    output_path = Path(args.output_path)
+    lexicon = NounLexicon(min_count=args.min_count, min_agreement=args.min_agreement)
+    # Rebuilding is the default: results already counted (by an earlier build or by the
+    # pilot's own --lexicon-path updates) would otherwise be counted twice.
+    if args.merge and output_path.exists():
+        lexicon.load(output_path)
+    for path in args.results:
+        lexicon.update_from_rows(iter_rows(Path(path)))
+    lexicon.save(output_path)
+    settled = sum(1 for row in lexicon.export_rows() if row["settled"])
+    print(f"nouns={len(lexicon)} settled={settled}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 ﻿import argparse
+import json
 import os
 import sys
 from pathlib import Path
@@ -6,7 +7,18 @@ from pathlib import Path
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT / "src"))
 
+from classifier_pipeline import instrumentation
+from classifier_pipeline.phase3_cache import PromptUsage
+from classifier_pipeline.phase3_cascade import CascadeConfig, CascadeTier, cascade_report_path
+from classifier_pipeline.phase3_hedging import HedgePolicy
 from classifier_pipeline.phase3_pilot import run_pilot
+from classifier_pipeline.phase3_scheduler import (
+    PRIORITY_CHOICES,
+    RunBudget,
+    TokenPrices,
+    failures_path_for,
+    state_path_for,
+)
 
 
 def main() -> None:
@@ -25,7 +37,13 @@ def main() -> None:
         "--limit",
         type=int,
         default=20,
-        help="Number of rows to process",
+        help="Number of rows to process (0 = all)",
+    )
+    parser.add_argument(
+        "--read-workers",
+        type=int,
+        default=1,
+        help="Processes used to parse the whole input CSV when --limit is 0",
     )
     parser.add_argument(
         "--env-path",
@@ -47,6 +65,133 @@ def main() -> None:
         default=None,
         help="Override base URL",
     )
+    parser.add_argument(
+        "--fast-path",
+        action="store_true",
+        help="Resolve deterministic OMITTED rows without the LLM and fix classifier-determined fields",
+    )
+    parser.add_argument(
+        "--lexicon-path",
+        default=None,
+        help="Noun -> conventional classifier lexicon CSV to load, grow and save during the run",
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="Issue a duplicate request for rows slower than the run's latency percentile",
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        default=0.95,
+        help="Latency percentile after which a row is hedged",
+    )
+    parser.add_argument(
+        "--hedge-budget",
+        type=float,
+        default=0.05,
+        help="Maximum fraction of rows that may be hedged",
+    )
+    parser.add_argument(
+        "--lanes",
+        action="store_true",
+        help="Load-balance over OPENROUTER_MODELS x OPENROUTER_API_KEYS lanes",
+    )
+    parser.add_argument(
+        "--lane-models",
+        nargs="*",
+        default=None,
+        help="Models to spread rows over (implies --lanes; overrides OPENROUTER_MODELS)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream responses and stop reading once the JSON answer is complete",
+    )
+    parser.add_argument(
+        "--request-log",
+        default=None,
+        help="Append per-row latency / time-to-first-token JSON lines to this file",
+    )
+    parser.add_argument(
+        "--prompt-cache",
+        action="store_true",
+        help="Group rows by prompt prefix, mark the system prompt cacheable and report cached-token ratio",
+    )
+    parser.add_argument(
+        "--max-cost",
+        type=float,
+        default=None,
+        help="Stop starting rows once projected spend (USD) would exceed this",
+    )
+    parser.add_argument(
+        "--max-minutes",
+        type=float,
+        default=None,
+        help="Stop starting rows that would not finish within this many minutes",
+    )
+    parser.add_argument(
+        "--price-prompt",
+        type=float,
+        default=None,
+        help="USD per million prompt tokens, used when the provider does not report cost",
+    )
+    parser.add_argument(
+        "--price-completion",
+        type=float,
+        default=None,
+        help="USD per million completion tokens, used when the provider does not report cost",
+    )
+    parser.add_argument(
+        "--price-cached",
+        type=float,
+        default=None,
+        help="USD per million cached prompt tokens (defaults to --price-prompt)",
+    )
+    parser.add_argument(
+        "--priority",
+        nargs="*",
+        choices=PRIORITY_CHOICES,
+        default=[],
+        help="Send rows in this priority order (e.g. chi_first non_ge_first unique_first)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Keep rows already in --output-path and only annotate the rest",
+    )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="Annotate with a cheap tier first and escalate only uncertain rows to the strong tier",
+    )
+    parser.add_argument(
+        "--cascade-cheap-model",
+        default=None,
+        help="Model for the cheap tier (default: the configured model)",
+    )
+    parser.add_argument(
+        "--cascade-cheap-effort",
+        default="low",
+        help="Reasoning effort for the cheap tier",
+    )
+    parser.add_argument(
+        "--cascade-strong-model",
+        default=None,
+        help="Model for the strong tier (default: the configured model)",
+    )
+    parser.add_argument(
+        "--cascade-strong-effort",
+        default="medium",
+        help="Reasoning effort for the strong tier",
+    )
+    parser.add_argument(
+        "--cascade-samples",
+        type=int,
+        default=1,
+        help="Cheap-tier samples per row; any disagreement between them escalates the row",
+    )
+    instrumentation.add_arguments(parser)
 
     args = parser.parse_args()
 
@@ -65,14 +210,71 @@ def main() -> None:
         else:
             os.environ["OPENROUTER_BASE_URL"] = args.base_url
 
-    rows_written = run_pilot(
-        input_path=Path(args.input_path),
-        output_path=Path(args.output_path),
-        limit=args.limit,
-        env_path=Path(args.env_path),
-    )
+    if args.lane_models:
+        os.environ["OPENROUTER_MODELS"] = ",".join(args.lane_models)
+
+    budget = None
+    if args.max_cost is not None or args.max_minutes is not None:
+        budget = RunBudget(
+            max_cost=args.max_cost,
+            deadline_seconds=args.max_minutes * 60 if args.max_minutes is not None else None,
+        )
+    prices = None
+    if args.price_prompt is not None and args.price_completion is not None:
+        prices = TokenPrices(args.price_prompt, args.price_completion, args.price_cached)
+
+    cascade = None
+    if args.cascade:
+        cascade = CascadeConfig(
+            cheap=CascadeTier(args.cascade_cheap_model, args.cascade_cheap_effort),
+            strong=CascadeTier(args.cascade_strong_model, args.cascade_strong_effort),
+            samples=args.cascade_samples,
+        )
+
+    usage = PromptUsage()
+    with instrumentation.session("phase3_pilot", args.timing_report, args.profile, args.profile_path):
+        rows_written = run_pilot(
+            input_path=Path(args.input_path),
+            output_path=Path(args.output_path),
+            limit=args.limit or None,
+            env_path=Path(args.env_path),
+            fast_path=args.fast_path,
+            lexicon_path=Path(args.lexicon_path) if args.lexicon_path else None,
+            hedge_policy=(
+                HedgePolicy(percentile=args.hedge_percentile, max_hedge_fraction=args.hedge_budget)
+                if args.hedge
+                else None
+            ),
+            use_lanes=args.lanes or bool(args.lane_models),
+            stream=args.stream,
+            request_log_path=Path(args.request_log) if args.request_log else None,
+            prompt_cache=args.prompt_cache,
+            usage=usage,
+            budget=budget,
+            token_prices=prices,
+            priority=args.priority,
+            resume=args.resume,
+            cascade=cascade,
+            read_workers=args.read_workers,
+        )
 
     print(f"rows_written={rows_written}")
+    if usage.reported:
+        summary = usage.summary()
+        print(f"prompt_tokens={summary['prompt_tokens']} cached_tokens={summary['cached_tokens']}")
+        print(f"cached_ratio={summary['cached_ratio']}")
+        if usage.cost_reported:
+            print(f"cost={summary['cost']}")
+    if budget is not None:
+        print(f"state={state_path_for(Path(args.output_path))}")
+    failures_path = failures_path_for(Path(args.output_path))
+    if failures_path.exists():
+        failures = json.loads(failures_path.read_text(encoding="utf-8"))
+        print(f"rows_failed={failures['rows_failed']} failures={failures_path} (rerun with --resume)")
+    if cascade is not None:
+        report_path = cascade_report_path(Path(args.output_path))
+        report = json.loads(report_path.read_text(encoding="utf-8"))
+        print(f"escalation_rate={report['escalation_rate']} report={report_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+﻿import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+from classifier_pipeline.phase3_review import load_result_runs, select_review_samples
+from classifier_pipeline.phase3_sampling import write_rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Select a human-review sample from the most uncertain (noun, classifier) clusters"
+    )
+    parser.add_argument(
+        "--results",
+        nargs="+",
+        required=True,
+        help="Annotated Phase 3 result CSVs (one per model/run) over the same rows",
+    )
+    parser.add_argument(
+        "--output-path",
+        default="reports/phase3/phase3_review_sample.csv",
+        help="Path to output CSV",
+    )
+    parser.add_argument(
+        "--total",
+        type=int,
+        default=20,
+        help="Maximum number of clusters (rows) to review",
+    )
+    parser.add_argument(
+        "--min-score",
+        type=float,
+        default=0.0,
+        help="Skip clusters whose uncertainty score is at or below this value",
+    )
+    parser.add_argument(
+        "--flag-weight",
+        type=float,
+        default=0.5,
+        help="Weight of flag_for_review density in the cluster score",
+    )
+
+    args = parser.parse_args()
+
+    runs = load_result_runs([Path(path) for path in args.results])
+    sample = select_review_samples(
+        runs,
+        total=args.total,
+        min_score=args.min_score,
+        flag_weight=args.flag_weight,
+    )
+    if not sample:
+        print("rows_written=0 (no uncertain clusters)")
+        return
+    write_rows(Path(args.output_path), sample)
+    print(f"rows_written={len(sample)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+﻿import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+
+from classifier_pipeline import instrumentation
+from classifier_pipeline.phase2_extraction import DEFAULT_CLASSIFIERS
+from classifier_pipeline.pipeline import (
+    DEFAULT_CACHE_DIR,
+    STATUS_FAILED,
+    StageCache,
+    default_stages,
+    run_pipeline,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the pipeline end to end, re-running only stale stages")
+    parser.add_argument(
+        "--targets",
+        nargs="*",
+        default=None,
+        help="Stages to bring up to date (with their dependencies); defaults to all",
+    )
+    parser.add_argument(
+        "--force",
+        nargs="*",
+        default=[],
+        help="Stages to re-run even when their cache entry is fresh",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report which stages are cached or stale without running anything",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=str(DEFAULT_CACHE_DIR),
+        help="Directory for per-stage cache manifests",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=2,
+        help="Independent stages run concurrently on up to this many threads",
+    )
+    parser.add_argument(
+        "--classifiers",
+        nargs="*",
+        default=DEFAULT_CLASSIFIERS,
+        help="Classifier tokens for Phase 1 and Phase 2",
+    )
+    parser.add_argument(
+        "--db-name",
+        default=None,
+        help="Childes-db version; pin it so a new database release is not hidden by the cache",
+    )
+    parser.add_argument(
+        "--sample-mode",
+        choices=["random", "focus"],
+        default="random",
+        help="Phase 3 sampling mode",
+    )
+    parser.add_argument(
+        "--sample-total",
+        type=int,
+        default=20,
+        help="Rows to sample for Phase 3",
+    )
+    parser.add_argument(
+        "--sample-seed",
+        type=int,
+        default=42,
+        help="Random seed for Phase 3 sampling",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=20,
+        help="Rows to annotate in Phase 3",
+    )
+    parser.add_argument(
+        "--env",
+        default=".env",
+        help="Path to .env file with provider settings",
+    )
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    stages = default_stages(
+        classifiers=args.classifiers,
+        sample_mode=args.sample_mode,
+        sample_total=args.sample_total,
+        sample_seed=args.sample_seed,
+        annotate_limit=args.limit,
+        db_name=args.db_name,
+        env_path=Path(args.env),
+    )
+    with instrumentation.session("run_pipeline", args.timing_report, args.profile, args.profile_path):
+        results = run_pipeline(
+            stages,
+            targets=args.targets,
+            cache=StageCache(Path(args.cache_dir)),
+            force=args.force,
+            max_workers=args.max_workers,
+            dry_run=args.dry_run,
+        )
+    for result in results:
+        line = f"{result.name}: {result.status}"
+        if result.seconds:
+            line += f" ({result.seconds:.1f}s)"
+        if result.error:
+            line += f" - {result.error}"
+        print(line)
+    if any(result.status == STATUS_FAILED for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
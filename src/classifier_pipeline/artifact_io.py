@@ -0,0 +1,312 @@
+﻿from __future__ import annotations
+
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+from itertools import islice
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Optional, Sequence
+
+# Compression is chosen by file suffix, so every path-taking writer and reader supports
+# it without extra arguments: ``phase2_extraction.csv.gz`` is a gzip stream.
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+COMPRESSIONS = ("none", *COMPRESSION_SUFFIXES)
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 1
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Rows between checks of the on-disk part size; buffering makes the bound approximate anyway.
+_SIZE_CHECK_ROWS = 256
+# Files are written under this suffix and renamed into place once complete.
+PARTIAL_SUFFIX = ".partial"
+
+logger = logging.getLogger(__name__)
+
+
+def compression_for(path: Path) -> Optional[str]:
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if path.name.endswith(suffix):
+            return compression
+    return None
+
+
+def logical_path(path: Path) -> Path:
+    """``path`` without a compression or manifest suffix (``x.csv.gz`` -> ``x.csv``)."""
+    name = path.name
+    if name.endswith(MANIFEST_SUFFIX):
+        return path.with_name(name[: -len(MANIFEST_SUFFIX)])
+    compression = compression_for(path)
+    if compression:
+        return path.with_name(name[: -len(COMPRESSION_SUFFIXES[compression])])
+    return path
+
+
+def with_compression(path: Path, compression: Optional[str]) -> Path:
+    """``path`` with the suffix for ``compression`` ("none"/None leaves it plain)."""
+    base = logical_path(path)
+    if not compression or compression == "none":
+        return base
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unknown compression: {compression}")
+    return base.with_name(base.name + COMPRESSION_SUFFIXES[compression])
+
+
+def manifest_path(path: Path) -> Path:
+    base = logical_path(path)
+    return base.with_name(base.name + MANIFEST_SUFFIX)
+
+
+def artifact_name(path: Path) -> str:
+    """File stem of the logical artifact (``phase3_results.csv.gz`` -> ``phase3_results``)."""
+    return logical_path(path).stem
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise RuntimeError("zstd artifacts need the zstandard package (pip install zstandard)") from exc
+    return zstandard
+
+
+def open_binary(path: Path, mode: str = "rb") -> IO[bytes]:
+    compression = compression_for(path)
+    if compression == "gzip":
+        return gzip.open(path, mode, compresslevel=GZIP_LEVEL) if "w" in mode else gzip.open(path, mode)
+    if compression == "zstd":
+        zstandard = _zstandard()
+        raw = open(path, mode)
+        if "w" in mode:
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    return open(path, mode)
+
+
+def open_text(path: Path, mode: str = "r", newline: Optional[str] = "") -> IO[str]:
+    """Text handle on ``path``, compressed or not according to its suffix.
+
+    ``newline`` defaults to "" as the csv module expects.
+    """
+    binary = open_binary(path, mode.replace("t", "") + "b")
+    return io.TextIOWrapper(binary, encoding="utf-8", newline=newline)
+
+
+def resolve_artifact(path: Path) -> Path:
+    """The file that holds ``path``'s content: itself, a compressed variant or a manifest.
+
+    Readers can therefore keep using the plain default path after a writer switched to
+    compression or chunking.
+    """
+    if path.exists():
+        return path
+    for candidate in _variants(path):
+        if candidate.exists():
+            return candidate
+    raise FileNotFoundError(path)
+
+
+def _variants(path: Path) -> list[Path]:
+    base = logical_path(path)
+    return [base, *(with_compression(base, compression) for compression in COMPRESSION_SUFFIXES), manifest_path(base)]
+
+
+def _partial(path: Path) -> Path:
+    return path.with_name(path.name + PARTIAL_SUFFIX)
+
+
+def _remove_shadowing_variants(path: Path, published: Path) -> list[Path]:
+    """Delete the variants ``resolve_artifact`` would pick before ``published``.
+
+    E.g. a stale ``x.csv`` would be read instead of a new ``x.csv.gz``. Variants that come
+    after it (a leftover ``x.csv.gz`` next to a new ``x.csv``) are not touched.
+    """
+    removed = []
+    for candidate in _variants(path):
+        if candidate == published:
+            break
+        if candidate.exists():
+            candidate.unlink()
+            logger.warning("Removed %s, which would be read instead of the new %s", candidate, published.name)
+            removed.append(candidate)
+    return removed
+
+
+def artifact_exists(path: Path) -> bool:
+    try:
+        resolve_artifact(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def load_manifest(path: Path) -> dict[str, object]:
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version in {path}: {manifest.get('version')}")
+    return manifest
+
+
+def part_paths(path: Path) -> list[Path]:
+    """Files holding the rows of ``path`` in order: the parts of a manifest, else the file itself."""
+    resolved = resolve_artifact(path)
+    if not resolved.name.endswith(MANIFEST_SUFFIX):
+        return [resolved]
+    manifest = load_manifest(resolved)
+    return [resolved.parent / part["path"] for part in manifest["parts"]]
+
+
+class CsvArtifactWriter:
+    """Streaming CSV writer with optional compression (by suffix) and size-bounded parts.
+
+    With ``max_part_bytes``, rows go to ``<stem>.part-00000.csv[.gz|.zst]`` files that each
+    carry the header, and ``<name>.manifest.json`` lists them once the writer is closed.
+    The bound is checked against the on-disk (compressed) size every few hundred rows.
+
+    Everything is written to ``*.partial`` files and renamed into place by ``close``, so the
+    previous artifact stays intact until then (and entirely if the ``with`` block raises).
+    Only variants that would shadow the new file are removed; they are listed in ``removed``.
+    """
+
+    def __init__(self, path: Path, fieldnames: Sequence[str], max_part_bytes: Optional[int] = None) -> None:
+        self.path = Path(path)
+        self.fieldnames = list(fieldnames)
+        self.max_part_bytes = max_part_bytes
+        self.rows = 0
+        self.parts: list[dict[str, object]] = []
+        self.removed: list[Path] = []
+        self._handle: Optional[IO[str]] = None
+        self._raw_size = None
+        self._part_rows = 0
+        self._written: list[Path] = []
+        if max_part_bytes is not None and max_part_bytes <= 0:
+            raise ValueError("max_part_bytes must be positive")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if max_part_bytes is None:
+            self._open(self.path)
+        else:
+            self._next_part()
+
+    def _open(self, path: Path) -> None:
+        self._written.append(path)
+        raw = open(_partial(path), "wb")
+        self._raw_size = raw.tell
+        compression = compression_for(path)
+        if compression == "gzip":
+            binary: IO[bytes] = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=GZIP_LEVEL)
+        elif compression == "zstd":
+            binary = _zstandard().ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw)
+        else:
+            binary = raw
+        self._raw = raw
+        self._handle = io.TextIOWrapper(binary, encoding="utf-8", newline="")
+        self._writer = csv.writer(self._handle)
+        self._writer.writerow(self.fieldnames)
+
+    def _close_handle(self) -> None:
+        if self._handle is None:
+            return
+        self._handle.close()
+        if not self._raw.closed:  # GzipFile leaves a caller-supplied fileobj open
+            self._raw.close()
+        self._handle = None
+
+    def _next_part(self) -> None:
+        self._finish_part()
+        base = logical_path(self.path)
+        suffix = COMPRESSION_SUFFIXES.get(compression_for(self.path) or "", "")
+        part = base.with_name(f"{base.stem}.part-{len(self.parts):05d}{base.suffix}{suffix}")
+        self.parts.append({"path": part.name, "rows": 0})
+        self._part_rows = 0
+        self._open(part)
+
+    def _finish_part(self) -> None:
+        if self._handle is None or not self.parts:
+            return
+        self._close_handle()
+        part = self.parts[-1]
+        part["rows"] = self._part_rows
+        part["bytes"] = _partial(self.path.parent / str(part["path"])).stat().st_size
+
+    def _part_full(self) -> bool:
+        return self.max_part_bytes is not None and self._part_rows > 0 and self._raw_size() >= self.max_part_bytes
+
+    def writerow(self, values: Sequence[object]) -> None:
+        if self._part_rows % _SIZE_CHECK_ROWS == 0 and self._part_full():
+            self._next_part()
+        self._writer.writerow(values)
+        self._part_rows += 1
+        self.rows += 1
+
+    def writerows(self, rows: Iterable[Sequence[object]]) -> None:
+        # Batches keep the per-row work inside csv.writer.writerows.
+        iterator = iter(rows)
+        while True:
+            batch = list(islice(iterator, _SIZE_CHECK_ROWS))
+            if not batch:
+                return
+            if self._part_full():
+                self._next_part()
+            self._writer.writerows(batch)
+            self._part_rows += len(batch)
+            self.rows += len(batch)
+
+    def close(self) -> None:
+        if self.max_part_bytes is None:
+            self._close_handle()
+            os.replace(_partial(self.path), self.path)
+            self.removed = _remove_shadowing_variants(self.path, self.path)
+            return
+        self._finish_part()
+        target = manifest_path(self.path)
+        stale_parts = set(part_paths(target)) if target.exists() else set()
+        for path in self._written:
+            os.replace(_partial(path), path)
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "format": "csv",
+            "compression": compression_for(self.path) or "none",
+            "fieldnames": self.fieldnames,
+            "rows": self.rows,
+            "parts": self.parts,
+        }
+        _partial(target).write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+        os.replace(_partial(target), target)
+        # Parts of the replaced manifest that the new one did not overwrite.
+        for part in stale_parts - set(self._written):
+            part.unlink(missing_ok=True)
+        self.removed = _remove_shadowing_variants(self.path, target)
+
+    def abort(self) -> None:
+        """Discard everything written so far and leave the previous artifact as it was."""
+        self._close_handle()
+        for path in self._written:
+            _partial(path).unlink(missing_ok=True)
+
+    def __enter__(self) -> CsvArtifactWriter:
+        return self
+
+    def __exit__(self, exc_type: object, *exc: object) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def iter_csv_part(path: Path) -> Iterator[dict[str, str]]:
+    with open_text(path) as handle:
+        yield from csv.DictReader(handle)
+
+
+def iter_csv_rows(path: Path) -> Iterator[dict[str, str]]:
+    """Rows of a plain, compressed or chunked CSV artifact, in order."""
+    for part in part_paths(path):
+        yield from iter_csv_part(part)
+
+
+def read_csv_rows(path: Path) -> list[dict[str, str]]:
+    """All rows of a CSV artifact as dicts (see ``parallel_csv.read_table`` for parallel parsing)."""
+    return list(iter_csv_rows(path))
@@ -0,0 +1,387 @@
+﻿from __future__ import annotations
+
+import json
+import os
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Sequence
+
+from classifier_pipeline.childes_db import (
+    fetch_classifier_counts,
+    fetch_speaker_counts,
+    fetch_transcript_metadata,
+    fetch_utterance_counts,
+)
+from classifier_pipeline.phase1_inventory import DEFAULT_LANGUAGE_FILTER
+from classifier_pipeline.phase2_extraction import FULL_CLASSIFIERS, write_phase2_csv
+
+try:  # POSIX only; peak RSS is reported as None elsewhere.
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+# Bump when the generator changes so cached fixtures are rebuilt.
+FIXTURE_VERSION = 1
+DEFAULT_SCALES = (100_000,)
+DEFAULT_RESULTS_PATH = Path("reports/benchmarks/phase2_benchmarks.jsonl")
+DEFAULT_FIXTURE_DIR = Path("reports/benchmarks/fixtures")
+
+CASES = (
+    "phase2_extraction",
+    "transcript_metadata",
+    "utterance_counts",
+    "speaker_counts",
+    "classifier_counts",
+)
+
+# Corpus name -> (collection, language). The Cantonese corpora exercise the language
+# exclusion, the English one the collection filter.
+CORPORA = {
+    "Tong": ("Chinese", "zho"),
+    "Zhou1": ("Chinese", "zho"),
+    "Zhou2": ("Chinese", "zho"),
+    "ZhouDinner": ("Chinese", "zho"),
+    "Chang1": ("Chinese", "zho"),
+    "Context": ("Chinese", "zho"),
+    "Erbaugh": ("Chinese", "zho eng"),
+    "LeeWongLeung": ("Chinese", "yue"),
+    "HKU": ("Chinese", "yue eng"),
+    "Brown": ("Eng-NA", "eng"),
+}
+SPEAKERS = (("CHI", "Target_Child", 40), ("MOT", "Mother", 42), ("FAT", "Father", 10), ("INV", "Investigator", 8))
+
+# (gloss, MOR part of speech, weight): a Zipf-ish slice of child-directed Mandarin.
+VOCABULARY = (
+    ("我", "pro:per", 60), ("你", "pro:per", 55), ("这", "pro:dem", 40), ("是", "v:cop", 45),
+    ("的", "sfx", 50), ("了", "asp", 38), ("吗", "sfp", 22), ("呢", "sfp", 18), ("吧", "sfp", 15),
+    ("啊", "sfp", 25), ("要", "v", 24), ("不", "adv", 30), ("有", "v", 20), ("看", "v", 18),
+    ("什么", "pro:wh", 16), ("妈妈", "n", 14), ("宝宝", "n", 12), ("吃", "v", 14), ("那", "pro:dem", 14),
+    ("在", "prep", 12), ("去", "v", 10), ("好", "adj", 12), ("大", "adj", 8), ("小", "adj", 8),
+    ("一", "num", 20), ("两", "num", 6), ("三", "num", 4), ("很", "adv", 6), ("也", "adv", 6),
+    ("玩", "v", 7), ("书", "n", 5), ("车", "n", 5), ("狗", "n", 4), ("猫", "n", 4), ("苹果", "n", 3),
+)
+NOUNS = ("书", "车", "狗", "猫", "苹果", "人", "鱼", "球", "房子", "杯子", "衣服", "故事", "蛋糕", "小朋友")
+DETERMINERS = (
+    ("一", "num", 50), ("两", "num", 10), ("三", "num", 6), ("几", "num", 4), ("这", "pro:dem", 16),
+    ("那", "pro:dem", 8), ("每", "det", 2), ("哪", "pro:wh", 2), ("好", "adj", 1), ("吃", "v", 1),
+)
+CLASSIFIER_RATE = 0.15
+
+
+class _SortedGroupConcat:
+    """SQLite aggregate for MySQL's ``GROUP_CONCAT(DISTINCT x ORDER BY x SEPARATOR s)``."""
+
+    def __init__(self) -> None:
+        self.values: set[str] = set()
+        self.separator = ","
+
+    def step(self, value: Optional[str], separator: str) -> None:
+        self.separator = separator
+        if value is not None:
+            self.values.add(value)
+
+    def finalize(self) -> Optional[str]:
+        return self.separator.join(sorted(self.values)) if self.values else None
+
+
+_GROUP_CONCAT = re.compile(r"GROUP_CONCAT\(DISTINCT (\w+) ORDER BY \1 SEPARATOR ('[^']*')\)")
+
+
+def translate_query(query: str) -> str:
+    """Rewrite the MySQL dialect used by the childes-db queries into SQLite."""
+    return _GROUP_CONCAT.sub(r"group_concat_sorted(\1, \2)", query).replace("%s", "?")
+
+
+class _Cursor:
+    def __init__(self, connection: SQLiteConnection) -> None:
+        self._connection = connection
+        self._cursor = connection.raw.cursor()
+
+    def __enter__(self) -> _Cursor:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._cursor.close()
+
+    def execute(self, query: str, params: Sequence[object] = ()) -> None:
+        self._cursor.execute(translate_query(query), list(params))
+
+    def fetchall(self) -> list[tuple]:
+        rows = self._cursor.fetchall()
+        self._connection.mark_first_row()
+        return rows
+
+    def __iter__(self) -> Iterator[tuple]:
+        for row in self._cursor:
+            self._connection.mark_first_row()
+            yield row
+            break
+        yield from self._cursor
+
+
+class SQLiteConnection:
+    """pymysql-shaped wrapper over a SQLite fixture (``with conn``, ``with conn.cursor()``, ``%s``).
+
+    ``first_row_at`` is the ``perf_counter`` time the first result row reached the caller.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.raw = sqlite3.connect(str(path))
+        self.raw.create_aggregate("group_concat_sorted", 2, _SortedGroupConcat)
+        self.first_row_at: Optional[float] = None
+
+    def __enter__(self) -> SQLiteConnection:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.raw.close()
+
+    def cursor(self) -> _Cursor:
+        return _Cursor(self)
+
+    def mark_first_row(self) -> None:
+        if self.first_row_at is None:
+            self.first_row_at = time.perf_counter()
+
+
+def _weighted(rng: random.Random, table: Sequence[tuple]) -> Callable[[], tuple]:
+    population = list(table)
+    cumulative = []
+    total = 0
+    for entry in population:
+        total += entry[-1]
+        cumulative.append(total)
+    return lambda: rng.choices(population, cum_weights=cumulative)[0]
+
+
+def _classifier_weights() -> list[tuple[str, int]]:
+    # 个 dominates child speech; the other classifiers fall off roughly as 1/rank.
+    return [("个", 300)] + [(classifier, max(1, 60 // rank)) for rank, classifier in enumerate(FULL_CLASSIFIERS[1:], 1)]
+
+
+def _generate_rows(tokens: int, seed: int) -> Iterator[tuple[str, tuple]]:
+    """Yield ("transcript" | "utterance" | "token", row) until ``tokens`` tokens exist."""
+    rng = random.Random(seed)
+    word = _weighted(rng, VOCABULARY)
+    determiner = _weighted(rng, DETERMINERS)
+    speaker = _weighted(rng, SPEAKERS)
+    classifier_table = _classifier_weights()
+    classifier = _weighted(rng, classifier_table)
+    corpora = list(CORPORA)
+
+    token_id = utterance_id = transcript_id = 0
+    while token_id < tokens:
+        transcript_id += 1
+        corpus = rng.choice(corpora)
+        collection, language = CORPORA[corpus]
+        age = None if rng.random() < 0.1 else round(rng.uniform(18, 72), 2)
+        yield "transcript", (transcript_id, f"{collection}/{corpus}/{transcript_id:05d}.xml", corpus, collection, language, age)
+
+        for order in range(rng.randint(150, 450)):
+            if token_id >= tokens:
+                break
+            utterance_id += 1
+            code, role, _ = speaker()
+            words = [word()[:2] for _ in range(max(1, int(rng.expovariate(1 / 3.5))))]
+            if rng.random() < CLASSIFIER_RATE:
+                at = rng.randint(0, len(words))
+                det = determiner()[:2]
+                words[at:at] = [det, (classifier()[0], "cl"), (rng.choice(NOUNS), "n")]
+            yield "utterance", (
+                utterance_id,
+                transcript_id,
+                corpus,
+                language,
+                code,
+                role,
+                age,
+                " ".join(gloss for gloss, _ in words),
+                " ".join(pos for _, pos in words),
+                order,
+            )
+            for token_order, (gloss, pos) in enumerate(words, 1):
+                token_id += 1
+                yield "token", (token_id, utterance_id, transcript_id, corpus, language, role, token_order, gloss, pos)
+
+
+SCHEMA = """
+CREATE TABLE transcript (
+    id INTEGER PRIMARY KEY, filename TEXT, corpus_name TEXT, collection_name TEXT,
+    language TEXT, target_child_age REAL
+);
+CREATE TABLE utterance (
+    id INTEGER PRIMARY KEY, transcript_id INTEGER, corpus_name TEXT, language TEXT,
+    speaker_code TEXT, speaker_role TEXT, target_child_age REAL, gloss TEXT,
+    part_of_speech TEXT, utterance_order INTEGER
+);
+CREATE TABLE token (
+    id INTEGER PRIMARY KEY, utterance_id INTEGER, transcript_id INTEGER, corpus_name TEXT,
+    language TEXT, speaker_role TEXT, token_order INTEGER, gloss TEXT, part_of_speech TEXT
+);
+"""
+# childes-db indexes the join and filter columns the extraction query uses.
+INDEXES = """
+CREATE INDEX token_gloss ON token (gloss);
+CREATE INDEX token_utterance ON token (utterance_id, token_order);
+"""
+_INSERTS = {
+    "transcript": "INSERT INTO transcript VALUES (?, ?, ?, ?, ?, ?)",
+    "utterance": "INSERT INTO utterance VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    "token": "INSERT INTO token VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+}
+
+
+def build_fixture(path: Path, tokens: int, seed: int = 13) -> Path:
+    """Write a childes-db-shaped SQLite database with about ``tokens`` tokens to ``path``."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".partial")
+    partial.unlink(missing_ok=True)
+    conn = sqlite3.connect(str(partial))
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SCHEMA)
+        batches: dict[str, list[tuple]] = {table: [] for table in _INSERTS}
+        for table, row in _generate_rows(tokens, seed):
+            batch = batches[table]
+            batch.append(row)
+            if len(batch) >= 50_000:
+                conn.executemany(_INSERTS[table], batch)
+                batch.clear()
+        for table, batch in batches.items():
+            conn.executemany(_INSERTS[table], batch)
+        conn.executescript(INDEXES)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(partial, path)
+    return path
+
+
+def fixture_path(fixture_dir: Path, tokens: int, seed: int = 13) -> Path:
+    return fixture_dir / f"childes_fixture_{tokens}_s{seed}_v{FIXTURE_VERSION}.sqlite"
+
+
+def ensure_fixture(fixture_dir: Path, tokens: int, seed: int = 13) -> Path:
+    """Reuse the cached fixture for (tokens, seed, generator version), building it if missing."""
+    path = fixture_path(fixture_dir, tokens, seed)
+    return path if path.exists() else build_fixture(path, tokens, seed)
+
+
+@dataclass
+class BenchmarkResult:
+    case: str
+    tokens: int
+    rows: int
+    seconds: float
+    rows_per_second: Optional[float]
+    first_row_seconds: Optional[float]
+    peak_rss_mb: Optional[float]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB on Linux.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_case(case: str, fixture: Path, tokens: int, output_dir: Path) -> BenchmarkResult:
+    """Run one benchmark case against ``fixture`` in this process."""
+    if case not in CASES:
+        raise ValueError(f"Unknown benchmark case: {case}")
+    languages = list(DEFAULT_LANGUAGE_FILTER)
+    connections: list[SQLiteConnection] = []
+
+    def _connect() -> SQLiteConnection:
+        connections.append(SQLiteConnection(fixture))
+        return connections[-1]
+
+    start = time.perf_counter()
+    if case == "phase2_extraction":
+        output_dir.mkdir(parents=True, exist_ok=True)
+        rows = write_phase2_csv(
+            output_path=str(output_dir / f"phase2_{tokens}.csv"),
+            rejected_output_path=str(output_dir / f"rejected_{tokens}.csv"),
+            connection_factory=_connect,
+        )
+    else:
+        with _connect() as conn:
+            if case == "transcript_metadata":
+                rows = len(fetch_transcript_metadata(conn, languages))
+            elif case == "utterance_counts":
+                rows = len(fetch_utterance_counts(conn, languages))
+            elif case == "speaker_counts":
+                rows = len(fetch_speaker_counts(conn, languages))
+            else:
+                rows = len(fetch_classifier_counts(conn, languages, FULL_CLASSIFIERS))
+    seconds = time.perf_counter() - start
+
+    first_row_at = connections[0].first_row_at if connections else None
+    return BenchmarkResult(
+        case=case,
+        tokens=tokens,
+        rows=rows,
+        seconds=round(seconds, 4),
+        rows_per_second=round(rows / seconds, 1) if seconds > 0 else None,
+        first_row_seconds=round(first_row_at - start, 4) if first_row_at is not None else None,
+        peak_rss_mb=_peak_rss_mb(),
+    )
+
+
+def run_case_isolated(case: str, fixture: Path, tokens: int, output_dir: Path) -> BenchmarkResult:
+    """``run_case`` in a fresh process, so peak RSS belongs to this case alone."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(run_case, case, fixture, tokens, output_dir).result()
+
+
+def git_revision(root: Path) -> Optional[str]:
+    """Short HEAD hash, suffixed ``+dirty`` when tracked files have local changes."""
+    try:
+        head = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{head}+dirty" if dirty else head
+
+
+def append_results(path: Path, results: Iterable[BenchmarkResult], revision: Optional[str]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    with path.open("a", encoding="utf-8") as handle:
+        for result in results:
+            record = {"timestamp": stamp, "git": revision, "python": sys.version.split()[0], **asdict(result)}
+            handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def load_results(path: Path) -> list[dict[str, object]]:
+    if not path.exists():
+        return []
+    with path.open("r", encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+def previous_result(
+    history: Sequence[dict[str, object]],
+    case: str,
+    tokens: int,
+    revision: Optional[str],
+) -> Optional[dict[str, object]]:
+    """Latest recorded result for (case, tokens) from a different revision than ``revision``."""
+    for record in reversed(history):
+        if record.get("case") == case and record.get("tokens") == tokens and record.get("git") != revision:
+            return record
+    return None
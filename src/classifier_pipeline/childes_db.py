@@ -2,11 +2,15 @@
 
 from collections import Counter
 from dataclasses import dataclass
-from typing import Iterable, Optional
+from typing import TYPE_CHECKING, Iterable, Optional
 import json
 
-import pymysql
-import requests
+from classifier_pipeline.instrumentation import count, timed
+
+# pymysql and requests are only needed to reach the server; importing them lazily keeps
+# the query builders and helpers here cheap to import.
+if TYPE_CHECKING:
+    import pymysql
 
 CHILDES_DB_INFO_URL = "https://langcog.github.io/childes-db-website/childes-db.json"
 
@@ -20,6 +24,8 @@ class ChildesDbInfo:
 
 
 def fetch_childes_db_info(url: str = CHILDES_DB_INFO_URL) -> ChildesDbInfo:
+    import requests
+
     response = requests.get(url, timeout=60)
     response.raise_for_status()
     payload = response.json()
@@ -32,6 +38,8 @@ def fetch_childes_db_info(url: str = CHILDES_DB_INFO_URL) -> ChildesDbInfo:
 
 
 def connect_childes_db(db_name: Optional[str] = None) -> pymysql.connections.Connection:
+    import pymysql
+
     info = fetch_childes_db_info()
     database = db_name or info.current
     return pymysql.connect(
@@ -61,6 +69,19 @@ def apply_grouped_counts(
         bucket[token] = int(count)
 
 
+def _fetch_all(
+    conn: pymysql.connections.Connection,
+    name: str,
+    query: str,
+    params: list[str],
+) -> tuple[tuple[object, ...], ...]:
+    with timed(f"db.{name}"), conn.cursor() as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+    count(f"db.{name}.rows", len(rows))
+    return rows
+
+
 def fetch_transcript_metadata(
     conn: pymysql.connections.Connection,
     languages: Iterable[str],
@@ -80,9 +101,7 @@ def fetch_transcript_metadata(
         GROUP BY corpus_name, collection_name
         ORDER BY corpus_name
     """
-    with conn.cursor() as cur:
-        cur.execute(query, params)
-        rows = cur.fetchall()
+    rows = _fetch_all(conn, "transcript_metadata", query, params)
 
     results = []
     for row in rows:
@@ -111,9 +130,7 @@ def fetch_utterance_counts(
         WHERE {clause}
         GROUP BY corpus_name
     """
-    with conn.cursor() as cur:
-        cur.execute(query, params)
-        rows = cur.fetchall()
+    rows = _fetch_all(conn, "utterance_counts", query, params)
     return {row[0]: int(row[1]) for row in rows}
 
 
@@ -128,9 +145,7 @@ def fetch_speaker_counts(
         WHERE {clause}
         GROUP BY corpus_name, speaker_code, speaker_role
     """
-    with conn.cursor() as cur:
-        cur.execute(query, params)
-        rows = cur.fetchall()
+    rows = _fetch_all(conn, "speaker_counts", query, params)
     return [(row[0], row[1], row[2], int(row[3])) for row in rows]
 
 
@@ -157,9 +172,7 @@ def fetch_classifier_counts(
         GROUP BY corpus_name, gloss
     """
 
-    with conn.cursor() as cur:
-        cur.execute(query, params + classifier_list)
-        rows = cur.fetchall()
+    rows = _fetch_all(conn, "classifier_counts", query, params + classifier_list)
     return [(row[0], row[1], int(row[2])) for row in rows]
 
 
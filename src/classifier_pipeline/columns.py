@@ -0,0 +1,180 @@
+﻿from __future__ import annotations
+
+import math
+
+# Phase 2 column layout and the deterministic columns derived from it. Kept free of
+# database and HTTP dependencies so sampling, annotation and analysis code can import it
+# without loading the extraction backend.
+
+OUTPUT_HEADERS = [
+    "File Name",
+    "Collection_Type",
+    "Speaker_Code",
+    "Speaker_Role",
+    "Age",
+    "Utterance",
+    "%gra",
+    "Determiner/Numbers",
+    "Classifier",
+    "utterance_id",
+    "utterance_order",
+    "classifier_token_order",
+    "transcript_id",
+    "determiner_type",
+    "specific_semantic_class",
+    "Classifier type",
+    "Over use of Ge...",
+]
+
+# Phase 3 output: the Phase 2 columns, computed age fields and the annotation.
+ANNOTATED_HEADERS = OUTPUT_HEADERS + [
+    "age_years",
+    "age_available",
+    "age_band",
+    "identified_noun",
+    "conventional_classifier",
+    "conventional_classifier_zh",
+    "classifier_type",
+    "overuse_of_ge",
+    "flag_for_review",
+    "flag_reason",
+    "rationale",
+    "annotation_source",
+]
+
+AGE_BAND_MAX_YEARS = 7
+
+
+DEMONSTRATIVE_TOKENS = frozenset({"这", "那", "此", "该"})
+INTERROGATIVE_TOKENS = frozenset({"几", "哪"})
+QUANTIFIER_TOKENS = frozenset({"每", "各"})
+
+
+# Classifier semantic classes are deterministic and classifier-token-based.
+# The taxonomy is designed for aggregation analyses (e.g., animacy vs shape vs temporal).
+SPECIFIC_SEMANTIC_CLASS_MAP = {
+    "个": "general",
+    "只": "animacy",
+    "头": "animacy",
+    "位": "animacy",
+    "名": "animacy",
+    "条": "shape",
+    "张": "shape",
+    "片": "shape",
+    "根": "shape",
+    "颗": "granular_piece",
+    "本": "artifact_function",
+    "部": "artifact_function",
+    "辆": "artifact_function",
+    "架": "artifact_function",
+    "把": "artifact_function",
+    "件": "artifact_function",
+    "碗": "container_portion",
+    "份": "container_portion",
+    "元": "measure_currency",
+    "分": "measure_currency",
+    "块": "measure_portion",
+    "年": "temporal_event",
+    "次": "temporal_event",
+    "天": "temporal_event",
+    "岁": "temporal_event",
+    "场": "event_occurrence",
+    "下": "event_occurrence",
+    "种": "type_kind",
+    "句": "discourse_unit",
+    "家": "institution_household",
+    "组": "collective",
+    "群": "collective",
+    "对": "collective",
+    "笔": "transaction_stroke",
+}
+
+
+def compute_determiner_type(token: str) -> str:
+    """Classify a determiner/number token into a semantic type.
+
+    Since Phase 2 extraction already filters to num*, det, and pro:dem POS tags,
+    every token in the Determiner/Numbers column belongs to one of these categories.
+    """
+    token = token.strip()
+    if not token:
+        return "unknown"
+    if token in DEMONSTRATIVE_TOKENS:
+        return "demonstrative"
+    if token in INTERROGATIVE_TOKENS:
+        return "interrogative"
+    if token in QUANTIFIER_TOKENS:
+        return "quantifier"
+    if token.startswith("第"):
+        return "ordinal"
+    return "numeral"
+
+
+def compute_specific_semantic_class(classifier: str) -> str:
+    token = classifier.strip()
+    if not token:
+        return "other"
+    return SPECIFIC_SEMANTIC_CLASS_MAP.get(token, "other")
+
+
+def compute_age_band(age_days: object) -> str:
+    """Bucket an ``Age`` value in days into the yearly bands used by the data profile."""
+    try:
+        years = float(str(age_days).strip()) / 365.25
+    except ValueError:
+        return "unknown"
+    if not math.isfinite(years):  # "nan" and "inf" parse as floats
+        return "unknown"
+    lower = max(int(years), 0)
+    if lower >= AGE_BAND_MAX_YEARS:
+        return f"{AGE_BAND_MAX_YEARS}+ yrs"
+    return f"{lower}-{lower + 1} yrs"
+
+
+def _age_values(age_raw: str) -> tuple[bool, object, str]:
+    """(age_available, age_years, age_band) for a stripped ``Age`` value in days."""
+    if not age_raw:
+        return False, "", "unknown"
+    try:
+        age_days = float(age_raw)
+    except ValueError:
+        return False, "", "unknown"
+    if not math.isfinite(age_days):
+        return False, "", "unknown"
+    return True, round(age_days / 365.25, 1), compute_age_band(age_raw)
+
+
+def compute_age_fields(row: dict[str, str]) -> dict[str, str]:
+    """Copy of ``row`` with the age columns and any missing derived columns filled in."""
+    row = dict(row)
+    row["age_available"], row["age_years"], row["age_band"] = _age_values((row.get("Age") or "").strip())
+    if not row.get("determiner_type"):
+        row["determiner_type"] = compute_determiner_type(row.get("Determiner/Numbers", ""))
+    if not row.get("specific_semantic_class"):
+        row["specific_semantic_class"] = compute_specific_semantic_class(row.get("Classifier", ""))
+    return row
+
+
+def enrich_columns(rows: list[dict[str, object]]) -> list[dict[str, object]]:
+    """``compute_age_fields`` for a whole dataset, in place, one column at a time.
+
+    Each derived column is mapped through a table built over its distinct source values, so
+    an age or token is converted once per dataset instead of once per row. Returns ``rows``.
+    """
+    ages = [(str(row.get("Age") or "")).strip() for row in rows]
+    age_table = {age: _age_values(age) for age in set(ages)}
+    for row, age in zip(rows, ages):
+        row["age_available"], row["age_years"], row["age_band"] = age_table[age]
+
+    for column, source, compute in (
+        ("determiner_type", "Determiner/Numbers", compute_determiner_type),
+        ("specific_semantic_class", "Classifier", compute_specific_semantic_class),
+    ):
+        missing = [row for row in rows if not row.get(column)]
+        if not missing:
+            continue
+        values = [str(row.get(source) or "") for row in missing]
+        table = {value: compute(value) for value in set(values)}
+        for row, value in zip(missing, values):
+            row[column] = table[value]
+    return rows
@@ -0,0 +1,196 @@
+﻿from __future__ import annotations
+
+import json
+import math
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+from classifier_pipeline.columns import compute_age_band, compute_determiner_type
+from classifier_pipeline.phase3_review import RowKey, index_rows, normalize_field, row_key
+from classifier_pipeline.phase3_sampling import corpus_from_file_name
+
+CUBES_VERSION = 1
+
+# Grain of the main cube; every profile table is a roll-up over a subset of these.
+PROFILE_DIMENSIONS = ("Classifier", "Speaker_Role", "age_band", "corpus", "determiner_type", "overuse_of_ge")
+DETERMINER_DIMENSIONS = ("Determiner/Numbers", "determiner_type")
+NOUN_DIMENSIONS = ("Classifier", "identified_noun")
+AGE_DIMENSIONS = ("age_years",)
+
+OMITTED = "OMITTED"
+
+
+def _columnar(counts: Counter[tuple[str, ...]], dimensions: Sequence[str]) -> dict[str, list[object]]:
+    """Counter keyed by dimension tuples -> one list per dimension plus ``count``, largest first."""
+    items = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    columns: dict[str, list[object]] = {name: [key[i] for key, _ in items] for i, name in enumerate(dimensions)}
+    columns["count"] = [count for _, count in items]
+    return columns
+
+
+class CubeBuilder:
+    """Single-pass aggregator over Phase 2 rows, optionally joined to Phase 3 annotations.
+
+    Annotations are matched on ``row_key``; rows without one get an empty ``overuse_of_ge``
+    and do not enter the noun cube.
+    """
+
+    def __init__(self, annotations: Optional[Iterable[dict[str, str]]] = None) -> None:
+        self.annotations: dict[RowKey, dict[str, str]] = index_rows(annotations) if annotations is not None else {}
+        self._occurrences: Counter[RowKey] = Counter()
+        self.rows = 0
+        self.annotated = 0
+        self.profile: Counter[tuple[str, ...]] = Counter()
+        self.determiners: Counter[tuple[str, ...]] = Counter()
+        self.nouns: Counter[tuple[str, ...]] = Counter()
+        self.ages: Counter[tuple[str, ...]] = Counter()
+        self.missing_age = 0
+        self._triples: Counter[tuple[str, str, str]] = Counter()
+        self._utterances: Counter[str] = Counter()
+        # Age and determiner conversions repeat heavily; convert each distinct value once.
+        self._age_cache: dict[str, tuple[str, str]] = {}
+        self._determiner_cache: dict[str, str] = {}
+
+    def _age(self, raw: str) -> tuple[str, str]:
+        cached = self._age_cache.get(raw)
+        if cached is None:
+            try:
+                days = float(raw) if raw else math.nan
+            except ValueError:
+                days = math.nan
+            years = f"{days / 365.25:.1f}" if math.isfinite(days) else ""
+            cached = self._age_cache[raw] = (years, compute_age_band(raw) if years else "unknown")
+        return cached
+
+    def add(self, row: dict[str, str]) -> None:
+        self.rows += 1
+        classifier = normalize_field(row.get("Classifier"))
+        determiner = normalize_field(row.get("Determiner/Numbers"))
+        determiner_type = normalize_field(row.get("determiner_type"))
+        if not determiner_type:
+            determiner_type = self._determiner_cache.get(determiner)
+            if determiner_type is None:
+                determiner_type = self._determiner_cache[determiner] = compute_determiner_type(determiner)
+        years, band = self._age(normalize_field(row.get("Age")))
+        if years:
+            self.ages[(years,)] += 1
+        else:
+            self.missing_age += 1
+
+        annotation = None
+        if self.annotations:
+            key = row_key(row)
+            annotation = self.annotations.get(key + (str(self._occurrences[key]),))
+            self._occurrences[key] += 1
+        overuse = ""
+        if annotation is not None:
+            self.annotated += 1
+            overuse = normalize_field(annotation.get("overuse_of_ge")).lower()
+            self.nouns[(classifier, normalize_field(annotation.get("identified_noun")))] += 1
+
+        self.profile[
+            (
+                classifier,
+                normalize_field(row.get("Speaker_Role")),
+                band,
+                corpus_from_file_name(row.get("File Name") or ""),
+                determiner_type,
+                overuse,
+            )
+        ] += 1
+        self.determiners[(determiner, determiner_type)] += 1
+        self._triples[(normalize_field(row.get("Utterance")), classifier, determiner)] += 1
+        utterance = normalize_field(row.get("utterance_id")) or (
+            f"{row.get('File Name') or ''}#{normalize_field(row.get('utterance_order'))}"
+        )
+        self._utterances[utterance] += 1
+
+    def _summary(self) -> dict[str, object]:
+        ages = sorted((float(key[0]), count) for key, count in self.ages.items())
+        with_age = sum(count for _, count in ages)
+        summary: dict[str, object] = {
+            "rows": self.rows,
+            "annotated_rows": self.annotated,
+            "corpora": len({key[3] for key in self.profile if key[3]}),
+            "classifiers": len({key[0] for key in self.profile if key[0]}),
+            "missing_age": self.missing_age,
+            "age_min": ages[0][0] if ages else None,
+            "age_max": ages[-1][0] if ages else None,
+            "age_mean": round(sum(age * count for age, count in ages) / with_age, 2) if with_age else None,
+            "age_median": _weighted_median(ages) if ages else None,
+            # Rows beyond the first of each (Utterance, Classifier, Determiner) triple.
+            "duplicate_rows": self.rows - len(self._triples),
+            "top_triple": None,
+            "top_triple_count": 0,
+            "multi_classifier_rows": sum(count for count in self._utterances.values() if count > 1),
+            "multi_classifier_utterances": sum(1 for count in self._utterances.values() if count > 1),
+        }
+        if self._triples:
+            (utterance, classifier, determiner), count = self._triples.most_common(1)[0]
+            summary["top_triple"] = {"Utterance": utterance, "Classifier": classifier, "Determiner/Numbers": determiner}
+            summary["top_triple_count"] = count
+        if self.annotated:
+            summary["omitted_rows"] = sum(count for (_, noun), count in self.nouns.items() if noun == OMITTED)
+        return summary
+
+    def result(self) -> dict[str, object]:
+        return {
+            "version": CUBES_VERSION,
+            "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "summary": self._summary(),
+            "cubes": {
+                "profile": _columnar(self.profile, PROFILE_DIMENSIONS),
+                "determiners": _columnar(self.determiners, DETERMINER_DIMENSIONS),
+                "nouns": _columnar(self.nouns, NOUN_DIMENSIONS),
+                "ages": _columnar(self.ages, AGE_DIMENSIONS),
+            },
+        }
+
+
+def _weighted_median(values: list[tuple[float, int]]) -> float:
+    total = sum(count for _, count in values)
+    middle = [(total - 1) // 2, total // 2]
+    found: list[float] = []
+    seen = 0
+    for value, count in values:
+        while len(found) < 2 and middle[len(found)] < seen + count:
+            found.append(value)
+        seen += count
+    return round(statistics.fmean(found), 2)
+
+
+def build_cubes(
+    rows: Iterable[dict[str, str]],
+    annotations: Optional[Iterable[dict[str, str]]] = None,
+) -> dict[str, object]:
+    builder = CubeBuilder(annotations)
+    for row in rows:
+        builder.add(row)
+    return builder.result()
+
+
+def rollup(cube: dict[str, list[object]], dimensions: Sequence[str]) -> Counter[tuple[object, ...]]:
+    """Sum a columnar cube's counts over the given dimensions."""
+    totals: Counter[tuple[object, ...]] = Counter()
+    columns = [cube[name] for name in dimensions]
+    for index, count in enumerate(cube["count"]):
+        totals[tuple(column[index] for column in columns)] += int(count)
+    return totals
+
+
+def write_cubes(path: Path, cubes: dict[str, object], sources: Optional[dict[str, str]] = None) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = dict(cubes)
+    if sources:
+        payload["sources"] = sources
+    path.write_text(json.dumps(payload, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+
+
+def load_cubes(path: Path) -> dict[str, object]:
+    cubes = json.loads(path.read_text(encoding="utf-8"))
+    if cubes.get("version") != CUBES_VERSION:
+        raise ValueError(f"Unsupported cube file version {cubes.get('version')} in {path}")
+    return cubes
@@ -0,0 +1,219 @@
+﻿from __future__ import annotations
+
+import argparse
+import cProfile
+import json
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ContextDecorator, contextmanager
+from pathlib import Path
+from types import FrameType
+from typing import Iterator, Optional
+
+# Timers and counters are process-wide and always on: a timer costs about a microsecond,
+# which is noise next to a query, a ZIP load or an HTTP request. Names are dotted
+# "<phase>.<step>"; nested timers are inclusive (``phase3.parse`` contains its re-asks).
+
+PROFILE_MODES = ("off", "cprofile", "sample")
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+
+class Recorder:
+    """Thread-safe accumulator of named timings and counters."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._timers: dict[str, list[float]] = {}
+        self._counters: Counter[str] = Counter()
+        self._started = time.perf_counter()
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._timers.get(name)
+            if entry is None:
+                self._timers[name] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                if seconds > entry[2]:
+                    entry[2] = seconds
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+            self._started = time.perf_counter()
+
+    def report(self) -> dict[str, object]:
+        """Timers (largest total first) and counters since the last ``reset``."""
+        with self._lock:
+            timers = sorted(self._timers.items(), key=lambda item: -item[1][1])
+            counters = dict(sorted(self._counters.items()))
+            wall = time.perf_counter() - self._started
+        return {
+            "wall_seconds": round(wall, 3),
+            "timers": {
+                name: {
+                    "calls": int(calls),
+                    "total_seconds": round(total, 4),
+                    "mean_ms": round(total / calls * 1000, 3),
+                    "max_ms": round(longest * 1000, 3),
+                }
+                for name, (calls, total, longest) in timers
+            },
+            "counters": counters,
+        }
+
+
+RECORDER = Recorder()
+
+
+class timed(ContextDecorator):
+    """Time a block (``with timed("phase2.query"):``) or every call of a function (``@timed(...)``)."""
+
+    def __init__(self, name: str, recorder: Optional[Recorder] = None) -> None:
+        self.name = name
+        self.recorder = recorder or RECORDER
+        self._started = 0.0
+
+    def _recreate_cm(self) -> timed:
+        # A decorated function may run on several threads at once; each call gets its own timer.
+        return timed(self.name, self.recorder)
+
+    def __enter__(self) -> timed:
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.recorder.add_time(self.name, time.perf_counter() - self._started)
+
+
+def count(name: str, value: int = 1) -> None:
+    RECORDER.count(name, value)
+
+
+def format_report(report: dict[str, object]) -> str:
+    lines = [f"wall_seconds={report['wall_seconds']}"]
+    for name, stats in report["timers"].items():
+        lines.append(
+            f"{name}: calls={stats['calls']} total={stats['total_seconds']}s "
+            f"mean={stats['mean_ms']}ms max={stats['max_ms']}ms"
+        )
+    for name, value in report["counters"].items():
+        lines.append(f"{name}={value}")
+    return "\n".join(lines)
+
+
+def write_report(path: Path, report: dict[str, object]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def _frame_stack(frame: Optional[FrameType]) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """Samples every thread's stack at ``interval`` seconds into collapsed stacks.
+
+    Unlike cProfile this sees the Phase 3 worker threads and adds no per-call overhead.
+    ``write`` produces the folded ``stack count`` format read by flamegraph tools.
+    """
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL) -> None:
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own:
+                    self.stacks[_frame_stack(frame)] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as handle:
+            for stack, samples in self.stacks.most_common():
+                handle.write(f"{stack} {samples}\n")
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """The shared ``--timing-report`` / ``--profile`` / ``--profile-path`` script flags."""
+    parser.add_argument(
+        "--timing-report",
+        default=None,
+        help="Write per-step timings and counters as JSON to this path (a summary is printed too)",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=PROFILE_MODES,
+        default="off",
+        help="cprofile: deterministic profile of the main thread; sample: stack sampling of all threads",
+    )
+    parser.add_argument(
+        "--profile-path",
+        default=None,
+        help="Profile output (defaults to logs/<script>.prof or logs/<script>.folded)",
+    )
+
+
+@contextmanager
+def session(
+    name: str,
+    timing_report: Optional[str] = None,
+    profile: str = "off",
+    profile_path: Optional[str] = None,
+) -> Iterator[Recorder]:
+    """Run a script body with fresh timers, an optional profiler and a report at the end."""
+    RECORDER.reset()
+    profiler: Optional[cProfile.Profile] = None
+    sampler: Optional[SamplingProfiler] = None
+    if profile == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif profile == "sample":
+        sampler = SamplingProfiler()
+        sampler.start()
+    try:
+        with timed(f"{name}.total"):
+            yield RECORDER
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            path = Path(profile_path or f"logs/{name}.prof")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(str(path))
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+            print(f"profile={path}")
+        if sampler is not None:
+            sampler.stop()
+            path = Path(profile_path or f"logs/{name}.folded")
+            sampler.write(path)
+            print(f"profile={path} samples={sum(sampler.stacks.values())}")
+        if timing_report:
+            report = RECORDER.report()
+            write_report(Path(timing_report), report)
+            print(format_report(report))
+            print(f"timing_report={timing_report}")
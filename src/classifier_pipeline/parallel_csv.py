@@ -0,0 +1,222 @@
+﻿from __future__ import annotations
+
+import csv
+import gc
+import io
+import mmap
+import os
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Sequence
+
+from classifier_pipeline.artifact_io import compression_for, open_text, part_paths
+
+DEFAULT_CHUNK_BYTES = 16 * 1024 * 1024
+
+# Quote counting slices the map in windows of this size, so memory stays bounded.
+_SCAN_BYTES = 4 * 1024 * 1024
+# Leading values per column used to decide whether sharing repeated strings is worth it.
+_SAMPLE_VALUES = 1024
+
+# (path, start, end) byte range of whole records; (path, None, None) for a compressed part.
+Task = tuple[str, Optional[int], Optional[int]]
+
+
+def _count_quotes(buffer: bytes | mmap.mmap, start: int, end: int) -> int:
+    count = 0
+    for offset in range(start, end, _SCAN_BYTES):
+        count += buffer[offset : min(offset + _SCAN_BYTES, end)].count(b'"')
+    return count
+
+
+def _record_end(buffer: bytes | mmap.mmap, pos: int, parity: int) -> int:
+    """Offset just past the first newline at or after ``pos`` that lies outside quotes.
+
+    ``parity`` is the number of quote characters before ``pos`` modulo 2. Doubled quotes
+    inside a quoted field count twice, so an even count means "between fields".
+    """
+    size = len(buffer)
+    while pos < size:
+        newline = buffer.find(b"\n", pos)
+        if newline < 0:
+            return size
+        parity ^= _count_quotes(buffer, pos, newline) & 1
+        if not parity:
+            return newline + 1
+        pos = newline + 1
+    return size
+
+
+def record_boundaries(buffer: bytes | mmap.mmap, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> list[int]:
+    """Offsets splitting a CSV buffer into the header and ~``chunk_bytes`` runs of whole records.
+
+    The first offset is the end of the header, the last is ``len(buffer)``; a newline inside a
+    quoted field (e.g. a multi-line ``Utterance``) never becomes a boundary.
+    """
+    size = len(buffer)
+    bounds = [_record_end(buffer, 0, 0)]
+    while bounds[-1] + chunk_bytes < size:
+        target = bounds[-1] + chunk_bytes
+        end = _record_end(buffer, target, _count_quotes(buffer, bounds[-1], target) & 1)
+        if end >= size:
+            break
+        bounds.append(end)
+    if bounds[-1] < size:
+        bounds.append(size)
+    return bounds
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    # Building millions of small lists/tuples triggers repeated full collections that
+    # find nothing to free; pausing the collector roughly halves parse time.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _shared(values: Sequence[str]) -> list[str]:
+    # Most columns hold few distinct values (file names, roles, classifiers); sharing one
+    # string object per value cuts memory and the pickling back from workers. Columns that
+    # look mostly distinct in their first values (utterances, ids) are copied as they are.
+    sample = values[:_SAMPLE_VALUES]
+    if len(set(sample)) * 2 > len(sample):
+        return list(values)
+    seen: dict[str, str] = {}
+    return list(map(seen.setdefault, values, values))
+
+
+def _fit(record: list[str], width: int) -> list[Optional[str]]:
+    # As csv.DictReader: missing trailing fields are None. Extra fields, which DictReader
+    # files under a None key, have no column here and are dropped.
+    if len(record) < width:
+        return record + [None] * (width - len(record))
+    return record[:width]
+
+
+def _columns(records: list[list[str]], width: int) -> list[list[str]]:
+    if any(len(record) != width for record in records):
+        # Blank lines parse as [] and are skipped, again as csv.DictReader does.
+        records = [_fit(record, width) for record in records if record]
+    if not records:
+        return [[] for _ in range(width)]
+    return [_shared(values) for values in zip(*records)]
+
+
+def _parse_task(task: Task, width: int) -> list[list[str]]:
+    path, start, end = task
+    with _gc_paused():
+        if start is None:
+            with open_text(Path(path)) as handle:
+                reader = csv.reader(handle)
+                next(reader, None)
+                return _columns(list(reader), width)
+        with open(path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            text = buffer[start:end].decode("utf-8")
+        return _columns(list(csv.reader(io.StringIO(text, newline=""))), width)
+
+
+def _read_header(path: Path) -> list[str]:
+    with open_text(path) as handle:
+        return next(csv.reader(handle), [])
+
+
+def plan_tasks(path: Path, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> tuple[list[str], list[Task]]:
+    """Header and parse tasks for a (possibly compressed or chunked) CSV artifact.
+
+    Plain files are split at record boundaries found on a memory map; compressed parts
+    cannot be split and become one task each.
+    """
+    header: Optional[list[str]] = None
+    tasks: list[Task] = []
+    for part in part_paths(path):
+        if header is None:
+            header = _read_header(part)
+        if compression_for(part) or part.stat().st_size == 0:
+            tasks.append((str(part), None, None))
+            continue
+        with part.open("rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            bounds = record_boundaries(buffer, chunk_bytes)
+        tasks.extend((str(part), start, end) for start, end in zip(bounds, bounds[1:]))
+    return header or [], tasks
+
+
+class RowView(Mapping):
+    """Read-only row of a ``ColumnTable``; values are looked up in the columns on access."""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: ColumnTable, index: int) -> None:
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key: str) -> str:
+        return self._table.columns[self._table.positions[key]][self._index]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table.header)
+
+    def __len__(self) -> int:
+        return len(self._table.header)
+
+    def __repr__(self) -> str:
+        return f"RowView({dict(self)!r})"
+
+
+class ColumnTable:
+    """CSV contents as one list per column, with row views and dict conversion on demand."""
+
+    def __init__(self, header: Sequence[str], columns: Sequence[list[str]]) -> None:
+        self.header = list(header)
+        self.columns = list(columns)
+        self.positions = {name: position for position, name in enumerate(self.header)}
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def column(self, name: str) -> list[str]:
+        return self.columns[self.positions[name]]
+
+    def row(self, index: int) -> RowView:
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return RowView(self, index)
+
+    def rows(self) -> Iterator[RowView]:
+        return (RowView(self, index) for index in range(len(self)))
+
+    def to_dicts(self) -> list[dict[str, str]]:
+        header = self.header
+        with _gc_paused():
+            return [dict(zip(header, values)) for values in zip(*self.columns)]
+
+
+def read_table(path: Path, workers: Optional[int] = None, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> ColumnTable:
+    """Parse a CSV artifact into a ``ColumnTable``, chunks in parallel across ``workers`` processes.
+
+    ``workers`` defaults to (and is capped at) the CPU count; with one worker or one chunk
+    everything is parsed in this process.
+    """
+    header, tasks = plan_tasks(path, chunk_bytes)
+    width = len(header)
+    cpus = os.cpu_count() or 1
+    workers = min(workers or cpus, cpus, len(tasks))
+    if workers <= 1:
+        results = (_parse_task(task, width) for task in tasks)
+        return _concat(header, results)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return _concat(header, pool.map(_parse_task, tasks, [width] * len(tasks)))
+
+
+def _concat(header: Sequence[str], results: Iterator[list[list[str]]]) -> ColumnTable:
+    columns: list[list[str]] = [[] for _ in header]
+    for chunk in results:
+        for column, values in zip(columns, chunk):
+            column.extend(values)
+    return ColumnTable(header, columns)
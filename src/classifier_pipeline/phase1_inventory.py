@@ -2,16 +2,17 @@
 
 from dataclasses import dataclass
 from collections import Counter
-from typing import Iterable, Optional
+from typing import TYPE_CHECKING, Iterable, Optional
 from urllib.parse import urljoin
 import csv
 import json
 import os
 import time
 
-import requests
-from bs4 import BeautifulSoup
-import pylangacq
+# The TalkBank backend's parsers (bs4/lxml, pylangacq) and requests are imported where
+# they are used, so the childes-db backend and importers of this module do not load them.
+if TYPE_CHECKING:
+    import pylangacq
 
 from classifier_pipeline.childes_db import (
     apply_grouped_counts,
@@ -22,6 +23,7 @@ from classifier_pipeline.childes_db import (
     fetch_transcript_metadata,
     fetch_utterance_counts,
 )
+from classifier_pipeline.instrumentation import count, timed
 
 CHINESE_INDEX_URL = "https://talkbank.org/childes/access/Chinese/"
 DEFAULT_LANGUAGE_FILTER = ("zho", "yue", "nan", "cmn")
@@ -39,6 +41,8 @@ class CorpusEntry:
 
 
 def parse_chinese_corpora_index(html: str, base_url: str) -> list[CorpusEntry]:
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "lxml")
 
     table = None
@@ -95,6 +99,8 @@ def parse_chinese_corpora_index(html: str, base_url: str) -> list[CorpusEntry]:
 
 
 def extract_zip_url_from_corpus_page(html: str, base_url: Optional[str] = None) -> Optional[str]:
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "lxml")
     for anchor in soup.find_all("a"):
         href = anchor.get("href")
@@ -106,12 +112,16 @@ def extract_zip_url_from_corpus_page(html: str, base_url: Optional[str] = None)
 
 
 def fetch_chinese_corpora_index(url: str = CHINESE_INDEX_URL) -> list[CorpusEntry]:
+    import requests
+
     response = requests.get(url, timeout=60)
     response.raise_for_status()
     return parse_chinese_corpora_index(response.text, base_url=url)
 
 
 def fetch_zip_url_for_corpus(page_url: str) -> Optional[str]:
+    import requests
+
     response = requests.get(page_url, timeout=60)
     response.raise_for_status()
     return extract_zip_url_from_corpus_page(response.text, base_url=page_url)
@@ -191,9 +201,13 @@ def run_phase1_inventory(
     classifiers: Iterable[str],
     sections: Optional[set[str]] = None,
 ) -> list[dict[str, object]]:
+    import pylangacq
+    import requests
+
     os.makedirs(output_dir, exist_ok=True)
 
-    entries = fetch_chinese_corpora_index()
+    with timed("phase1.index"):
+        entries = fetch_chinese_corpora_index()
     if sections:
         entries = [entry for entry in entries if entry.section in sections]
 
@@ -218,7 +232,8 @@ def run_phase1_inventory(
             continue
 
         try:
-            zip_url = fetch_zip_url_for_corpus(entry.page_url)
+            with timed("phase1.corpus_page"):
+                zip_url = fetch_zip_url_for_corpus(entry.page_url)
         except requests.RequestException as exc:
             row["status"] = f"page_error:{type(exc).__name__}"
             rows.append(row)
@@ -232,26 +247,33 @@ def run_phase1_inventory(
         row["zip_url"] = zip_url
 
         try:
-            reader = pylangacq.Reader.from_zip(zip_url, parallel=False)
+            with timed("phase1.zip_load"):
+                reader = pylangacq.Reader.from_zip(zip_url, parallel=False)
         except Exception as exc:  # pragma: no cover - exercised in integration only
             row["status"] = f"zip_error:{type(exc).__name__}"
             rows.append(row)
             continue
 
-        stats = collect_corpus_stats(reader, classifiers)
+        with timed("phase1.corpus_stats"):
+            stats = collect_corpus_stats(reader, classifiers)
         row.update(stats)
         row["status"] = "ok"
         rows.append(row)
 
+    for row in rows:
+        # "zip_error:HTTPError" -> phase1.status.zip_error
+        count(f"phase1.status.{str(row['status']).split(':')[0]}")
+
     timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    _write_csv(rows, os.path.join(output_dir, "phase1_corpus_stats.csv"))
-    _write_json(rows, os.path.join(output_dir, "phase1_corpus_stats.json"))
-    _write_summary_markdown(
-        rows,
-        os.path.join(output_dir, "phase1_summary.md"),
-        classifiers,
-        timestamp=timestamp,
-    )
+    with timed("phase1.write"):
+        _write_csv(rows, os.path.join(output_dir, "phase1_corpus_stats.csv"))
+        _write_json(rows, os.path.join(output_dir, "phase1_corpus_stats.json"))
+        _write_summary_markdown(
+            rows,
+            os.path.join(output_dir, "phase1_summary.md"),
+            classifiers,
+            timestamp=timestamp,
+        )
 
     return rows
 
@@ -312,19 +334,20 @@ def run_phase1_inventory_db(
     rows = list(rows_by_corpus.values())
 
     timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    _write_csv(rows, os.path.join(output_dir, "phase1_corpus_stats.csv"))
-    _write_json(rows, os.path.join(output_dir, "phase1_corpus_stats.json"))
-    _write_summary_markdown(
-        rows,
-        os.path.join(output_dir, "phase1_summary.md"),
-        classifiers,
-        timestamp=timestamp,
-        metadata={
-            "source": "childes-db",
-            "db_version": database,
-            "language_filter": language_filter,
-        },
-    )
+    with timed("phase1.write"):
+        _write_csv(rows, os.path.join(output_dir, "phase1_corpus_stats.csv"))
+        _write_json(rows, os.path.join(output_dir, "phase1_corpus_stats.json"))
+        _write_summary_markdown(
+            rows,
+            os.path.join(output_dir, "phase1_summary.md"),
+            classifiers,
+            timestamp=timestamp,
+            metadata={
+                "source": "childes-db",
+                "db_version": database,
+                "language_filter": language_filter,
+            },
+        )
 
     return rows
 
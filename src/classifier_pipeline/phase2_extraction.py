@@ -2,31 +2,21 @@
 
 import csv
 import random
-from typing import Iterable, Optional, Sequence
-
-import pymysql
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional, Sequence
 
+from classifier_pipeline.artifact_io import CsvArtifactWriter, open_text
 from classifier_pipeline.childes_db import connect_childes_db
-
-OUTPUT_HEADERS = [
-    "File Name",
-    "Collection_Type",
-    "Speaker_Code",
-    "Speaker_Role",
-    "Age",
-    "Utterance",
-    "%gra",
-    "Determiner/Numbers",
-    "Classifier",
-    "utterance_id",
-    "utterance_order",
-    "classifier_token_order",
-    "transcript_id",
-    "determiner_type",
-    "specific_semantic_class",
-    "Classifier type",
-    "Over use of Ge...",
-]
+from classifier_pipeline.columns import (  # re-exported for existing importers
+    DEMONSTRATIVE_TOKENS,
+    INTERROGATIVE_TOKENS,
+    OUTPUT_HEADERS,
+    QUANTIFIER_TOKENS,
+    SPECIFIC_SEMANTIC_CLASS_MAP,
+    compute_determiner_type,
+    compute_specific_semantic_class,
+)
+from classifier_pipeline.instrumentation import count, timed
 
 REJECTED_HEADERS = [
     "File Name",
@@ -89,78 +79,6 @@ DEFAULT_EXCLUDE_LANGS = ("yue", "nan")
 DEFAULT_COLLECTIONS = ("Chinese",)
 
 
-DEMONSTRATIVE_TOKENS = frozenset({"这", "那", "此", "该"})
-INTERROGATIVE_TOKENS = frozenset({"几", "哪"})
-QUANTIFIER_TOKENS = frozenset({"每", "各"})
-
-
-# Classifier semantic classes are deterministic and classifier-token-based.
-# The taxonomy is designed for aggregation analyses (e.g., animacy vs shape vs temporal).
-SPECIFIC_SEMANTIC_CLASS_MAP = {
-    "个": "general",
-    "只": "animacy",
-    "头": "animacy",
-    "位": "animacy",
-    "名": "animacy",
-    "条": "shape",
-    "张": "shape",
-    "片": "shape",
-    "根": "shape",
-    "颗": "granular_piece",
-    "本": "artifact_function",
-    "部": "artifact_function",
-    "辆": "artifact_function",
-    "架": "artifact_function",
-    "把": "artifact_function",
-    "件": "artifact_function",
-    "碗": "container_portion",
-    "份": "container_portion",
-    "元": "measure_currency",
-    "分": "measure_currency",
-    "块": "measure_portion",
-    "年": "temporal_event",
-    "次": "temporal_event",
-    "天": "temporal_event",
-    "岁": "temporal_event",
-    "场": "event_occurrence",
-    "下": "event_occurrence",
-    "种": "type_kind",
-    "句": "discourse_unit",
-    "家": "institution_household",
-    "组": "collective",
-    "群": "collective",
-    "对": "collective",
-    "笔": "transaction_stroke",
-}
-
-
-def compute_determiner_type(token: str) -> str:
-    """Classify a determiner/number token into a semantic type.
-
-    Since Phase 2 extraction already filters to num*, det, and pro:dem POS tags,
-    every token in the Determiner/Numbers column belongs to one of these categories.
-    """
-    token = token.strip()
-    if not token:
-        return "unknown"
-    if token in DEMONSTRATIVE_TOKENS:
-        return "demonstrative"
-    if token in INTERROGATIVE_TOKENS:
-        return "interrogative"
-    if token in QUANTIFIER_TOKENS:
-        return "quantifier"
-    if token.startswith("第"):
-        return "ordinal"
-    return "numeral"
-
-
-def compute_specific_semantic_class(classifier: str) -> str:
-    token = classifier.strip()
-    if not token:
-        return "other"
-    return SPECIFIC_SEMANTIC_CLASS_MAP.get(token, "other")
-
-
 def is_number_or_determiner(part_of_speech: Optional[str]) -> bool:
     if not part_of_speech:
         return False
@@ -224,6 +142,64 @@ def build_output_row(record: dict[str, object]) -> dict[str, object]:
     }
 
 
+class ExtractedRow(NamedTuple):
+    """One extraction query row, in SELECT order; field names match ``build_output_row`` records."""
+
+    file_name: object
+    collection_type: object
+    speaker_code: object
+    speaker_role: object
+    age: object
+    utterance: object
+    gra: object
+    determiner: object
+    determiner_pos: object
+    classifier: object
+    utterance_id: object
+    utterance_order: object
+    classifier_token_order: object
+    transcript_id: object
+
+
+def build_output_values(
+    row: ExtractedRow,
+    determiner_types: dict[object, str],
+    semantic_classes: dict[object, str],
+) -> tuple[object, ...]:
+    """``build_output_row`` as a tuple in ``OUTPUT_HEADERS`` order, for ``csv.writer``.
+
+    Derived columns come from per-token lookup tables; ``determiner_types`` is filled in as
+    new tokens are seen, ``semantic_classes`` is normally prebuilt for the queried classifiers.
+    """
+    determiner = row.determiner or ""
+    determiner_type = determiner_types.get(determiner)
+    if determiner_type is None:
+        determiner_type = determiner_types[determiner] = compute_determiner_type(str(determiner))
+    classifier = row.classifier
+    semantic_class = semantic_classes.get(classifier)
+    if semantic_class is None:
+        semantic_class = semantic_classes[classifier] = compute_specific_semantic_class(str(classifier or ""))
+    return (
+        row.file_name,
+        row.collection_type,
+        row.speaker_code,
+        row.speaker_role,
+        row.age,
+        row.utterance,
+        row.gra,
+        determiner,
+        classifier or "",
+        row.utterance_id,
+        row.utterance_order,
+        row.classifier_token_order,
+        row.transcript_id,
+        determiner_type,
+        semantic_class,
+        "",
+        "",
+    )
+
+
 def build_rejected_row(record: dict[str, object]) -> dict[str, object]:
     classifier = str(record.get("classifier") or "")
     return {
@@ -255,7 +231,16 @@ def write_phase2_csv(
     rejected_sample_size: int = 50,
     rejected_seed: int = 13,
     db_name: Optional[str] = None,
+    connection_factory: Optional[Callable[[], Any]] = None,
+    max_part_bytes: Optional[int] = None,
 ) -> int:
+    """Stream the extraction query into ``output_path`` and return the number of rows written.
+
+    ``connection_factory`` replaces ``connect_childes_db(db_name)``, e.g. with a local
+    fixture connection (see ``classifier_pipeline.benchmark``). A ``.gz``/``.zst`` output
+    path is compressed; with ``max_part_bytes`` the rows are split into part files plus a
+    manifest (see ``classifier_pipeline.artifact_io``).
+    """
     language_clause, language_params = build_mandarin_language_clause(
         "u.language", include_langs, exclude_langs
     )
@@ -304,65 +289,52 @@ def write_phase2_csv(
     rng = random.Random(rejected_seed)
     rejected_samples: list[dict[str, object]] = []
     rejected_seen = 0
-
-    rows_written = 0
-    with connect_childes_db(db_name) as conn:
+    rejected_total = 0
+
+    def _accepted_values(cur: Iterable[Sequence[object]]) -> Iterator[tuple[object, ...]]:
+        nonlocal rejected_seen, rejected_total
+        make_row = ExtractedRow._make
+        determiner_types: dict[object, str] = {}
+        semantic_classes = {classifier: compute_specific_semantic_class(classifier) for classifier in classifier_list}
+        # POS tags repeat heavily, so the accept/reject decision is cached per tag too.
+        accepted_pos: dict[object, bool] = {}
+
+        for values in cur:
+            row = make_row(values)
+            accepted = accepted_pos.get(row.determiner_pos)
+            if accepted is None:
+                accepted = accepted_pos[row.determiner_pos] = is_number_or_determiner(row.determiner_pos)
+
+            if not accepted:
+                rejected_total += 1
+                if rejected_output_path and rejected_sample_size > 0:
+                    rejected_seen += 1
+                    if len(rejected_samples) < rejected_sample_size:
+                        rejected_samples.append(build_rejected_row(row._asdict()))
+                    else:
+                        index = rng.randint(0, rejected_seen - 1)
+                        if index < rejected_sample_size:
+                            rejected_samples[index] = build_rejected_row(row._asdict())
+                continue
+
+            yield build_output_values(row, determiner_types, semantic_classes)
+
+    connect = connection_factory or (lambda: connect_childes_db(db_name))
+    with connect() as conn:
         with conn.cursor() as cur:
-            cur.execute(query, params)
-
-            with open(output_path, "w", newline="", encoding="utf-8") as handle:
-                writer = csv.DictWriter(handle, fieldnames=OUTPUT_HEADERS)
-                writer.writeheader()
-
-                for (
-                    file_name,
-                    collection_type,
-                    speaker_code,
-                    speaker_role,
-                    age,
-                    utterance,
-                    gra,
-                    determiner,
-                    determiner_pos,
-                    classifier,
-                    utterance_id,
-                    utterance_order,
-                    classifier_token_order,
-                    transcript_id,
-                ) in cur:
-                    record = {
-                        "file_name": file_name,
-                        "collection_type": collection_type,
-                        "speaker_code": speaker_code,
-                        "speaker_role": speaker_role,
-                        "age": age,
-                        "utterance": utterance,
-                        "gra": gra,
-                        "determiner": determiner,
-                        "determiner_pos": determiner_pos,
-                        "classifier": classifier,
-                        "utterance_id": utterance_id,
-                        "utterance_order": utterance_order,
-                        "classifier_token_order": classifier_token_order,
-                        "transcript_id": transcript_id,
-                    }
-
-                    if not is_number_or_determiner(determiner_pos):
-                        if rejected_output_path and rejected_sample_size > 0:
-                            rejected_seen += 1
-                            if len(rejected_samples) < rejected_sample_size:
-                                rejected_samples.append(build_rejected_row(record))
-                            else:
-                                index = rng.randint(0, rejected_seen - 1)
-                                if index < rejected_sample_size:
-                                    rejected_samples[index] = build_rejected_row(record)
-                        continue
-
-                    writer.writerow(build_output_row(record))
-                    rows_written += 1
+            with timed("phase2.query"):
+                cur.execute(query, params)
+            # On a streaming cursor this also covers fetching the result set.
+            with timed("phase2.write"), CsvArtifactWriter(
+                Path(output_path), OUTPUT_HEADERS, max_part_bytes=max_part_bytes
+            ) as writer:
+                writer.writerows(_accepted_values(cur))
+    rows_written = writer.rows
+    count("phase2.rows_written", rows_written)
+    count("phase2.rows_rejected", rejected_total)
 
     if rejected_output_path and rejected_samples:
-        with open(rejected_output_path, "w", newline="", encoding="utf-8") as handle:
+        with open_text(Path(rejected_output_path), "w") as handle:
             writer = csv.DictWriter(handle, fieldnames=REJECTED_HEADERS)
             writer.writeheader()
             writer.writerows(rejected_samples)
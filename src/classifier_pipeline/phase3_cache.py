@@ -0,0 +1,77 @@
+﻿from __future__ import annotations
+
+import threading
+from typing import Callable, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+# Providers whose OpenAI-compatible API accepts ``cache_control`` on message content parts.
+# OpenRouter forwards the hint to providers with explicit caching and ignores it elsewhere;
+# DeepSeek, Kimi and OpenAI models cache identical prefixes automatically.
+CACHE_CONTROL_PROVIDERS = frozenset({"openrouter"})
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def cached_tokens_from_usage(usage: dict[str, object]) -> int:
+    """Cached prompt tokens from an OpenAI-style ``usage`` block (0 when not reported)."""
+    details = usage.get("prompt_tokens_details") or {}
+    if isinstance(details, dict) and details.get("cached_tokens") is not None:
+        return int(details["cached_tokens"])
+    return int(usage.get("cache_read_input_tokens") or 0)
+
+
+class PromptUsage:
+    """Thread-safe running totals of prompt, cached and completion tokens (and reported cost).
+
+    Records are also forwarded to ``parent`` so per-tier totals can roll up into a run total.
+    """
+
+    def __init__(self, parent: Optional["PromptUsage"] = None) -> None:
+        self.parent = parent
+        self.requests = 0
+        self.reported = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.cost_reported = 0
+        self._lock = threading.Lock()
+
+    def record(self, usage: Optional[dict[str, object]]) -> None:
+        if self.parent is not None:
+            self.parent.record(usage)
+        with self._lock:
+            self.requests += 1
+            if not usage:
+                return
+            self.reported += 1
+            self.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+            self.completion_tokens += int(usage.get("completion_tokens") or 0)
+            self.cached_tokens += cached_tokens_from_usage(usage)
+            if usage.get("cost") is not None:
+                self.cost += float(usage["cost"])
+                self.cost_reported += 1
+
+    @property
+    def cached_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def summary(self) -> dict[str, object]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "requests_with_usage": self.reported,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_ratio": round(self.cached_ratio, 4),
+                "cost": round(self.cost, 6),
+            }
+
+
+def order_by_prefix(items: Sequence[T], prompt_text: Callable[[T], str]) -> list[T]:
+    """Sort items by their prompt text so requests sharing a prefix are sent back to back.
+
+    The sort is stable, so items with identical prompts keep their input order.
+    """
+    return sorted(items, key=prompt_text)
@@ -0,0 +1,188 @@
+﻿from __future__ import annotations
+
+import json
+import threading
+from collections import Counter
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Callable, Optional
+
+from classifier_pipeline.columns import compute_specific_semantic_class
+from classifier_pipeline.phase3_cache import PromptUsage
+from classifier_pipeline.phase3_review import COMPARED_FIELDS, normalize_field
+from classifier_pipeline.phase3_rules import GENERAL_CLASSIFIER
+from classifier_pipeline.phase3_schema import RESPONSE_KEYS, validate_response
+
+ESCALATE_FLAGGED = "flagged"
+ESCALATE_MALFORMED = "malformed"
+ESCALATE_PRIOR = "prior"
+ESCALATE_INCONSISTENT = "inconsistent"
+ESCALATE_DISAGREEMENT = "self_consistency"
+
+CHEAP = "cheap"
+STRONG = "strong"
+
+
+@dataclass(frozen=True)
+class CascadeTier:
+    """One annotation configuration; ``model=None`` means the run's configured model."""
+
+    model: Optional[str] = None
+    reasoning_effort: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        return f"{self.model}@{self.reasoning_effort or 'default'}"
+
+
+@dataclass(frozen=True)
+class CascadeConfig:
+    """Two-tier annotation: every row goes to ``cheap``; uncertain rows are redone by ``strong``.
+
+    With ``samples`` > 1 the cheap tier is asked that many times and any disagreement on
+    the compared fields escalates the row.
+    """
+
+    cheap: CascadeTier
+    strong: CascadeTier
+    samples: int = 1
+
+    def resolved(self, default_model: str) -> "CascadeConfig":
+        return replace(
+            self,
+            cheap=replace(self.cheap, model=self.cheap.model or default_model),
+            strong=replace(self.strong, model=self.strong.model or default_model),
+        )
+
+
+def _is_true(value: object) -> bool:
+    return normalize_field(value).lower() in {"true", "yes", "1"}
+
+
+def prior_disagrees(row: dict[str, object]) -> bool:
+    """A specific classifier whose annotated convention falls in a different semantic class."""
+    classifier = normalize_field(row.get("Classifier"))
+    conventional = normalize_field(row.get("conventional_classifier_zh"))
+    if classifier == GENERAL_CLASSIFIER or conventional in {"", "N/A", classifier}:
+        return False
+    used_class = compute_specific_semantic_class(classifier)
+    conventional_class = compute_specific_semantic_class(conventional)
+    if "other" in {used_class, conventional_class}:
+        return False
+    return used_class != conventional_class
+
+
+def overuse_inconsistent(row: dict[str, object]) -> bool:
+    """``overuse_of_ge`` contradicting the annotated convention for a 个 row."""
+    if normalize_field(row.get("Classifier")) != GENERAL_CLASSIFIER:
+        return False
+    conventional = normalize_field(row.get("conventional_classifier_zh"))
+    if conventional in {"", "N/A"}:
+        return False
+    return _is_true(row.get("overuse_of_ge")) != (conventional != GENERAL_CLASSIFIER)
+
+
+def escalation_reasons(results: list[dict[str, object]]) -> list[str]:
+    """Why a cheap-tier annotation (one result per sample) should be redone by the strong tier."""
+    first = results[0]
+    reasons = []
+    if _is_true(first.get("flag_for_review")):
+        reasons.append(ESCALATE_FLAGGED)
+    if validate_response({key: first.get(key) for key in RESPONSE_KEYS}).invalid:
+        reasons.append(ESCALATE_MALFORMED)
+    if prior_disagrees(first):
+        reasons.append(ESCALATE_PRIOR)
+    if overuse_inconsistent(first):
+        reasons.append(ESCALATE_INCONSISTENT)
+    for field in COMPARED_FIELDS:
+        if len({normalize_field(result.get(field)) for result in results}) > 1:
+            reasons.append(ESCALATE_DISAGREEMENT)
+            break
+    return reasons
+
+
+class CascadeStats:
+    """Per-run escalation counts and token usage per tier. Thread-safe."""
+
+    def __init__(self, config: CascadeConfig, run_usage: Optional[PromptUsage] = None) -> None:
+        self.config = config
+        self.usage = {CHEAP: PromptUsage(run_usage), STRONG: PromptUsage(run_usage)}
+        self.rows = 0
+        self.escalated = 0
+        self.reasons: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, reasons: list[str]) -> None:
+        with self._lock:
+            self.rows += 1
+            if reasons:
+                self.escalated += 1
+                self.reasons.update(reasons)
+
+    def report(self) -> dict[str, object]:
+        cheap = self.usage[CHEAP].summary()
+        strong = self.usage[STRONG].summary()
+        with self._lock:
+            rows, escalated, reasons = self.rows, self.escalated, dict(self.reasons)
+        report: dict[str, object] = {
+            "cheap_tier": self.config.cheap.label,
+            "strong_tier": self.config.strong.label,
+            "cheap_samples": self.config.samples,
+            "rows": rows,
+            "escalated": escalated,
+            "escalation_rate": round(escalated / rows, 4) if rows else 0.0,
+            "reasons": reasons,
+            "cheap_usage": cheap,
+            "strong_usage": strong,
+        }
+        # Baseline = every row on the strong tier, priced at the strong tier's observed
+        # cost (or tokens) per escalated row.
+        for unit, cheap_total, strong_total in (
+            ("cost", cheap["cost"], strong["cost"]),
+            ("tokens", cheap["prompt_tokens"] + cheap["completion_tokens"], strong["prompt_tokens"] + strong["completion_tokens"]),
+        ):
+            if not escalated or not strong_total:
+                continue
+            baseline = strong_total / escalated * rows
+            actual = cheap_total + strong_total
+            report[f"{unit}_actual"] = round(actual, 6)
+            report[f"{unit}_all_strong_estimate"] = round(baseline, 6)
+            report[f"{unit}_savings"] = round(1 - actual / baseline, 4) if baseline else 0.0
+        return report
+
+
+def run_cascade_row(
+    row: dict[str, str],
+    config: CascadeConfig,
+    stats: CascadeStats,
+    call_tier: Callable[[CascadeTier, PromptUsage], dict[str, str]],
+) -> dict[str, str]:
+    """Annotate ``row`` on the cheap tier and escalate to the strong tier when uncertain.
+
+    ``call_tier`` performs one full annotation with the given tier and returns the row.
+    A cheap-tier failure (unparseable output after retries) counts as malformed.
+    """
+    results: list[dict[str, str]] = []
+    try:
+        for _ in range(max(1, config.samples)):
+            results.append(call_tier(config.cheap, stats.usage[CHEAP]))
+        reasons = escalation_reasons(results)
+    except ValueError:
+        reasons = [ESCALATE_MALFORMED]
+    stats.record(reasons)
+    if not reasons:
+        result = results[0]
+        result["annotation_source"] = f"cascade:{CHEAP}"
+        return result
+    result = call_tier(config.strong, stats.usage[STRONG])
+    result["annotation_source"] = f"cascade:{STRONG}:" + "+".join(reasons)
+    return result
+
+
+def cascade_report_path(output_path: Path) -> Path:
+    return output_path.with_name(output_path.stem + ".cascade.json")
+
+
+def write_report(path: Path, report: dict[str, object]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
@@ -0,0 +1,213 @@
+﻿from __future__ import annotations
+
+import csv
+import itertools
+import json
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from operator import methodcaller
+from pathlib import Path
+from typing import Iterable, Mapping, Optional, Sequence
+
+from classifier_pipeline.phase3_review import RowKey, _normalize_for_compare, align_runs
+
+AGREEMENT_FIELDS = (
+    "identified_noun",
+    "conventional_classifier_zh",
+    "classifier_type",
+    "overuse_of_ge",
+    "flag_for_review",
+)
+KAPPA_FIELDS = ("overuse_of_ge", "identified_noun")
+
+
+def cohens_kappa(table: Mapping[tuple[str, str], int]) -> Optional[float]:
+    """Cohen's kappa from a two-rater confusion table; ``None`` when empty.
+
+    When both raters use a single identical label throughout, kappa is reported as 1.0.
+    """
+    n = sum(table.values())
+    if not n:
+        return None
+    observed = sum(count for (a, b), count in table.items() if a == b) / n
+    left: Counter[str] = Counter()
+    right: Counter[str] = Counter()
+    for (a, b), count in table.items():
+        left[a] += count
+        right[b] += count
+    expected = sum(left[label] * right[label] for label in left) / (n * n)
+    if expected >= 1.0:
+        return 1.0 if observed >= 1.0 else 0.0
+    return (observed - expected) / (1.0 - expected)
+
+
+def fleiss_kappa(items: Iterable[tuple[str, ...]]) -> Optional[float]:
+    """Fleiss' kappa over items that were each rated by the same number (>= 2) of raters.
+
+    Items are grouped by rating pattern first, so the cost grows with the number of
+    distinct patterns rather than the number of rows.
+    """
+    patterns = Counter(items)
+    if not patterns:
+        return None
+    raters = len(next(iter(patterns)))
+    if raters < 2 or any(len(pattern) != raters for pattern in patterns):
+        raise ValueError("Fleiss' kappa needs the same number (>= 2) of ratings for every item")
+    totals: Counter[str] = Counter()
+    agreement = 0.0
+    for pattern, weight in patterns.items():
+        counts = Counter(pattern)
+        for label, count in counts.items():
+            totals[label] += count * weight
+        agreement += weight * (sum(count * count for count in counts.values()) - raters) / (raters * (raters - 1))
+    n_items = sum(patterns.values())
+    observed = agreement / n_items
+    ratings = n_items * raters
+    expected = sum((count / ratings) ** 2 for count in totals.values())
+    if expected >= 1.0:
+        return 1.0 if observed >= 1.0 else 0.0
+    return (observed - expected) / (1.0 - expected)
+
+
+@dataclass
+class PairStats:
+    left: str
+    right: str
+    field: str
+    rows: int
+    agreement: Optional[float]
+    kappa: Optional[float] = None
+
+
+@dataclass
+class FieldStats:
+    field: str
+    rows_all_runs: int
+    agreement_all_runs: Optional[float]
+    fleiss_kappa: Optional[float] = None
+    pairs: list[PairStats] = field(default_factory=list)
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 4) if value is not None else None
+
+
+def _normalized_values(
+    rows: dict[RowKey, dict[str, str]],
+    field_name: str,
+) -> dict[RowKey, str]:
+    # Answers repeat heavily, so each distinct raw value is normalised once and the
+    # per-row lookups stay in C (map/zip) rather than a Python-level loop.
+    raws = list(map(methodcaller("get", field_name), rows.values()))
+    normalized = {raw: _normalize_for_compare(field_name, raw) for raw in set(raws)}
+    return dict(zip(rows, map(normalized.__getitem__, raws)))
+
+
+def _pair_table(left_values: dict[RowKey, str], right_values: dict[RowKey, str], keys: Sequence[RowKey]) -> Counter[tuple[str, str]]:
+    return Counter(zip(map(left_values.__getitem__, keys), map(right_values.__getitem__, keys)))
+
+
+def confusion_table(
+    runs: dict[str, dict[RowKey, dict[str, str]]],
+    left: str,
+    right: str,
+    field_name: str,
+) -> Counter[tuple[str, str]]:
+    """Counts of (left value, right value) over the rows both runs annotated."""
+    left_values = _normalized_values(runs[left], field_name)
+    right_values = _normalized_values(runs[right], field_name)
+    return _pair_table(left_values, right_values, list(left_values.keys() & right_values.keys()))
+
+
+def compare_runs(
+    runs: dict[str, dict[RowKey, dict[str, str]]],
+    fields: Sequence[str] = AGREEMENT_FIELDS,
+    kappa_fields: Sequence[str] = KAPPA_FIELDS,
+) -> dict[str, object]:
+    """Per-field agreement across runs aligned on ``row_key`` (a hash join on the row index).
+
+    Pairwise figures (and Cohen's kappa) use the rows both runs annotated;
+    ``agreement_all_runs`` and Fleiss' kappa use the rows every run annotated. Kappas are
+    computed for ``kappa_fields`` only.
+    """
+    names = list(runs)
+    any_run: set[RowKey] = set().union(*(rows.keys() for rows in runs.values())) if runs else set()
+    complete = sorted(set.intersection(*(set(rows) for rows in runs.values()))) if runs else []
+    pairs = list(itertools.combinations(names, 2))
+    shared = {pair: list(runs[pair[0]].keys() & runs[pair[1]].keys()) for pair in pairs}
+
+    report_fields = []
+    for f in fields:
+        values = {name: _normalized_values(runs[name], f) for name in names}
+        stats = FieldStats(field=f, rows_all_runs=len(complete), agreement_all_runs=None)
+        if complete and len(names) > 1:
+            items = list(zip(*(map(values[name].__getitem__, complete) for name in names)))
+            stats.agreement_all_runs = _round(sum(1 for item in items if len(set(item)) == 1) / len(items))
+            if f in kappa_fields:
+                stats.fleiss_kappa = _round(fleiss_kappa(items))
+        for left, right in pairs:
+            table = _pair_table(values[left], values[right], shared[left, right])
+            rows = sum(table.values())
+            pair = PairStats(
+                left=left,
+                right=right,
+                field=f,
+                rows=rows,
+                agreement=_round(sum(count for (a, b), count in table.items() if a == b) / rows) if rows else None,
+            )
+            if f in kappa_fields:
+                pair.kappa = _round(cohens_kappa(table))
+            stats.pairs.append(pair)
+        report_fields.append(asdict(stats))
+
+    return {
+        "runs": {name: len(runs[name]) for name in names},
+        "rows_any_run": len(any_run),
+        "rows_all_runs": len(complete),
+        "fields": report_fields,
+    }
+
+
+def diff_rows(
+    runs: dict[str, dict[RowKey, dict[str, str]]],
+    fields: Sequence[str] = AGREEMENT_FIELDS,
+) -> Iterable[dict[str, str]]:
+    """Rows annotated by 2+ runs that disagree on any of ``fields``, with every run's values."""
+    names = list(runs)
+    for key, by_run in align_runs(runs).items():
+        if len(by_run) < 2:
+            continue
+        differing = [
+            f for f in fields if len({_normalize_for_compare(f, row.get(f)) for row in by_run.values()}) > 1
+        ]
+        if not differing:
+            continue
+        base = next(iter(by_run.values()))
+        out = {
+            "utterance_id": base.get("utterance_id", ""),
+            "classifier_token_order": base.get("classifier_token_order", ""),
+            "Utterance": base.get("Utterance", ""),
+            "Classifier": base.get("Classifier", ""),
+            "differing_fields": ";".join(differing),
+        }
+        for f in differing:
+            for name in names:
+                out[f"{f}__{name}"] = by_run[name].get(f, "") if name in by_run else ""
+        yield out
+
+
+def write_report(path: Path, report: dict[str, object]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def write_confusion(path: Path, table: Counter[tuple[str, str]], left: str, right: str) -> None:
+    """Confusion matrix as CSV: one row per ``left`` value, one column per ``right`` value."""
+    row_labels = sorted({a for a, _ in table})
+    column_labels = sorted({b for _, b in table})
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow([f"{left} \\ {right}"] + column_labels)
+        for a in row_labels:
+            writer.writerow([a] + [table.get((a, b), 0) for b in column_labels])
@@ -0,0 +1,136 @@
+﻿from __future__ import annotations
+
+import csv
+import hashlib
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Iterable
+
+from classifier_pipeline.columns import compute_age_band
+from classifier_pipeline.columns import compute_determiner_type
+from classifier_pipeline.columns import compute_specific_semantic_class
+from classifier_pipeline.columns import enrich_columns
+from classifier_pipeline.phase3_sampling import corpus_from_file_name
+
+# Everything the annotation prompt sees about a row; rows sharing these values are one context.
+CONTEXT_FIELDS = ["Utterance", "%gra", "Determiner/Numbers", "Classifier"]
+
+# Sampling strata, kept from the context's first row so stratified sampling runs on the
+# compact table as is; ``strata`` holds the full per-stratum counts for weighted profiling.
+STRATUM_FIELDS = ["File Name", "Speaker_Role", "Age"]
+
+CONTEXT_HEADERS = ["context_id"] + CONTEXT_FIELDS + STRATUM_FIELDS + [
+    "determiner_type",
+    "specific_semantic_class",
+    "multiplicity",
+    "strata",
+]
+
+MAPPING_HEADERS = ["row_index", "utterance_id", "classifier_token_order", "context_id"]
+
+ANNOTATION_FIELDS = [
+    "identified_noun",
+    "conventional_classifier",
+    "conventional_classifier_zh",
+    "classifier_type",
+    "Classifier type",
+    "overuse_of_ge",
+    "Over use of Ge...",
+    "flag_for_review",
+    "flag_reason",
+    "rationale",
+    "annotation_source",
+]
+
+
+def context_id(row: dict[str, str]) -> str:
+    joined = "\x1f".join((row.get(field) or "").strip() for field in CONTEXT_FIELDS)
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()[:16]
+
+
+def compact_rows(
+    rows: Iterable[dict[str, str]],
+) -> tuple[list[dict[str, object]], list[dict[str, object]]]:
+    """Collapse rows with identical annotation context.
+
+    Returns the unique-context table (first-seen order, with ``multiplicity``) and the
+    row->context mapping in input order. ``strata`` is a JSON list of
+    ``[Speaker_Role, age_band, corpus, rows]`` (see ``context_strata``).
+    """
+    contexts: dict[str, dict[str, object]] = {}
+    strata: dict[str, Counter[tuple[str, str, str]]] = {}
+    mapping: list[dict[str, object]] = []
+    for row_index, row in enumerate(rows):
+        key = context_id(row)
+        context = contexts.get(key)
+        if context is None:
+            classifier = row.get("Classifier") or ""
+            context = {"context_id": key}
+            context.update({field: row.get(field) or "" for field in CONTEXT_FIELDS})
+            context.update({field: row.get(field) or "" for field in STRATUM_FIELDS})
+            context["determiner_type"] = row.get("determiner_type") or compute_determiner_type(
+                row.get("Determiner/Numbers") or ""
+            )
+            context["specific_semantic_class"] = row.get(
+                "specific_semantic_class"
+            ) or compute_specific_semantic_class(classifier)
+            context["multiplicity"] = 0
+            contexts[key] = context
+            strata[key] = Counter()
+        context["multiplicity"] += 1
+        strata[key][
+            (
+                row.get("Speaker_Role") or "",
+                compute_age_band(row.get("Age") or ""),
+                corpus_from_file_name(row.get("File Name") or ""),
+            )
+        ] += 1
+        mapping.append(
+            {
+                "row_index": row_index,
+                "utterance_id": row.get("utterance_id", ""),
+                "classifier_token_order": row.get("classifier_token_order", ""),
+                "context_id": key,
+            }
+        )
+    for key, context in contexts.items():
+        counts = sorted(strata[key].items(), key=lambda item: (-item[1], item[0]))
+        context["strata"] = json.dumps([[*stratum, rows] for stratum, rows in counts], ensure_ascii=False)
+    return list(contexts.values()), mapping
+
+
+def context_strata(context: dict[str, str]) -> list[tuple[str, str, str, int]]:
+    """(Speaker_Role, age_band, corpus, rows) of a context-table row, for weighted profiling."""
+    return [(role, band, corpus, int(rows)) for role, band, corpus, rows in json.loads(context.get("strata") or "[]")]
+
+
+def expand_annotations(
+    rows: Iterable[dict[str, str]],
+    annotated_contexts: Iterable[dict[str, str]],
+) -> tuple[list[dict[str, object]], int]:
+    """Join context-level annotations back onto every full row.
+
+    Annotated contexts are matched on their context fields, so any Phase 3 output produced
+    from the context table works even though it does not carry ``context_id``. Returns the
+    expanded rows and the number of rows left without an annotation.
+    """
+    annotations = {context_id(row): row for row in annotated_contexts}
+    expanded = enrich_columns([dict(row) for row in rows])
+    missing = 0
+    for out in expanded:
+        annotation = annotations.get(context_id(out))
+        if annotation is None:
+            missing += 1
+        else:
+            for field in ANNOTATION_FIELDS:
+                out[field] = annotation.get(field, "")
+    return expanded, missing
+
+
+def write_csv(path: Path, headers: list[str], rows: Iterable[dict[str, object]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=headers, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
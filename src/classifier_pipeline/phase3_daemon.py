@@ -0,0 +1,314 @@
+﻿from __future__ import annotations
+
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from classifier_pipeline.columns import enrich_columns
+from classifier_pipeline.phase3_lanes import LaneDispatcher
+from classifier_pipeline.phase3_pilot import (
+    _apply_response,
+    _load_lanes,
+    _load_provider_config,
+    _read_rows,
+    _sync_process_row,
+    _write_rows,
+    load_env,
+)
+from classifier_pipeline.phase3_rules import deterministic_fields, pre_annotate
+
+# Lower index = served first. Reserved slots only ever run rows from classes before "bulk".
+PRIORITY_CLASSES = ("interactive", "normal", "bulk")
+BULK = "bulk"
+
+QUEUE_STATES = ("pending", "running", "done", "failed")
+
+
+@dataclass
+class Job:
+    job_id: str
+    input_path: Path
+    output_path: Path
+    priority: str = "normal"
+    limit: Optional[int] = None
+    fast_path: bool = False
+    submitted_at: float = 0.0
+    rows: list[dict[str, str]] = field(default_factory=list, repr=False)
+    results: list[Optional[dict[str, str]]] = field(default_factory=list, repr=False)
+    remaining: int = 0
+    errors: list[str] = field(default_factory=list)
+    started_at: float = 0.0
+
+    @property
+    def rank(self) -> int:
+        return PRIORITY_CLASSES.index(self.priority)
+
+    def spec(self) -> dict[str, object]:
+        return {
+            "job_id": self.job_id,
+            "input_path": str(self.input_path),
+            "output_path": str(self.output_path),
+            "priority": self.priority,
+            "limit": self.limit,
+            "fast_path": self.fast_path,
+            "submitted_at": self.submitted_at,
+        }
+
+    @classmethod
+    def from_spec(cls, spec: dict[str, object]) -> "Job":
+        priority = str(spec.get("priority") or "normal")
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        limit = spec.get("limit")
+        return cls(
+            job_id=str(spec["job_id"]),
+            input_path=Path(str(spec["input_path"])),
+            output_path=Path(str(spec["output_path"])),
+            priority=priority,
+            limit=int(limit) if limit is not None else None,
+            fast_path=bool(spec.get("fast_path", False)),
+            submitted_at=float(spec.get("submitted_at") or 0.0),
+        )
+
+
+def queue_dirs(queue_dir: Path) -> dict[str, Path]:
+    dirs = {state: queue_dir / state for state in QUEUE_STATES}
+    for path in dirs.values():
+        path.mkdir(parents=True, exist_ok=True)
+    return dirs
+
+
+def submit_job(
+    queue_dir: Path,
+    input_path: Path,
+    output_path: Path,
+    priority: str = "normal",
+    limit: Optional[int] = None,
+    fast_path: bool = False,
+) -> str:
+    """Drop a job spec into ``<queue_dir>/pending`` and return its id."""
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown priority class: {priority}. Choose from {', '.join(PRIORITY_CLASSES)}")
+    job = Job(
+        job_id=time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6],
+        input_path=input_path.resolve(),
+        output_path=output_path.resolve(),
+        priority=priority,
+        limit=limit,
+        fast_path=fast_path,
+        submitted_at=time.time(),
+    )
+    pending = queue_dirs(queue_dir)["pending"]
+    tmp_path = pending / f".{job.job_id}.tmp"
+    tmp_path.write_text(json.dumps(job.spec(), indent=2), encoding="utf-8")
+    # Rename is atomic, so the daemon never reads a half-written spec.
+    os.replace(tmp_path, pending / f"{job.job_id}.json")
+    return job.job_id
+
+
+class RowQueue:
+    """Row tasks ordered by (priority class, submission order). Thread-safe."""
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[int, int, int, Job]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._heap)
+
+    def put_job(self, job: Job, indices: list[int]) -> None:
+        with self._condition:
+            for index in indices:
+                heapq.heappush(self._heap, (job.rank, next(self._counter), index, job))
+            self._condition.notify_all()
+
+    def get(self, allow_bulk: bool = True, timeout: float = 0.5) -> Optional[tuple[Job, int]]:
+        with self._condition:
+            deadline = time.monotonic() + timeout
+            while not self._closed:
+                if self._heap and (allow_bulk or self._heap[0][3].priority != BULK):
+                    _, _, index, job = heapq.heappop(self._heap)
+                    return job, index
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            return None
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class AnnotationDaemon:
+    """Long-running Phase 3 annotator fed from a file queue.
+
+    Jobs are JSON specs in ``<queue_dir>/pending``; they move to ``running`` when claimed
+    and to ``done`` (with a summary) or ``failed``. All jobs share one pool of
+    ``max_concurrent`` workers and, on openrouter, one ``LaneDispatcher`` that paces
+    requests against the shared rate limit. Rows are served strictly by priority class, and
+    ``reserved_slots`` workers never take bulk rows, so interactive jobs start immediately
+    even while a bulk job saturates the pool.
+    """
+
+    def __init__(
+        self,
+        queue_dir: Path,
+        env_path: Optional[Path] = None,
+        max_concurrent: int = 10,
+        reserved_slots: int = 1,
+    ) -> None:
+        load_env(env_path or Path(".env"))
+        self.provider, self.api_key, self.model, self.base_url = _load_provider_config()
+        self.max_retries = int(os.environ.get("OPENROUTER_MAX_RETRIES", "5"))
+        self.base_retry_seconds = int(os.environ.get("OPENROUTER_RETRY_BASE_SECONDS", "5"))
+        self.dispatcher: Optional[LaneDispatcher] = None
+        if self.provider == "openrouter":
+            self.dispatcher = LaneDispatcher(_load_lanes(self.provider, self.api_key, self.model, self.base_url))
+        self.dirs = queue_dirs(queue_dir)
+        # Jobs left in ``running`` by a previous daemon are started again from scratch.
+        for path in self.dirs["running"].glob("*.json"):
+            os.replace(path, self.dirs["pending"] / path.name)
+        self.max_concurrent = max(1, max_concurrent)
+        self.reserved_slots = min(max(0, reserved_slots), self.max_concurrent - 1)
+        self.rows = RowQueue()
+        self._active: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._workers: list[threading.Thread] = []
+
+    def start(self) -> None:
+        for slot in range(self.max_concurrent):
+            allow_bulk = slot >= self.reserved_slots
+            thread = threading.Thread(target=self._work, args=(allow_bulk,), daemon=True, name=f"phase3-slot-{slot}")
+            thread.start()
+            self._workers.append(thread)
+
+    def stop(self) -> None:
+        self.rows.close()
+        for thread in self._workers:
+            thread.join()
+
+    def idle(self) -> bool:
+        with self._lock:
+            return not self._active
+
+    def claim_pending(self) -> list[Job]:
+        """Move pending specs to ``running`` (highest priority, oldest first) and enqueue their rows."""
+        specs = []
+        for path in self.dirs["pending"].glob("*.json"):
+            try:
+                spec = json.loads(path.read_text(encoding="utf-8"))
+                job = Job.from_spec(spec)
+            except (OSError, ValueError, KeyError) as exc:
+                os.replace(path, self.dirs["failed"] / path.name)
+                (self.dirs["failed"] / f"{path.stem}.error.txt").write_text(str(exc), encoding="utf-8")
+                continue
+            specs.append((job.rank, job.submitted_at, path, job))
+        claimed = []
+        for _, _, path, job in sorted(specs, key=lambda item: item[:2]):
+            os.replace(path, self.dirs["running"] / path.name)
+            try:
+                self._enqueue(job)
+            except Exception as exc:  # an unreadable input fails its job, not the daemon
+                job.errors.append(f"{type(exc).__name__}: {exc}")
+                self._finish(job, failed=True)
+                continue
+            claimed.append(job)
+        return claimed
+
+    def _enqueue(self, job: Job) -> None:
+        job.rows = enrich_columns(_read_rows(job.input_path, job.limit))
+        job.results = [None] * len(job.rows)
+        job.started_at = time.monotonic()
+        indices = []
+        for index, row in enumerate(job.rows):
+            parsed = pre_annotate(row) if job.fast_path else None
+            if parsed is not None:
+                job.results[index] = _apply_response(row, parsed, source="rule")
+            else:
+                indices.append(index)
+        job.remaining = len(indices)
+        with self._lock:
+            self._active[job.job_id] = job
+        if not indices:
+            self._finish(job)
+            return
+        self.rows.put_job(job, indices)
+
+    def _work(self, allow_bulk: bool) -> None:
+        while True:
+            task = self.rows.get(allow_bulk=allow_bulk)
+            if task is None:
+                if self.rows.closed:
+                    return
+                continue
+            job, index = task
+            row = job.rows[index]
+            try:
+                job.results[index] = _sync_process_row(
+                    self.provider,
+                    self.api_key,
+                    self.model,
+                    self.base_url,
+                    row,
+                    self.max_retries,
+                    self.base_retry_seconds,
+                    deterministic_fields(row) if job.fast_path else None,
+                    dispatcher=self.dispatcher,
+                )
+            except Exception as exc:  # keep the daemon alive; the job records the failure
+                with self._lock:
+                    job.errors.append(f"row {index}: {exc}")
+            with self._lock:
+                job.remaining -= 1
+                finished = job.remaining == 0
+            if finished:
+                self._finish(job)
+
+    def _finish(self, job: Job, failed: bool = False) -> None:
+        written = [row for row in job.results if row is not None]
+        if not failed:
+            _write_rows(job.output_path, written)
+        summary = job.spec()
+        summary.update(
+            {
+                "rows_written": len(written),
+                "failed_rows": len(job.errors),
+                "errors": job.errors[:20],
+                "elapsed_seconds": round(time.monotonic() - job.started_at, 3) if job.started_at else 0.0,
+            }
+        )
+        target = self.dirs["failed" if failed else "done"] / f"{job.job_id}.json"
+        target.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        running = self.dirs["running"] / f"{job.job_id}.json"
+        if running.exists():
+            running.unlink()
+        with self._lock:
+            self._active.pop(job.job_id, None)
+
+    def serve(self, poll_seconds: float = 2.0, until_idle: bool = False) -> None:
+        """Poll the queue forever (or, with ``until_idle``, until no job is pending or running)."""
+        self.start()
+        try:
+            while True:
+                self.claim_pending()
+                if until_idle and self.idle() and not any(self.dirs["pending"].glob("*.json")):
+                    return
+                time.sleep(poll_seconds)
+        finally:
+            self.stop()
@@ -0,0 +1,132 @@
+﻿from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class HedgePolicy:
+    """When to issue a duplicate request for a slow row.
+
+    A hedge fires once a row has been in flight longer than the ``percentile`` latency of
+    the run so far (never earlier than ``min_delay_seconds``, and only after
+    ``min_samples`` completed rows). At most ``max_hedge_fraction`` of rows may be hedged.
+    """
+
+    percentile: float = 0.95
+    min_samples: int = 20
+    min_delay_seconds: float = 5.0
+    max_hedge_fraction: float = 0.05
+
+    def max_hedges(self, n_rows: int) -> int:
+        return math.ceil(self.max_hedge_fraction * n_rows)
+
+
+class LatencyTracker:
+    """Sliding window of completed request latencies."""
+
+    def __init__(self, window: int = 1000) -> None:
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = min(len(samples) - 1, max(0, math.ceil(q * len(samples)) - 1))
+        return samples[rank]
+
+
+class HedgeBudget:
+    """Counts hedges against a fixed allowance."""
+
+    def __init__(self, max_hedges: int) -> None:
+        self.max_hedges = max_hedges
+        self.issued = 0
+        self.won = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.issued >= self.max_hedges:
+                return False
+            self.issued += 1
+            return True
+
+    def record_win(self) -> None:
+        with self._lock:
+            self.won += 1
+
+
+def hedge_delay(policy: HedgePolicy, tracker: LatencyTracker) -> Optional[float]:
+    if len(tracker) < policy.min_samples:
+        return None
+    threshold = tracker.percentile(policy.percentile)
+    if threshold is None:
+        return None
+    return max(threshold, policy.min_delay_seconds)
+
+
+async def run_hedged(
+    call: Callable[[threading.Event], T],
+    policy: HedgePolicy,
+    tracker: LatencyTracker,
+    budget: HedgeBudget,
+) -> T:
+    """Run ``call`` in a worker thread, hedging with a duplicate if it runs long.
+
+    ``call`` receives a cancel event; the first call to return without raising wins and the
+    other is cancelled (its event is set so it stops before its next attempt or retry wait).
+    An HTTP request already on the wire is not aborted: it runs to completion, is billed by
+    the provider and its result is discarded, so a hedge can double the spend of its row.
+    """
+    start = time.monotonic()
+    cancels: dict[asyncio.Future, threading.Event] = {}
+
+    def _launch() -> asyncio.Future:
+        cancel_event = threading.Event()
+        task = asyncio.ensure_future(asyncio.to_thread(call, cancel_event))
+        cancels[task] = cancel_event
+        return task
+
+    primary = _launch()
+    delay = hedge_delay(policy, tracker)
+    if delay is not None:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if not done and budget.try_acquire():
+            _launch()
+
+    pending = set(cancels)
+    last_error: Optional[BaseException] = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None:
+                last_error = error
+                continue
+            for other in pending:
+                cancels[other].set()
+                other.cancel()
+            tracker.record(time.monotonic() - start)
+            if task is not primary:
+                budget.record_win()
+            return task.result()
+    if last_error is not None:
+        raise last_error
+    raise RuntimeError("Hedged request finished without a result")
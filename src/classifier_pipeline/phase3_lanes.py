@@ -0,0 +1,130 @@
+﻿from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Sequence
+
+# Health multipliers applied per outcome; health recovers towards 1.0 on success.
+RATE_LIMIT_PENALTY = 0.5
+FAILURE_PENALTY = 0.7
+RECOVERY_RATE = 0.2
+MIN_HEALTH = 0.05
+# Smoothing factor for the per-lane latency moving average.
+LATENCY_ALPHA = 0.3
+# Latency assumed for lanes without history, so new lanes are tried early.
+UNKNOWN_LATENCY_SECONDS = 1.0
+
+
+@dataclass
+class Lane:
+    """One (model, API key) route with its own rate limiter and health score."""
+
+    name: str
+    model: str
+    api_key: str = field(repr=False)
+    base_url: str
+    min_interval: float = 0.0
+    health: float = 1.0
+    latency_ewma: Optional[float] = None
+    in_flight: int = 0
+    next_slot: float = 0.0
+    cooldown_until: float = 0.0
+    requests: int = 0
+    successes: int = 0
+    rate_limited: int = 0
+    failures: int = 0
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url.rstrip('/')}/chat/completions"
+
+    def score(self) -> float:
+        latency = self.latency_ewma if self.latency_ewma is not None else UNKNOWN_LATENCY_SECONDS
+        return self.health / ((1 + self.in_flight) * max(latency, 0.1))
+
+
+def build_lanes(models: Sequence[str], api_keys: Sequence[str], base_url: str) -> list[Lane]:
+    """One lane per (model, key) pair; keys are referred to by position, never by value."""
+    lanes = []
+    for model in models:
+        for key_index, api_key in enumerate(api_keys, start=1):
+            lanes.append(Lane(name=f"{model}#k{key_index}", model=model, api_key=api_key, base_url=base_url))
+    return lanes
+
+
+class LaneDispatcher:
+    """Spreads requests over lanes, preferring healthy, fast, lightly loaded ones.
+
+    ``reserve`` picks a lane and returns how long the caller must wait for that lane's
+    rate-limit slot; ``report`` feeds back the outcome. Lanes that return 429 are cooled
+    down and lose health, shifting traffic to the others. Thread-safe.
+    """
+
+    def __init__(self, lanes: Sequence[Lane]) -> None:
+        if not lanes:
+            raise ValueError("At least one lane is required")
+        self.lanes = list(lanes)
+        self._lock = threading.Lock()
+
+    def reserve(self) -> tuple[Optional[Lane], float]:
+        with self._lock:
+            now = time.monotonic()
+            ready = [lane for lane in self.lanes if lane.cooldown_until <= now]
+            if not ready:
+                return None, min(lane.cooldown_until for lane in self.lanes) - now
+            lane = max(ready, key=Lane.score)
+            start = max(now, lane.next_slot)
+            lane.next_slot = start + lane.min_interval
+            lane.in_flight += 1
+            lane.requests += 1
+            return lane, start - now
+
+    def release(self, lane: Lane) -> None:
+        with self._lock:
+            lane.in_flight = max(0, lane.in_flight - 1)
+
+    def report(
+        self,
+        lane: Lane,
+        ok: bool,
+        latency_seconds: float,
+        rate_limited: bool = False,
+        cooldown_seconds: float = 0.0,
+        min_interval: Optional[float] = None,
+    ) -> None:
+        with self._lock:
+            lane.in_flight = max(0, lane.in_flight - 1)
+            if min_interval is not None:
+                lane.min_interval = min_interval
+            if ok:
+                lane.successes += 1
+                lane.health += (1.0 - lane.health) * RECOVERY_RATE
+                if lane.latency_ewma is None:
+                    lane.latency_ewma = latency_seconds
+                else:
+                    lane.latency_ewma += LATENCY_ALPHA * (latency_seconds - lane.latency_ewma)
+                return
+            if rate_limited:
+                lane.rate_limited += 1
+                lane.health = max(MIN_HEALTH, lane.health * RATE_LIMIT_PENALTY)
+            else:
+                lane.failures += 1
+                lane.health = max(MIN_HEALTH, lane.health * FAILURE_PENALTY)
+            if cooldown_seconds > 0:
+                lane.cooldown_until = max(lane.cooldown_until, time.monotonic() + cooldown_seconds)
+
+    def summary(self) -> list[dict[str, object]]:
+        with self._lock:
+            return [
+                {
+                    "lane": lane.name,
+                    "requests": lane.requests,
+                    "successes": lane.successes,
+                    "rate_limited": lane.rate_limited,
+                    "failures": lane.failures,
+                    "health": round(lane.health, 3),
+                    "latency_ewma": round(lane.latency_ewma, 3) if lane.latency_ewma is not None else None,
+                }
+                for lane in self.lanes
+            ]
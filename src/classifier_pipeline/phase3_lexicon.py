@@ -0,0 +1,189 @@
+﻿from __future__ import annotations
+
+import csv
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Optional
+
+from classifier_pipeline.phase3_rules import GENERAL_CLASSIFIER, deterministic_fields, locate_target
+
+LEXICON_HEADERS = [
+    "identified_noun",
+    "conventional_classifier",
+    "conventional_classifier_zh",
+    "count",
+    "noun_total",
+    "agreement",
+    "flagged",
+    "settled",
+]
+
+# Nouns that cannot carry a conventional classifier.
+NON_LEXICAL_NOUNS = frozenset({"", "OMITTED", "N/A"})
+
+# POS tags accepted as a bare head noun directly after the classifier.
+HEAD_NOUN_POS = frozenset({"n", "n:relat"})
+# A following token with one of these tags means the candidate may be part of a longer phrase.
+PHRASE_CONTINUATION_POS = frozenset({"n", "n:relat", "n:prop", "poss", "cleft", "suf"})
+PHRASE_CONTINUATION_TOKENS = frozenset({"的"})
+
+
+def _is_true(value: object) -> bool:
+    return str(value).strip().lower() in {"true", "yes", "1"}
+
+
+class NounLexicon:
+    """Agreement counts of conventional classifiers per identified noun.
+
+    A noun is *settled* once it has at least ``min_count`` annotations, its most common
+    (pinyin, hanzi) classifier reaches ``min_agreement`` and at most ``max_flag_rate`` of
+    its annotations were flagged for review. Updates are thread-safe.
+    """
+
+    def __init__(
+        self,
+        min_count: int = 3,
+        min_agreement: float = 0.9,
+        max_flag_rate: float = 0.1,
+    ) -> None:
+        self.min_count = min_count
+        self.min_agreement = min_agreement
+        self.max_flag_rate = max_flag_rate
+        self._counts: dict[str, Counter[tuple[str, str]]] = {}
+        self._flagged: dict[str, Counter[tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def record(
+        self,
+        noun: str,
+        classifier: str,
+        classifier_zh: str,
+        flagged: bool = False,
+        count: int = 1,
+    ) -> None:
+        noun = (noun or "").strip()
+        classifier_zh = (classifier_zh or "").strip()
+        if noun in NON_LEXICAL_NOUNS or classifier_zh in NON_LEXICAL_NOUNS:
+            return
+        variant = ((classifier or "").strip().lower(), classifier_zh)
+        with self._lock:
+            self._counts.setdefault(noun, Counter())[variant] += count
+            if flagged:
+                self._flagged.setdefault(noun, Counter())[variant] += count
+
+    def update_from_rows(self, rows: Iterable[dict[str, object]]) -> None:
+        for row in rows:
+            self.record(
+                str(row.get("identified_noun") or ""),
+                str(row.get("conventional_classifier") or ""),
+                str(row.get("conventional_classifier_zh") or ""),
+                flagged=_is_true(row.get("flag_for_review")),
+            )
+
+    def settled(self, noun: str) -> Optional[tuple[str, str]]:
+        with self._lock:
+            variants = self._counts.get(noun)
+            if not variants:
+                return None
+            total = sum(variants.values())
+            variant, count = variants.most_common(1)[0]
+            flagged = sum(self._flagged.get(noun, Counter()).values())
+        if total < self.min_count or count / total < self.min_agreement:
+            return None
+        if flagged / total > self.max_flag_rate:
+            return None
+        return variant
+
+    def export_rows(self) -> list[dict[str, object]]:
+        with self._lock:
+            snapshot = {noun: Counter(variants) for noun, variants in self._counts.items()}
+            flagged = {noun: Counter(variants) for noun, variants in self._flagged.items()}
+        rows = []
+        for noun, variants in snapshot.items():
+            total = sum(variants.values())
+            settled = self.settled(noun)
+            for variant, count in variants.most_common():
+                rows.append(
+                    {
+                        "identified_noun": noun,
+                        "conventional_classifier": variant[0],
+                        "conventional_classifier_zh": variant[1],
+                        "count": count,
+                        "noun_total": total,
+                        "agreement": round(count / total, 4),
+                        "flagged": flagged.get(noun, Counter()).get(variant, 0),
+                        "settled": settled == variant,
+                    }
+                )
+        rows.sort(key=lambda row: (-row["noun_total"], row["identified_noun"], -row["count"]))
+        return rows
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8", newline="") as handle:
+            writer = csv.DictWriter(handle, fieldnames=LEXICON_HEADERS)
+            writer.writeheader()
+            writer.writerows(self.export_rows())
+
+    def load(self, path: Path) -> None:
+        with path.open("r", encoding="utf-8", newline="") as handle:
+            for row in csv.DictReader(handle):
+                count = int(row.get("count") or 0)
+                flagged = int(row.get("flagged") or 0)
+                noun = row.get("identified_noun", "")
+                classifier = row.get("conventional_classifier", "")
+                classifier_zh = row.get("conventional_classifier_zh", "")
+                if count - flagged > 0:
+                    self.record(noun, classifier, classifier_zh, count=count - flagged)
+                if flagged > 0:
+                    self.record(noun, classifier, classifier_zh, flagged=True, count=flagged)
+
+
+def candidate_head_noun(row: dict[str, str]) -> Optional[str]:
+    """Return the bare noun right after the target classifier when the phrase is unambiguous.
+
+    Requires POS tags aligned with the utterance tokens, a plain noun tag on the next token,
+    and nothing after it that could extend the noun phrase (compounds, possessives).
+    """
+    tokens = (row.get("Utterance") or "").split()
+    pos_tags = (row.get("%gra") or "").split()
+    if len(tokens) != len(pos_tags):
+        return None
+    index = locate_target(tokens, row)
+    if index is None or index + 1 >= len(tokens):
+        return None
+    if pos_tags[index + 1] not in HEAD_NOUN_POS:
+        return None
+    following = index + 2
+    if following < len(tokens) and (
+        pos_tags[following] in PHRASE_CONTINUATION_POS or tokens[following] in PHRASE_CONTINUATION_TOKENS
+    ):
+        return None
+    return tokens[index + 1]
+
+
+def resolve_from_lexicon(row: dict[str, str], lexicon: NounLexicon) -> Optional[dict[str, object]]:
+    """Build a parsed-response dict for rows whose head noun is settled in the lexicon."""
+    noun = candidate_head_noun(row)
+    if noun is None:
+        return None
+    settled = lexicon.settled(noun)
+    if settled is None:
+        return None
+    classifier_pinyin, classifier_zh = settled
+    classifier = (row.get("Classifier") or "").strip()
+    parsed: dict[str, object] = {
+        "identified_noun": noun,
+        "conventional_classifier": classifier_pinyin,
+        "conventional_classifier_zh": classifier_zh,
+        "overuse_of_ge": classifier == GENERAL_CLASSIFIER and classifier_zh != GENERAL_CLASSIFIER,
+        "rationale": f"Lexicon: '{noun}' conventionally takes '{classifier_pinyin}' ({classifier_zh}).",
+        "flag_for_review": False,
+        "flag_reason": "",
+    }
+    parsed.update(deterministic_fields(row))
+    return parsed
@@ -1,32 +1,64 @@
 ﻿from __future__ import annotations
 
 import asyncio
-import csv
 import json
 import os
 import re
+import threading
 import time
+from collections import Counter
+from itertools import islice
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import Callable, Iterable, Optional, Sequence
 
 import requests
 
-from classifier_pipeline.phase2_extraction import OUTPUT_HEADERS as PHASE2_HEADERS
-from classifier_pipeline.phase2_extraction import compute_determiner_type
-from classifier_pipeline.phase2_extraction import compute_specific_semantic_class
+from classifier_pipeline.artifact_io import CsvArtifactWriter, artifact_exists, iter_csv_rows
+from classifier_pipeline.columns import ANNOTATED_HEADERS as OUTPUT_HEADERS
+from classifier_pipeline.columns import enrich_columns
+from classifier_pipeline.columns import compute_specific_semantic_class
+from classifier_pipeline.instrumentation import count, timed
+from classifier_pipeline.parallel_csv import read_table
+from classifier_pipeline.phase3_cache import CACHE_CONTROL_PROVIDERS, PromptUsage, order_by_prefix
+from classifier_pipeline.phase3_cascade import (
+    CascadeConfig,
+    CascadeStats,
+    CascadeTier,
+    cascade_report_path,
+    run_cascade_row,
+    write_report,
+)
+from classifier_pipeline.phase3_hedging import HedgeBudget, HedgePolicy, LatencyTracker, run_hedged
+from classifier_pipeline.phase3_lanes import Lane, LaneDispatcher, build_lanes
+from classifier_pipeline.phase3_lexicon import NounLexicon, resolve_from_lexicon
+from classifier_pipeline.phase3_review import index_rows, row_key
+from classifier_pipeline.phase3_rules import deterministic_fields, pre_annotate
+from classifier_pipeline.phase3_scheduler import (
+    BudgetScheduler,
+    RunBudget,
+    TokenPrices,
+    failures_path_for,
+    prioritize,
+    state_path_for,
+    write_state,
+)
+from classifier_pipeline.phase3_schema import (
+    build_followup_messages,
+    followup_fields,
+    merge_followup,
+    parse_response,
+)
+from classifier_pipeline.phase3_streaming import StreamError, consume_chat_stream
 from classifier_pipeline.prompts import build_messages
 
-OUTPUT_HEADERS = PHASE2_HEADERS + [
-    "age_years",
-    "age_available",
-    "identified_noun",
-    "conventional_classifier",
-    "conventional_classifier_zh",
-    "classifier_type",
-    "overuse_of_ge",
-    "flag_for_review",
-    "flag_reason",
-    "rationale",
+# Per-row request telemetry written to the optional JSONL request log.
+REQUEST_LOG_FIELDS = [
+    "utterance_id",
+    "classifier_token_order",
+    "annotation_source",
+    "streamed",
+    "ttft_seconds",
+    "latency_seconds",
 ]
 
 OPENROUTER_ALLOWED_MODELS = {
@@ -41,6 +73,19 @@ OPENROUTER_REASONING_MODELS = {
     "openai/gpt-5.2-codex",
 }
 
+# OpenAI-compatible servers on the local machine (LM Studio, llama.cpp server, vLLM, ...).
+LOCAL_PROVIDERS = {"lmstudio"}
+# Providers that report each request's cost in ``usage`` (see ``_request_payload_for_row``).
+COST_REPORTING_PROVIDERS = {"openrouter"}
+LOCAL_DEFAULT_BASE_URL = "http://localhost:1234/v1"
+# Local servers decode far slower than hosted APIs, especially on CPU.
+LOCAL_DEFAULT_TIMEOUT_SECONDS = 600
+REMOTE_TIMEOUT_SECONDS = 120
+
+
+class RequestCancelled(RuntimeError):
+    """Raised inside a worker whose request was superseded (e.g. by a winning hedge)."""
+
 
 def load_env(env_path: Path) -> None:
     if not env_path.exists():
@@ -92,9 +137,13 @@ def get_temperature(provider: str, model: str) -> float:
     return 0.3
 
 
-def get_reasoning_payload(provider: str, model: str) -> Optional[dict[str, str]]:
+def get_reasoning_payload(
+    provider: str,
+    model: str,
+    effort: Optional[str] = None,
+) -> Optional[dict[str, str]]:
     if provider == "openrouter" and model in OPENROUTER_REASONING_MODELS:
-        return {"effort": "medium"}
+        return {"effort": effort or "medium"}
     return None
 
 
@@ -104,9 +153,43 @@ def ensure_model_allowed(model: str, provider: str) -> None:
             allowed = ", ".join(sorted(OPENROUTER_ALLOWED_MODELS))
             raise ValueError(f"Model not allowed for openrouter: {model}. Allowed: {allowed}")
         return
+    if provider in LOCAL_PROVIDERS:
+        if not model:
+            raise ValueError(f"A model name is required for {provider} (set LM_STUDIO_MODEL)")
+        return
     raise ValueError(f"Unknown provider: {provider}")
 
 
+def get_request_timeout(provider: str) -> float:
+    if provider in LOCAL_PROVIDERS:
+        return float(os.environ.get("LM_STUDIO_TIMEOUT_SECONDS", LOCAL_DEFAULT_TIMEOUT_SECONDS))
+    return REMOTE_TIMEOUT_SECONDS
+
+
+def get_default_concurrency(provider: str) -> int:
+    """Local servers decode a fixed number of sequences at once (LM Studio / llama.cpp
+    ``--parallel`` slots); keeping exactly that many requests in flight keeps every slot
+    busy without queueing work on the server."""
+    if provider in LOCAL_PROVIDERS:
+        try:
+            return max(1, int(os.environ.get("LM_STUDIO_PARALLEL", "4")))
+        except ValueError:
+            return 4
+    return 10
+
+
+_thread_local = threading.local()
+
+
+def _local_session() -> requests.Session:
+    """Per-thread keep-alive session so local requests reuse their connection."""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _thread_local.session = session
+    return session
+
+
 def parse_json_response(text: str) -> dict[str, object]:
     try:
         return json.loads(text, strict=False)
@@ -131,28 +214,6 @@ def normalize_overuse_value(value: object) -> Optional[bool]:
     return None
 
 
-def _compute_age_fields(row: dict[str, str]) -> dict[str, str]:
-    row = dict(row)
-    age_raw = (row.get("Age") or "").strip()
-    if not age_raw:
-        row["age_available"] = False
-        row["age_years"] = ""
-    else:
-        try:
-            age_days = float(age_raw)
-        except ValueError:
-            row["age_available"] = False
-            row["age_years"] = ""
-        else:
-            row["age_available"] = True
-            row["age_years"] = round(age_days / 365.25, 1)
-    if not row.get("determiner_type"):
-        row["determiner_type"] = compute_determiner_type(row.get("Determiner/Numbers", ""))
-    if not row.get("specific_semantic_class"):
-        row["specific_semantic_class"] = compute_specific_semantic_class(row.get("Classifier", ""))
-    return row
-
-
 def call_chat_completion(
     provider: str,
     api_key: Optional[str],
@@ -211,7 +272,7 @@ def call_chat_completion(
     raise RuntimeError("Failed to call LLM API after retries")
 
 
-def _build_messages(row: dict[str, str]) -> list[dict[str, str]]:
+def _build_messages(row: dict[str, str], cache_control: bool = False) -> list[dict[str, object]]:
     utterance = row.get("Utterance", "")
     classifier_token = row.get("Classifier", "")
     determiner = row.get("Determiner/Numbers", "")
@@ -226,11 +287,22 @@ def _build_messages(row: dict[str, str]) -> list[dict[str, str]]:
         determiner_or_number=determiner,
         pos_tags=pos_tags,
         specific_semantic_class=semantic_class,
+        cache_control=cache_control,
     )
 
 
-def _apply_response(row: dict[str, str], parsed: dict[str, object]) -> dict[str, str]:
-    row = _compute_age_fields(row)
+@timed("phase3.apply")
+def _apply_response(
+    row: dict[str, str],
+    parsed: dict[str, object],
+    source: str = "llm",
+) -> dict[str, str]:
+    """Copy of ``row`` with the annotation fields from ``parsed``.
+
+    ``row`` must already carry the derived age and class columns: every caller enriches its
+    rows once at read time with ``columns.enrich_columns``, which recomputes them from ``Age``.
+    """
+    row = dict(row)
     row["identified_noun"] = parsed.get("identified_noun", "")
     row["conventional_classifier"] = parsed.get("conventional_classifier", "")
     row["conventional_classifier_zh"] = parsed.get("conventional_classifier_zh", "")
@@ -245,46 +317,79 @@ def _apply_response(row: dict[str, str], parsed: dict[str, object]) -> dict[str,
     row["flag_for_review"] = flag if flag is not None else False
     row["flag_reason"] = parsed.get("flag_reason", "") if row["flag_for_review"] else ""
     row["rationale"] = parsed.get("rationale", "")
+    row["annotation_source"] = source
     return row
 
 
-def _read_rows(input_path: Path, limit: Optional[int]) -> list[dict[str, str]]:
-    rows: list[dict[str, str]] = []
-    with input_path.open("r", encoding="utf-8", newline="") as handle:
-        reader = csv.DictReader(handle)
-        for row in reader:
-            rows.append(row)
-            if limit is not None and len(rows) >= limit:
-                break
-    return rows
+def _read_rows(input_path: Path, limit: Optional[int], workers: int = 1) -> list[dict[str, str]]:
+    if limit is None and workers > 1:
+        return read_table(input_path, workers=workers).to_dicts()
+    rows = iter_csv_rows(input_path)
+    return list(rows if limit is None else islice(rows, limit))
 
 
 def _write_rows(output_path: Path, rows: Iterable[dict[str, str]]) -> None:
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    with output_path.open("w", encoding="utf-8", newline="") as out_handle:
-        writer = csv.DictWriter(out_handle, fieldnames=OUTPUT_HEADERS)
-        writer.writeheader()
+    with CsvArtifactWriter(output_path, OUTPUT_HEADERS) as writer:
+        writer.writerows([row.get(key, "") for key in OUTPUT_HEADERS] for row in rows)
+
+
+def _write_failures(path: Path, rows: Sequence[dict[str, str]], failures: dict[int, str]) -> None:
+    if not failures:
+        path.unlink(missing_ok=True)
+        return
+    records = [
+        {"row": index, "key": list(row_key(rows[index])), "error": error} for index, error in sorted(failures.items())
+    ]
+    write_state(path, {"rows_failed": len(records), "failures": records})
+
+
+def _append_request_log(path: Path, rows: Iterable[dict[str, object]], streamed: bool) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as handle:
         for row in rows:
-            writer.writerow({key: row.get(key, "") for key in OUTPUT_HEADERS})
+            entry = {field: row.get(field) for field in REQUEST_LOG_FIELDS}
+            entry["streamed"] = streamed and str(row.get("annotation_source", "")).startswith("llm")
+            handle.write(json.dumps(entry, ensure_ascii=False) + "\n")
 
 
-def _load_provider_config() -> tuple[str, str, str]:
+def _load_provider_config() -> tuple[str, str, str, str]:
     provider = os.environ.get("LLM_PROVIDER", "openrouter").lower()
+    if provider in LOCAL_PROVIDERS:
+        model = os.environ.get("LM_STUDIO_MODEL", "")
+        base_url = os.environ.get("LM_STUDIO_BASE_URL", LOCAL_DEFAULT_BASE_URL)
+        api_key = os.environ.get("LM_STUDIO_API_KEY", "")
+        ensure_model_allowed(model, provider)
+        return provider, api_key, model, base_url
     if provider != "openrouter":
-        raise RuntimeError("Only openrouter is supported")
+        raise RuntimeError(f"Unsupported provider: {provider}. Use openrouter or lmstudio")
     api_key = os.environ.get("OPEN_ROUTER_API_KEY") or os.environ.get("OPENROUTER_API_KEY")
     if not api_key:
         raise RuntimeError("OPEN_ROUTER_API_KEY not found in environment or .env")
     model = os.environ.get("OPENROUTER_MODEL", "moonshotai/kimi-k2.5")
     base_url = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
     ensure_model_allowed(model, provider)
-    return api_key, model, base_url
+    return provider, api_key, model, base_url
+
+
+def _split_env_list(value: Optional[str]) -> list[str]:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def _load_lanes(provider: str, api_key: str, model: str, base_url: str) -> list[Lane]:
+    """Lanes from OPENROUTER_MODELS / OPENROUTER_API_KEYS (comma-separated), falling back
+    to the single configured model and key."""
+    models = _split_env_list(os.environ.get("OPENROUTER_MODELS")) or [model]
+    api_keys = _split_env_list(os.environ.get("OPENROUTER_API_KEYS")) or [api_key]
+    for lane_model in models:
+        ensure_model_allowed(lane_model, provider)
+    return build_lanes(models, api_keys, base_url)
 
 
 def _request_payload_for_row(
     provider: str,
     model: str,
     messages: list[dict[str, str]],
+    reasoning_effort: Optional[str] = None,
 ) -> dict[str, object]:
     payload = {
         "model": model,
@@ -293,13 +398,20 @@ def _request_payload_for_row(
     }
     if provider == "openrouter":
         payload["response_format"] = {"type": "json_object"}
-    reasoning = get_reasoning_payload(provider, model)
+        # Ask OpenRouter to report the request's cost in ``usage`` (read by the budget scheduler).
+        payload["usage"] = {"include": True}
+    reasoning = get_reasoning_payload(provider, model, reasoning_effort)
     if reasoning:
         payload["reasoning"] = reasoning
     return payload
 
 
-def _request_headers(api_key: str) -> dict[str, str]:
+def _request_headers(api_key: str, provider: str = "openrouter") -> dict[str, str]:
+    if provider in LOCAL_PROVIDERS:
+        headers = {"Content-Type": "application/json"}
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        return headers
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
     site_url = os.environ.get("OPENROUTER_SITE_URL") or os.environ.get("OPEN_ROUTER_SITE_URL")
     app_title = os.environ.get("OPENROUTER_APP_NAME") or os.environ.get("OPEN_ROUTER_APP_NAME")
@@ -310,34 +422,194 @@ def _request_headers(api_key: str) -> dict[str, str]:
     return headers
 
 
+def _wait(seconds: float, cancel_event: Optional[threading.Event]) -> None:
+    if cancel_event is None:
+        time.sleep(seconds)
+    elif cancel_event.wait(seconds):
+        raise RequestCancelled("Request cancelled")
+
+
 def _send_request(
     url: str,
     headers: dict[str, str],
     payload: dict[str, object],
     max_retries: int,
     base_retry_seconds: int,
+    cancel_event: Optional[threading.Event] = None,
+    timeout: float = REMOTE_TIMEOUT_SECONDS,
+    session: Optional[requests.Session] = None,
+    usage: Optional[PromptUsage] = None,
 ) -> str:
+    http = session or requests
     for attempt in range(max_retries + 1):
+        if cancel_event is not None and cancel_event.is_set():
+            raise RequestCancelled("Request cancelled")
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=120)
+            with timed("phase3.request"):
+                response = http.post(url, headers=headers, json=payload, timeout=timeout)
             if response.status_code == 429:
+                count("phase3.rate_limited")
                 if attempt >= max_retries:
                     response.raise_for_status()
                 delay = get_retry_delay(response.headers, attempt, base_retry_seconds, 60)
-                time.sleep(delay)
+                _wait(delay, cancel_event)
                 continue
             response.raise_for_status()
             data = response.json()
+            if usage is not None:
+                usage.record(data.get("usage"))
             throttle_delay = compute_throttle_delay(response.headers)
             if throttle_delay > 0:
-                time.sleep(throttle_delay)
+                _wait(throttle_delay, cancel_event)
             return data["choices"][0]["message"]["content"]
         except requests.RequestException as exc:
+            count("phase3.request_errors")
             if attempt >= max_retries:
                 raise
-            headers = exc.response.headers if exc.response is not None else {}
-            delay = get_retry_delay(headers, attempt, base_retry_seconds, 60)
-            time.sleep(delay)
+            error_headers = exc.response.headers if exc.response is not None else {}
+            delay = get_retry_delay(error_headers, attempt, base_retry_seconds, 60)
+            _wait(delay, cancel_event)
+    raise RuntimeError("Failed to call LLM API after retries")
+
+
+def _send_request_streaming(
+    url: str,
+    headers: dict[str, str],
+    payload: dict[str, object],
+    max_retries: int,
+    base_retry_seconds: int,
+    cancel_event: Optional[threading.Event] = None,
+    timeout: float = REMOTE_TIMEOUT_SECONDS,
+    session: Optional[requests.Session] = None,
+    started: Optional[float] = None,
+    usage: Optional[PromptUsage] = None,
+) -> tuple[str, Optional[float]]:
+    """Streamed variant of ``_send_request``.
+
+    Reads the SSE stream only until the JSON answer is complete, then closes the
+    connection. Returns the content and the time to first token relative to ``started``.
+    With ``usage``, the stream is read on to its final chunk so the request's tokens and
+    cost are recorded (the budget scheduler needs them).
+    """
+    http = session or requests
+    payload = {**payload, "stream": True}
+    if usage is not None:
+        payload["stream_options"] = {"include_usage": True}
+    started = time.monotonic() if started is None else started
+    for attempt in range(max_retries + 1):
+        if cancel_event is not None and cancel_event.is_set():
+            raise RequestCancelled("Request cancelled")
+        try:
+            # The timer spans the whole read: the stream is consumed inside the request.
+            with timed("phase3.request"), http.post(
+                url, headers=headers, json=payload, timeout=timeout, stream=True
+            ) as response:
+                if response.status_code == 429:
+                    count("phase3.rate_limited")
+                    if attempt >= max_retries:
+                        response.raise_for_status()
+                    delay = get_retry_delay(response.headers, attempt, base_retry_seconds, 60)
+                    _wait(delay, cancel_event)
+                    continue
+                response.raise_for_status()
+                response.encoding = "utf-8"
+                result = consume_chat_stream(
+                    response.iter_lines(decode_unicode=True), started, wait_for_usage=usage is not None
+                )
+                if usage is not None:
+                    usage.record(result.usage)
+                throttle_delay = compute_throttle_delay(response.headers)
+            if throttle_delay > 0:
+                _wait(throttle_delay, cancel_event)
+            return result.content, result.ttft_seconds
+        except (requests.RequestException, StreamError) as exc:
+            count("phase3.request_errors")
+            if attempt >= max_retries:
+                raise
+            response_obj = getattr(exc, "response", None)
+            error_headers = response_obj.headers if response_obj is not None else {}
+            delay = get_retry_delay(error_headers, attempt, base_retry_seconds, 60)
+            _wait(delay, cancel_event)
+    raise RuntimeError("Failed to call LLM API after retries")
+
+
+def _acquire_lane(dispatcher: LaneDispatcher, cancel_event: Optional[threading.Event]) -> Lane:
+    while True:
+        lane, delay = dispatcher.reserve()
+        if delay > 0:
+            try:
+                _wait(delay, cancel_event)
+            except RequestCancelled:
+                if lane is not None:
+                    dispatcher.release(lane)
+                raise
+        if lane is not None:
+            return lane
+
+
+def _send_lane_request(
+    dispatcher: LaneDispatcher,
+    provider: str,
+    messages: list[dict[str, object]],
+    max_retries: int,
+    base_retry_seconds: int,
+    cancel_event: Optional[threading.Event] = None,
+    usage: Optional[PromptUsage] = None,
+) -> tuple[str, Lane]:
+    """Like ``_send_request`` but every attempt goes to the best lane available at the time;
+    rate-limited or failing lanes are cooled down instead of blocking the worker."""
+    for attempt in range(max_retries + 1):
+        if cancel_event is not None and cancel_event.is_set():
+            raise RequestCancelled("Request cancelled")
+        lane = _acquire_lane(dispatcher, cancel_event)
+        payload = _request_payload_for_row(provider, lane.model, messages)
+        started = time.monotonic()
+        try:
+            with timed("phase3.request"):
+                response = requests.post(lane.url, headers=_request_headers(lane.api_key), json=payload, timeout=120)
+            elapsed = time.monotonic() - started
+            if response.status_code == 429:
+                count("phase3.rate_limited")
+                dispatcher.report(
+                    lane,
+                    ok=False,
+                    latency_seconds=elapsed,
+                    rate_limited=True,
+                    cooldown_seconds=get_retry_delay(response.headers, attempt, base_retry_seconds, 60),
+                )
+                if attempt >= max_retries:
+                    response.raise_for_status()
+                continue
+            response.raise_for_status()
+            data = response.json()
+            content = data["choices"][0]["message"]["content"]
+        except requests.RequestException as exc:
+            count("phase3.request_errors")
+            if exc.response is None or exc.response.status_code != 429:
+                error_headers = exc.response.headers if exc.response is not None else {}
+                dispatcher.report(
+                    lane,
+                    ok=False,
+                    latency_seconds=time.monotonic() - started,
+                    cooldown_seconds=get_retry_delay(error_headers, attempt, base_retry_seconds, 60),
+                )
+            if attempt >= max_retries:
+                raise
+            continue
+        except Exception:
+            # A malformed body still has to give the lane's in-flight slot back.
+            count("phase3.request_errors")
+            dispatcher.report(lane, ok=False, latency_seconds=time.monotonic() - started)
+            raise
+        if usage is not None:
+            usage.record(data.get("usage"))
+        dispatcher.report(
+            lane,
+            ok=True,
+            latency_seconds=elapsed,
+            min_interval=compute_throttle_delay(response.headers),
+        )
+        return content, lane
     raise RuntimeError("Failed to call LLM API after retries")
 
 
@@ -349,14 +621,46 @@ def _prepare_request(
     row: dict[str, str],
     max_retries: int,
     base_retry_seconds: int,
+    prompt_cache: bool = False,
+    reasoning_effort: Optional[str] = None,
 ) -> tuple[str, dict[str, str], dict[str, object], int, int]:
-    messages = _build_messages(row)
-    payload = _request_payload_for_row(provider, model, messages)
-    headers = _request_headers(api_key)
+    messages = _build_messages(row, cache_control=prompt_cache and provider in CACHE_CONTROL_PROVIDERS)
+    payload = _request_payload_for_row(provider, model, messages, reasoning_effort)
+    headers = _request_headers(api_key, provider)
     url = f"{base_url.rstrip('/')}/chat/completions"
     return url, headers, payload, max_retries, base_retry_seconds
 
 
+@timed("phase3.parse")
+def _resolve_response(
+    raw: str,
+    messages: list[dict[str, object]],
+    fixed_fields: Optional[dict[str, object]],
+    reask: Callable[[list[dict[str, object]]], str],
+) -> dict[str, object]:
+    """Validate and repair ``raw``; ask a short follow-up for fields that are still invalid.
+
+    A re-asked ``identified_noun`` is re-asked together with the fields judged for it.
+
+    Raises ``ValueError`` when no response object can be recovered, so the caller re-sends
+    the full request. Fields that stay invalid after ``OPENROUTER_REASK_LIMIT`` follow-ups
+    are kept as returned.
+    """
+    fixed_fields = fixed_fields or {}
+    result = parse_response(raw, skip=frozenset(fixed_fields))
+    reask_limit = max(0, int(os.environ.get("OPENROUTER_REASK_LIMIT", "1")))
+    for _ in range(reask_limit):
+        if not result.invalid:
+            break
+        fields = followup_fields(result.invalid, frozenset(fixed_fields))
+        try:
+            followup = reask(build_followup_messages(messages, {**result.value, **fixed_fields}, fields))
+        except requests.RequestException:
+            break
+        result = merge_followup(result, followup, fields)
+    return {**result.value, **fixed_fields}
+
+
 def _sync_process_row(
     provider: str,
     api_key: str,
@@ -365,7 +669,26 @@ def _sync_process_row(
     row: dict[str, str],
     max_retries: int,
     base_retry_seconds: int,
+    fixed_fields: Optional[dict[str, object]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    dispatcher: Optional[LaneDispatcher] = None,
+    stream: bool = False,
+    prompt_cache: bool = False,
+    usage: Optional[PromptUsage] = None,
+    reasoning_effort: Optional[str] = None,
 ) -> dict[str, str]:
+    if dispatcher is not None:
+        return _sync_process_row_on_lanes(
+            provider,
+            dispatcher,
+            row,
+            max_retries,
+            base_retry_seconds,
+            fixed_fields,
+            cancel_event,
+            prompt_cache,
+            usage,
+        )
     url, headers, payload, max_retries, base_retry_seconds = _prepare_request(
         provider,
         api_key,
@@ -374,14 +697,79 @@ def _sync_process_row(
         row,
         max_retries,
         base_retry_seconds,
+        prompt_cache,
+        reasoning_effort,
     )
     parse_attempts = max(2, int(os.environ.get("OPENROUTER_PARSE_RETRIES", "3")))
     last_error: Optional[Exception] = None
+    transport: dict[str, object] = {}
+    if provider in LOCAL_PROVIDERS:
+        transport = {"timeout": get_request_timeout(provider), "session": _local_session()}
+    if usage is not None:
+        transport["usage"] = usage
+    for _ in range(parse_attempts):
+        ttft: Optional[float] = None
+        if stream:
+            raw, ttft = _send_request_streaming(
+                url, headers, payload, max_retries, base_retry_seconds, cancel_event, **transport
+            )
+        else:
+            raw = _send_request(url, headers, payload, max_retries, base_retry_seconds, cancel_event, **transport)
+        try:
+            parsed = _resolve_response(
+                raw,
+                payload["messages"],
+                fixed_fields,
+                lambda messages: _send_request(
+                    url,
+                    headers,
+                    {**payload, "messages": messages},
+                    max_retries,
+                    base_retry_seconds,
+                    cancel_event,
+                    **transport,
+                ),
+            )
+            result = _apply_response(row, parsed)
+            if ttft is not None:
+                result["ttft_seconds"] = round(ttft, 3)
+            return result
+        except (json.JSONDecodeError, ValueError) as exc:
+            last_error = exc
+            continue
+    if last_error:
+        raise last_error
+    raise RuntimeError("Unable to parse model response")
+
+
+def _sync_process_row_on_lanes(
+    provider: str,
+    dispatcher: LaneDispatcher,
+    row: dict[str, str],
+    max_retries: int,
+    base_retry_seconds: int,
+    fixed_fields: Optional[dict[str, object]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    prompt_cache: bool = False,
+    usage: Optional[PromptUsage] = None,
+) -> dict[str, str]:
+    messages = _build_messages(row, cache_control=prompt_cache and provider in CACHE_CONTROL_PROVIDERS)
+    parse_attempts = max(2, int(os.environ.get("OPENROUTER_PARSE_RETRIES", "3")))
+    last_error: Optional[Exception] = None
     for _ in range(parse_attempts):
-        raw = _send_request(url, headers, payload, max_retries, base_retry_seconds)
+        raw, lane = _send_lane_request(
+            dispatcher, provider, messages, max_retries, base_retry_seconds, cancel_event, usage
+        )
         try:
-            parsed = parse_json_response(raw)
-            return _apply_response(row, parsed)
+            parsed = _resolve_response(
+                raw,
+                messages,
+                fixed_fields,
+                lambda followup: _send_lane_request(
+                    dispatcher, provider, followup, max_retries, base_retry_seconds, cancel_event, usage
+                )[0],
+            )
+            return _apply_response(row, parsed, source=f"llm:{lane.name}")
         except (json.JSONDecodeError, ValueError) as exc:
             last_error = exc
             continue
@@ -424,34 +812,231 @@ def _max_concurrent_from_env(default: int) -> int:
 def run_pilot(
     input_path: Path,
     output_path: Path,
-    limit: int = 20,
+    limit: Optional[int] = 20,
     env_path: Optional[Path] = None,
     max_concurrent: Optional[int] = None,
+    fast_path: bool = False,
+    lexicon_path: Optional[Path] = None,
+    hedge_policy: Optional[HedgePolicy] = None,
+    use_lanes: bool = False,
+    stream: bool = False,
+    request_log_path: Optional[Path] = None,
+    prompt_cache: bool = False,
+    usage: Optional[PromptUsage] = None,
+    budget: Optional[RunBudget] = None,
+    token_prices: Optional[TokenPrices] = None,
+    priority: Sequence[str] = (),
+    resume: bool = False,
+    cascade: Optional[CascadeConfig] = None,
+    read_workers: int = 1,
 ) -> int:
+    """Annotate ``input_path`` rows and write them to ``output_path``.
+
+    With ``fast_path`` enabled, rows resolved by ``phase3_rules.pre_annotate`` skip the
+    model entirely and the remaining rows have their classifier-determined fields fixed.
+    With ``lexicon_path``, the noun lexicon is loaded (if present), grown from every
+    completed model annotation, used to resolve rows whose head noun is settled, and saved.
+    With ``hedge_policy``, rows in flight longer than the run's latency percentile get one
+    duplicate request (within the policy's budget) and the first valid response wins.
+    With ``use_lanes``, rows are spread over (model, key) lanes from OPENROUTER_MODELS /
+    OPENROUTER_API_KEYS and ``annotation_source`` records the lane (``llm:<model>#k<n>``).
+    With ``stream``, single-model requests are streamed and each read stops as soon as the
+    JSON answer is complete. With ``request_log_path``, per-row latency and time to first
+    token are appended there as JSON lines.
+    With ``prompt_cache``, rows are sent in prompt order so shared prefixes are adjacent and
+    the static system turn carries a cache-control hint where the provider supports it.
+    Pass a ``PromptUsage`` as ``usage`` to collect prompt / cached token totals.
+    Rows are sent in ``priority`` order (``phase3_scheduler.PRIORITY_CHOICES``). With
+    ``budget``, rows are only started while the projected spend (reported ``usage.cost`` or
+    ``token_prices``) and finish time stay within it; the run then stops, writes what it has
+    and records ``<output>.state.json``. A cost budget without ``token_prices`` needs a
+    provider that reports cost, and stops the run at the first request that reports none. With ``resume``, rows already in ``output_path``
+    are kept and not sent again. A row whose request fails for good is left out, listed in
+    ``<output>.failures.json`` and retried by the next ``resume``; finished rows (and the
+    state) are written even when the run is interrupted.
+    With ``cascade``, every row is annotated by the cheap tier first and only uncertain rows
+    are redone by the strong tier; the escalation report goes to ``<output>.cascade.json``.
+    Without a ``limit``, ``read_workers`` > 1 parses the input in that many processes.
+    """
     env_path = env_path or Path(".env")
     load_env(env_path)
 
-    api_key, model, base_url = _load_provider_config()
-    provider = "openrouter"
+    provider, api_key, model, base_url = _load_provider_config()
 
     max_retries = int(os.environ.get("OPENROUTER_MAX_RETRIES", "5"))
     base_retry_seconds = int(os.environ.get("OPENROUTER_RETRY_BASE_SECONDS", "5"))
 
-    rows = _read_rows(input_path, limit)
-
-    async def _worker(row: dict[str, str]) -> dict[str, str]:
-        return await asyncio.to_thread(
-            _sync_process_row,
-            provider,
-            api_key,
-            model,
-            base_url,
-            row,
-            max_retries,
-            base_retry_seconds,
-        )
-
-    max_concurrent = max_concurrent or _max_concurrent_from_env(10)
-    processed = run_with_semaphore(rows, _worker, max_concurrent)
-    _write_rows(output_path, processed)
-    return len(processed)
+    with timed("phase3.read_input"):
+        rows = enrich_columns(_read_rows(input_path, limit, read_workers))
+
+    dispatcher: Optional[LaneDispatcher] = None
+    if use_lanes:
+        if stream:
+            raise ValueError("Streaming is not supported together with lanes")
+        if provider != "openrouter":
+            raise ValueError("Lanes are only supported for the openrouter provider")
+        dispatcher = LaneDispatcher(_load_lanes(provider, api_key, model, base_url))
+
+    if budget is not None and budget.max_cost is not None and token_prices is None:
+        if provider not in COST_REPORTING_PROVIDERS:
+            raise ValueError(f"A cost budget needs token prices: {provider} does not report request cost")
+
+    if budget is not None:
+        # Created before the cascade stats so per-tier usage rolls up into what the scheduler sees.
+        usage = usage or PromptUsage()
+
+    cascade_stats: Optional[CascadeStats] = None
+    if cascade is not None:
+        if dispatcher is not None:
+            raise ValueError("Cascade mode is not supported together with lanes")
+        cascade = cascade.resolved(model)
+        ensure_model_allowed(str(cascade.cheap.model), provider)
+        ensure_model_allowed(str(cascade.strong.model), provider)
+        cascade_stats = CascadeStats(cascade, usage)
+
+    lexicon: Optional[NounLexicon] = None
+    if lexicon_path is not None:
+        lexicon = NounLexicon()
+        if lexicon_path.exists():
+            lexicon.load(lexicon_path)
+
+    processed: list[Optional[dict[str, str]]] = [None] * len(rows)
+    resumed: set[int] = set()
+    if resume and artifact_exists(output_path):
+        existing = index_rows(iter_csv_rows(output_path))
+        occurrences: Counter[tuple[str, ...]] = Counter()
+        for index, row in enumerate(rows):
+            key = row_key(row)
+            previous = existing.get(key + (str(occurrences[key]),))
+            occurrences[key] += 1
+            if previous is not None:
+                processed[index] = previous
+                resumed.add(index)
+
+    pending: list[tuple[int, dict[str, str]]] = []
+    for index, row in enumerate(rows):
+        if index in resumed:
+            continue
+        parsed = pre_annotate(row) if fast_path else None
+        if parsed is not None:
+            processed[index] = _apply_response(row, parsed, source="rule")
+        else:
+            pending.append((index, row))
+
+    if prompt_cache:
+        pending = order_by_prefix(pending, lambda item: str(_build_messages(item[1])[1]["content"]))
+    if priority:
+        pending = prioritize(pending, priority)
+
+    scheduler: Optional[BudgetScheduler] = None
+    if budget is not None:
+        scheduler = BudgetScheduler(budget, usage, token_prices)
+
+    tracker = LatencyTracker()
+    failures: dict[int, str] = {}
+    hedge_budget = HedgeBudget(hedge_policy.max_hedges(len(pending)) if hedge_policy else 0)
+
+    async def _worker(item: tuple[int, dict[str, str]]) -> Optional[dict[str, str]]:
+        index, row = item
+        if lexicon is not None:
+            parsed = resolve_from_lexicon(row, lexicon)
+            if parsed is not None:
+                processed[index] = _apply_response(row, parsed, source="lexicon")
+                return processed[index]
+        if scheduler is not None and not scheduler.admit():
+            return None
+        fixed_fields = deterministic_fields(row) if fast_path else None
+
+        def _call_tier(tier: CascadeTier, tier_usage: PromptUsage, cancel_event: Optional[threading.Event]) -> dict[str, str]:
+            return _sync_process_row(
+                provider,
+                api_key,
+                str(tier.model),
+                base_url,
+                row,
+                max_retries,
+                base_retry_seconds,
+                fixed_fields,
+                cancel_event,
+                None,
+                stream,
+                prompt_cache,
+                tier_usage,
+                tier.reasoning_effort,
+            )
+
+        def _call(cancel_event: Optional[threading.Event] = None) -> dict[str, str]:
+            if cascade is not None and cascade_stats is not None:
+                return run_cascade_row(
+                    row,
+                    cascade,
+                    cascade_stats,
+                    lambda tier, tier_usage: _call_tier(tier, tier_usage, cancel_event),
+                )
+            return _sync_process_row(
+                provider,
+                api_key,
+                model,
+                base_url,
+                row,
+                max_retries,
+                base_retry_seconds,
+                fixed_fields,
+                cancel_event,
+                dispatcher,
+                stream,
+                prompt_cache,
+                usage,
+            )
+
+        started = time.monotonic()
+        try:
+            if hedge_policy is not None:
+                result = await run_hedged(_call, hedge_policy, tracker, hedge_budget)
+            else:
+                result = await asyncio.to_thread(_call)
+        except Exception as exc:
+            # One bad row must not cost the rows already done; it is left for ``resume``.
+            if scheduler is not None:
+                scheduler.finish(time.monotonic() - started, ok=False)
+            failures[index] = f"{type(exc).__name__}: {exc}"
+            count("phase3.row_failures")
+            return None
+        except BaseException:
+            if scheduler is not None:
+                scheduler.finish(time.monotonic() - started, ok=False)
+            raise
+        result["latency_seconds"] = round(time.monotonic() - started, 3)
+        if scheduler is not None:
+            scheduler.finish(result["latency_seconds"])
+        if lexicon is not None:
+            lexicon.update_from_rows([result])
+        processed[index] = result
+        return result
+
+    max_concurrent = max_concurrent or _max_concurrent_from_env(get_default_concurrency(provider))
+    written: list[dict[str, str]] = []
+    try:
+        with timed("phase3.annotate"):
+            run_with_semaphore(pending, _worker, max_concurrent)
+    finally:
+        # Also on interrupts, so a stopped run leaves everything it finished for ``resume``.
+        if lexicon is not None and lexicon_path is not None:
+            lexicon.save(lexicon_path)
+        written = [row for row in processed if row is not None]
+        with timed("phase3.write_output"):
+            _write_rows(output_path, written)
+        _write_failures(failures_path_for(output_path), rows, failures)
+        if scheduler is not None:
+            write_state(state_path_for(output_path), scheduler.state(len(rows), len(written)))
+        if cascade_stats is not None:
+            write_report(cascade_report_path(output_path), cascade_stats.report())
+        if request_log_path is not None:
+            fresh = [row for index, row in enumerate(processed) if row is not None and index not in resumed]
+            _append_request_log(request_log_path, fresh, stream)
+    count("phase3.rows_resumed", len(resumed))
+    for index, row in enumerate(processed):
+        if row is not None and index not in resumed:
+            # "llm:<model>#k0" -> phase3.rows.llm
+            count(f"phase3.rows.{str(row.get('annotation_source', '')).split(':')[0] or 'unknown'}")
+    return len(written)
@@ -0,0 +1,218 @@
+﻿from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Sequence
+
+from classifier_pipeline.artifact_io import artifact_name, iter_csv_rows, logical_path
+
+# Fields whose cross-model disagreement marks a row as uncertain.
+COMPARED_FIELDS = ("identified_noun", "conventional_classifier_zh", "overuse_of_ge")
+
+RowKey = tuple[str, ...]
+
+
+def row_key(row: dict[str, str]) -> RowKey:
+    """Join key for a result row.
+
+    Rows carrying childes-db ids use (utterance_id, classifier_token_order); older result
+    files without ids fall back to the file name and the classifier context.
+    """
+    utterance_id = (row.get("utterance_id") or "").strip()
+    token_order = (row.get("classifier_token_order") or "").strip()
+    if utterance_id and token_order:
+        return ("id", utterance_id, token_order)
+    return (
+        "ctx",
+        row.get("File Name") or "",
+        row.get("Utterance") or "",
+        row.get("Determiner/Numbers") or "",
+        row.get("Classifier") or "",
+    )
+
+
+def normalize_field(value: object) -> str:
+    if value is None:
+        return ""
+    return str(value).strip()
+
+
+def _normalize_for_compare(field: str, value: object) -> str:
+    normalized = normalize_field(value)
+    if field in {"overuse_of_ge", "flag_for_review"}:
+        return normalized.lower()
+    return normalized
+
+
+def index_rows(rows: Iterable[dict[str, str]]) -> dict[RowKey, dict[str, str]]:
+    """Index rows by ``row_key``; repeated keys get an occurrence suffix so none are lost."""
+    indexed: dict[RowKey, dict[str, str]] = {}
+    occurrences: Counter[RowKey] = Counter()
+    for row in rows:
+        key = row_key(row)
+        indexed[key + (str(occurrences[key]),)] = row
+        occurrences[key] += 1
+    return indexed
+
+
+def run_names(paths: Sequence[Path]) -> list[str]:
+    """Run names for ``paths``: the artifact name, prefixed with as many parent directories
+    as it takes to tell apart files that share one (``a/results`` vs ``b/results``)."""
+    stems = [logical_path(Path(path)).with_suffix("") for path in paths]
+    names = [artifact_name(Path(path)) for path in paths]
+    depth = 1
+    while len(set(names)) < len(names):
+        counts = Counter(names)
+        longer = False
+        for index, stem in enumerate(stems):
+            if counts[names[index]] > 1 and len(stem.parts) > depth:
+                names[index] = "/".join(stem.parts[-depth - 1 :])
+                longer = True
+        if not longer:
+            duplicates = sorted(name for name, seen in Counter(names).items() if seen > 1)
+            raise ValueError(f"Result files given more than once: {', '.join(duplicates)}")
+        depth += 1
+    return names
+
+
+def load_result_runs(paths: Sequence[Path]) -> dict[str, dict[RowKey, dict[str, str]]]:
+    runs: dict[str, dict[RowKey, dict[str, str]]] = {}
+    for name, path in zip(run_names(paths), paths):
+        runs[name] = index_rows(iter_csv_rows(path))
+    return runs
+
+
+def align_runs(
+    runs: dict[str, dict[RowKey, dict[str, str]]],
+) -> dict[RowKey, dict[str, dict[str, str]]]:
+    aligned: dict[RowKey, dict[str, dict[str, str]]] = {}
+    for run_name, indexed in runs.items():
+        for key, row in indexed.items():
+            aligned.setdefault(key, {})[run_name] = row
+    return aligned
+
+
+@dataclass(frozen=True)
+class RowUncertainty:
+    key: RowKey
+    noun: str
+    classifier: str
+    disagreement: float
+    flag_density: float
+    n_runs: int
+
+
+@dataclass(frozen=True)
+class ClusterUncertainty:
+    noun: str
+    classifier: str
+    n_rows: int
+    disagreement: float
+    flag_density: float
+    score: float
+
+
+def _majority(values: list[str]) -> tuple[str, int]:
+    value, count = Counter(values).most_common(1)[0]
+    return value, count
+
+
+def score_row(key: RowKey, by_run: dict[str, dict[str, str]]) -> RowUncertainty:
+    rows = list(by_run.values())
+    n_runs = len(rows)
+    disagreements = []
+    for field in COMPARED_FIELDS:
+        values = [_normalize_for_compare(field, row.get(field)) for row in rows]
+        _, count = _majority(values)
+        disagreements.append(1.0 - count / n_runs)
+    flags = [
+        _normalize_for_compare("flag_for_review", row.get("flag_for_review"))
+        for row in rows
+        if "flag_for_review" in row
+    ]
+    flag_density = sum(1 for flag in flags if flag == "true") / len(flags) if flags else 0.0
+    noun, _ = _majority([normalize_field(row.get("identified_noun")) for row in rows])
+    return RowUncertainty(
+        key=key,
+        noun=noun,
+        classifier=normalize_field(rows[0].get("Classifier")),
+        disagreement=sum(disagreements) / len(disagreements),
+        flag_density=flag_density,
+        n_runs=n_runs,
+    )
+
+
+def score_clusters(
+    row_scores: Iterable[RowUncertainty],
+    flag_weight: float = 0.5,
+) -> dict[tuple[str, str], ClusterUncertainty]:
+    grouped: dict[tuple[str, str], list[RowUncertainty]] = {}
+    for score in row_scores:
+        grouped.setdefault((score.noun, score.classifier), []).append(score)
+
+    clusters = {}
+    for (noun, classifier), scores in grouped.items():
+        disagreement = sum(s.disagreement for s in scores) / len(scores)
+        flag_density = sum(s.flag_density for s in scores) / len(scores)
+        clusters[(noun, classifier)] = ClusterUncertainty(
+            noun=noun,
+            classifier=classifier,
+            n_rows=len(scores),
+            disagreement=round(disagreement, 4),
+            flag_density=round(flag_density, 4),
+            score=round(disagreement + flag_weight * flag_density, 4),
+        )
+    return clusters
+
+
+def select_review_samples(
+    runs: dict[str, dict[RowKey, dict[str, str]]],
+    total: int = 20,
+    min_score: float = 0.0,
+    flag_weight: float = 0.5,
+) -> list[dict[str, str]]:
+    """Pick one representative row for each of the most uncertain (noun, classifier) clusters.
+
+    Clusters are ranked by mean cross-run disagreement plus ``flag_weight`` times their
+    ``flag_for_review`` density; clusters scoring ``min_score`` or less are skipped.
+    Each selected row carries the per-run values of ``COMPARED_FIELDS`` for the reviewer.
+    """
+    aligned = align_runs(runs)
+    row_scores = [score_row(key, by_run) for key, by_run in aligned.items()]
+    clusters = score_clusters(row_scores, flag_weight=flag_weight)
+
+    representatives: dict[tuple[str, str], RowUncertainty] = {}
+    for score in row_scores:
+        cluster_key = (score.noun, score.classifier)
+        current = representatives.get(cluster_key)
+        rank = (score.disagreement + flag_weight * score.flag_density, score.n_runs)
+        if current is None or rank > (
+            current.disagreement + flag_weight * current.flag_density,
+            current.n_runs,
+        ):
+            representatives[cluster_key] = score
+
+    ranked = sorted(
+        (cluster for cluster in clusters.values() if cluster.score > min_score),
+        key=lambda cluster: (-cluster.score, -cluster.n_rows, cluster.noun, cluster.classifier),
+    )
+
+    run_names = list(runs)
+    selected: list[dict[str, str]] = []
+    for cluster in ranked[: max(total, 0)]:
+        representative = representatives[(cluster.noun, cluster.classifier)]
+        by_run = aligned[representative.key]
+        base = dict(next(iter(by_run.values())))
+        base["review_cluster_noun"] = cluster.noun
+        base["review_cluster_classifier"] = cluster.classifier
+        base["review_cluster_rows"] = cluster.n_rows
+        base["review_cluster_disagreement"] = cluster.disagreement
+        base["review_cluster_flag_density"] = cluster.flag_density
+        base["review_cluster_score"] = cluster.score
+        for run_name in run_names:
+            run_row = by_run.get(run_name, {})
+            for field in COMPARED_FIELDS:
+                base[f"{field}__{run_name}"] = run_row.get(field, "")
+        selected.append(base)
+    return selected
@@ -0,0 +1,113 @@
+﻿from __future__ import annotations
+
+from typing import Optional
+
+from classifier_pipeline.columns import compute_determiner_type
+
+GENERAL_CLASSIFIER = "个"
+
+# Sentence-final particles that cannot be the noun of a classifier phrase.
+SENTENCE_FINAL_TOKENS = frozenset({"吗", "呢", "啊", "吧", "呀", "嘛", "哦", "啦", "哇", "么", "噢", "哈"})
+SENTENCE_FINAL_POS = frozenset({"sfp", "co:int"})
+
+COPULA_TOKENS = frozenset({"是"})
+COPULA_POS = frozenset({"v:cop"})
+# Adverbs that may sit between the classifier and the copula ("这 个 也 是 ...", "这 只 不 是 ...").
+COPULA_ADVERBS = frozenset({"不", "也", "就", "都", "还", "才", "又"})
+
+RULE_UTTERANCE_FINAL = "utterance_final"
+RULE_DEMONSTRATIVE_COPULA = "demonstrative_copula"
+
+RULE_RATIONALES = {
+    RULE_UTTERANCE_FINAL: "Rule-based: the classifier ends the utterance, so no noun is spoken.",
+    RULE_DEMONSTRATIVE_COPULA: "Rule-based: demonstrative-copula construction with no explicit referent noun.",
+}
+
+
+def locate_target(tokens: list[str], row: dict[str, str]) -> Optional[int]:
+    """Return the index of the target classifier in ``tokens`` or None when ambiguous.
+
+    ``classifier_token_order`` (1-based) is trusted when it points at the expected
+    determiner + classifier pair; otherwise the pair must occur exactly once.
+    """
+    classifier = (row.get("Classifier") or "").strip()
+    determiner = (row.get("Determiner/Numbers") or "").strip()
+    if not classifier:
+        return None
+
+    order = (row.get("classifier_token_order") or "").strip()
+    if order:
+        try:
+            index = int(float(order)) - 1
+        except ValueError:
+            index = -1
+        if 0 < index < len(tokens) and tokens[index] == classifier and tokens[index - 1] == determiner:
+            return index
+
+    matches = [
+        i
+        for i in range(1, len(tokens))
+        if tokens[i] == classifier and tokens[i - 1] == determiner
+    ]
+    if len(matches) == 1:
+        return matches[0]
+    return None
+
+
+def deterministic_fields(row: dict[str, str]) -> dict[str, object]:
+    """Fields fixed by the classifier token alone (rules 3 and 4 of the system instruction)."""
+    classifier = (row.get("Classifier") or "").strip()
+    if not classifier:
+        return {}
+    if classifier == GENERAL_CLASSIFIER:
+        return {"classifier_type": "General"}
+    return {"classifier_type": "Specific", "overuse_of_ge": False}
+
+
+def match_omission_rule(row: dict[str, str]) -> Optional[str]:
+    tokens = (row.get("Utterance") or "").split()
+    index = locate_target(tokens, row)
+    if index is None:
+        return None
+
+    pos_tags = (row.get("%gra") or "").split()
+    aligned = len(pos_tags) == len(tokens)
+
+    following = list(range(index + 1, len(tokens)))
+    if all(
+        tokens[i] in SENTENCE_FINAL_TOKENS or (aligned and pos_tags[i] in SENTENCE_FINAL_POS)
+        for i in following
+    ):
+        return RULE_UTTERANCE_FINAL
+
+    if compute_determiner_type(row.get("Determiner/Numbers") or "") != "demonstrative":
+        return None
+    position = index + 1
+    if tokens[position] in COPULA_ADVERBS and position + 1 < len(tokens):
+        position += 1
+    if tokens[position] in COPULA_TOKENS or (aligned and pos_tags[position] in COPULA_POS):
+        return RULE_DEMONSTRATIVE_COPULA
+    return None
+
+
+def pre_annotate(row: dict[str, str]) -> Optional[dict[str, object]]:
+    """Fully resolve rows whose answer is fixed by the prompt rules, else return None.
+
+    The returned dict has the same keys as a parsed model response so it can go through
+    the normal ``_apply_response`` path.
+    """
+    rule = match_omission_rule(row)
+    if rule is None:
+        return None
+    parsed: dict[str, object] = {
+        "identified_noun": "OMITTED",
+        "conventional_classifier": "N/A",
+        "conventional_classifier_zh": "N/A",
+        "classifier_type": "",
+        "overuse_of_ge": False,
+        "rationale": RULE_RATIONALES[rule],
+        "flag_for_review": False,
+        "flag_reason": "",
+    }
+    parsed.update(deterministic_fields(row))
+    return parsed
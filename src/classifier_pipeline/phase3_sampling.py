@@ -1,11 +1,97 @@
 ﻿from __future__ import annotations
 
-import csv
 import random
+from collections import deque
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable, Iterator, Optional, Sequence
+
+from classifier_pipeline.artifact_io import CsvArtifactWriter, iter_csv_rows, read_csv_rows
+from classifier_pipeline.columns import compute_age_band
+from classifier_pipeline.parallel_csv import read_table
 
 FOCUS_NOUNS = ["书", "纸", "鱼", "车", "人", "狗", "猫", "票", "衣", "杯"]
+PRIORITY_TERMS = ["花"]
+
+
+# Random probes into a posting list before falling back to a single reservoir pass.
+_PROBE_ATTEMPTS = 8
+
+
+class TermMatcher:
+    """Aho-Corasick automaton that reports every term occurring in a text in one pass."""
+
+    def __init__(self, terms: Iterable[str]) -> None:
+        self.terms = list(dict.fromkeys(term for term in terms if term))
+        self._goto: list[dict[str, int]] = [{}]
+        self._outputs: list[tuple[int, ...]] = [()]
+        for term_id, term in enumerate(self.terms):
+            state = 0
+            for char in term:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._outputs.append(())
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._outputs[state] += (term_id,)
+
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._outputs[next_state] += self._outputs[self._fail[next_state]]
+
+    def find(self, text: str) -> set[int]:
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        found: set[int] = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+
+
+def build_term_index(texts: Iterable[str], terms: Iterable[str]) -> dict[str, list[int]]:
+    """Map each term to the ascending ids of the texts containing it (one pass over texts)."""
+    matcher = TermMatcher(terms)
+    postings: list[list[int]] = [[] for _ in matcher.terms]
+    for row_id, text in enumerate(texts):
+        if not text:
+            continue
+        for term_id in matcher.find(text):
+            postings[term_id].append(row_id)
+    return dict(zip(matcher.terms, postings))
+
+
+def _draw_unused(rng: random.Random, postings: Sequence[int], used: set[int]) -> Optional[int]:
+    if not postings:
+        return None
+    for _ in range(_PROBE_ATTEMPTS):
+        candidate = postings[rng.randrange(len(postings))]
+        if candidate not in used:
+            return candidate
+    chosen: Optional[int] = None
+    seen = 0
+    for candidate in postings:
+        if candidate in used:
+            continue
+        seen += 1
+        if rng.randrange(seen) == 0:
+            chosen = candidate
+    return chosen
 
 
 def select_focus_samples(
@@ -14,43 +100,51 @@ def select_focus_samples(
     flower_min: int = 5,
     flower_max: int = 10,
     seed: int = 13,
+    focus_terms: Optional[Sequence[str]] = None,
+    priority_terms: Optional[Sequence[str]] = None,
 ) -> list[dict[str, str]]:
+    """Sample rows for targeted validation.
+
+    Between ``flower_min`` and ``flower_max`` rows mentioning any priority term are drawn
+    first (``PRIORITY_TERMS`` by default), then one row per focus term (``FOCUS_NOUNS`` by
+    default), then uniformly random rows until ``total`` is reached.
+    """
+    focus_terms = FOCUS_NOUNS if focus_terms is None else list(focus_terms)
+    priority_terms = PRIORITY_TERMS if priority_terms is None else list(priority_terms)
     rng = random.Random(seed)
-    indices = list(range(len(rows)))
 
-    utterances = [row.get("Utterance", "") for row in rows]
-    flower_candidates = [i for i, utt in enumerate(utterances) if "花" in utt]
-    rng.shuffle(flower_candidates)
+    index = build_term_index(
+        (row.get("Utterance", "") for row in rows),
+        list(priority_terms) + list(focus_terms),
+    )
 
-    flower_count = min(flower_max, len(flower_candidates))
-    if flower_count < flower_min:
-        flower_count = len(flower_candidates)
+    priority_candidates = sorted({i for term in priority_terms for i in index.get(term, [])})
+    priority_count = min(flower_max, len(priority_candidates))
+    if priority_count < flower_min:
+        priority_count = len(priority_candidates)
+    priority_count = min(priority_count, max(total, 0))
 
-    selected: list[int] = []
-    used = set()
+    selected: list[int] = rng.sample(priority_candidates, priority_count)
+    used = set(selected)
 
-    for idx in flower_candidates[:flower_count]:
-        selected.append(idx)
-        used.add(idx)
+    for term in focus_terms:
         if len(selected) >= total:
             break
-
-    for noun in FOCUS_NOUNS:
-        if len(selected) >= total:
-            break
-        candidates = [i for i, utt in enumerate(utterances) if i not in used and noun in utt]
-        if not candidates:
+        idx = _draw_unused(rng, index.get(term, []), used)
+        if idx is None:
             continue
-        idx = rng.choice(candidates)
         selected.append(idx)
         used.add(idx)
 
-    if len(selected) < total:
-        remaining = [i for i in indices if i not in used]
-        rng.shuffle(remaining)
-        for idx in remaining:
+    needed = min(total, len(rows)) - len(selected)
+    if needed > 0:
+        for idx in rng.sample(range(len(rows)), min(len(rows), needed + len(used))):
+            if idx in used:
+                continue
             selected.append(idx)
-            if len(selected) >= total:
+            used.add(idx)
+            needed -= 1
+            if needed == 0:
                 break
 
     selected_sorted = sorted(selected)
@@ -73,18 +167,81 @@ def select_random_samples(
     return [rows[i] for i in selected]
 
 
-def read_rows(path: Path) -> list[dict[str, str]]:
-    with path.open("r", encoding="utf-8", newline="") as handle:
-        reader = csv.DictReader(handle)
-        return list(reader)
+def corpus_from_file_name(file_name: str) -> str:
+    """Return the corpus segment of a childes-db filename such as ``Mandarin/Tong/010.xml``."""
+    parts = [part for part in (file_name or "").replace("\\", "/").split("/") if part]
+    if len(parts) >= 3:
+        return parts[1]
+    return parts[0] if parts else ""
+
+
+DERIVED_STRATA: dict[str, Callable[[dict[str, str]], str]] = {
+    "age_band": lambda row: compute_age_band(row.get("Age", "")),
+    "corpus": lambda row: corpus_from_file_name(row.get("File Name", "")),
+}
+
+
+def stratum_key(row: dict[str, str], strata: Sequence[str]) -> tuple[str, ...]:
+    values = []
+    for name in strata:
+        derive = DERIVED_STRATA.get(name)
+        values.append(derive(row) if derive else (row.get(name) or ""))
+    return tuple(values)
+
+
+def select_stratified_samples(
+    rows: Iterable[dict[str, str]],
+    strata: Sequence[str],
+    per_stratum: int = 5,
+    seed: int = 42,
+) -> list[dict[str, str]]:
+    """Draw up to ``per_stratum`` rows from every stratum in a single pass.
+
+    Each stratum keeps its own reservoir and its own RNG seeded from ``seed`` and the
+    stratum key, so results are reproducible and independent of the other strata.
+    Strata are column names or one of ``DERIVED_STRATA``.
+    """
+    if per_stratum <= 0:
+        return []
+    reservoirs: dict[tuple[str, ...], list[tuple[int, dict[str, str]]]] = {}
+    seen: dict[tuple[str, ...], int] = {}
+    rngs: dict[tuple[str, ...], random.Random] = {}
+
+    for position, row in enumerate(rows):
+        key = stratum_key(row, strata)
+        count = seen.get(key, 0) + 1
+        seen[key] = count
+        reservoir = reservoirs.setdefault(key, [])
+        if len(reservoir) < per_stratum:
+            reservoir.append((position, row))
+            continue
+        rng = rngs.get(key)
+        if rng is None:
+            rng = rngs[key] = random.Random(f"{seed}:{'|'.join(key)}")
+        index = rng.randrange(count)
+        if index < per_stratum:
+            reservoir[index] = (position, row)
+
+    selected = sorted(item for reservoir in reservoirs.values() for item in reservoir)
+    return [row for _, row in selected]
+
+
+def iter_rows(path: Path) -> Iterator[dict[str, str]]:
+    """Rows of a CSV artifact; compressed (``.gz``/``.zst``) and chunked outputs are read transparently."""
+    return iter_csv_rows(path)
+
+
+def read_rows(path: Path, workers: int = 1) -> list[dict[str, str]]:
+    """All rows of a CSV artifact; with ``workers`` > 1 it is split and parsed in parallel processes."""
+    if workers > 1:
+        return read_table(path, workers=workers).to_dicts()
+    return read_csv_rows(path)
 
 
-def write_rows(path: Path, rows: Iterable[dict[str, str]]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
+def write_rows(path: Path, rows: Iterable[dict[str, str]], max_part_bytes: Optional[int] = None) -> None:
     rows = list(rows)
     if not rows:
         raise ValueError("No rows to write")
-    with path.open("w", encoding="utf-8", newline="") as handle:
-        writer = csv.DictWriter(handle, fieldnames=list(rows[0].keys()))
-        writer.writeheader()
-        writer.writerows(rows)
+    fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+    with CsvArtifactWriter(path, fieldnames, max_part_bytes=max_part_bytes) as writer:
+        writer.writerows([row.get(key, "") for key in fieldnames] for row in rows)
@@ -0,0 +1,184 @@
+﻿from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+from classifier_pipeline.phase3_cache import PromptUsage
+from classifier_pipeline.phase3_contexts import CONTEXT_FIELDS
+from classifier_pipeline.phase3_rules import GENERAL_CLASSIFIER
+
+PRIORITY_KEYS: dict[str, Callable[[dict[str, str]], int]] = {
+    "chi_first": lambda row: 0 if (row.get("Speaker_Code") or "").strip() == "CHI" else 1,
+    "non_ge_first": lambda row: 0 if (row.get("Classifier") or "").strip() != GENERAL_CLASSIFIER else 1,
+}
+# Needs the whole run to rank rows, so it is handled in ``prioritize``.
+UNIQUE_FIRST = "unique_first"
+PRIORITY_CHOICES = sorted([*PRIORITY_KEYS, UNIQUE_FIRST])
+
+STOP_BUDGET = "budget"
+STOP_DEADLINE = "deadline"
+STOP_UNPRICED = "cost_unreported"
+
+
+def prioritize(
+    items: Sequence[tuple[int, dict[str, str]]],
+    keys: Sequence[str],
+) -> list[tuple[int, dict[str, str]]]:
+    """Stable sort of (index, row) pairs by the named priority keys, most important first.
+
+    ``unique_first`` sends the first row of every annotation context before any repeat.
+    """
+    unknown = [key for key in keys if key not in PRIORITY_KEYS and key != UNIQUE_FIRST]
+    if unknown:
+        raise ValueError(f"Unknown priority key(s): {', '.join(unknown)}. Choose from {PRIORITY_CHOICES}")
+    seen: set[tuple[str, ...]] = set()
+    repeat: dict[int, int] = {}
+    for index, row in items:
+        context = tuple((row.get(field) or "").strip() for field in CONTEXT_FIELDS)
+        repeat[index] = 1 if context in seen else 0
+        seen.add(context)
+
+    def _key(item: tuple[int, dict[str, str]]) -> tuple[int, ...]:
+        index, row = item
+        return tuple(repeat[index] if key == UNIQUE_FIRST else PRIORITY_KEYS[key](row) for key in keys)
+
+    return sorted(items, key=_key)
+
+
+@dataclass(frozen=True)
+class TokenPrices:
+    """USD per million tokens; used when the provider does not report ``usage.cost``."""
+
+    prompt: float
+    completion: float
+    cached: Optional[float] = None
+
+    def estimate(self, usage: PromptUsage) -> float:
+        cached_price = self.prompt if self.cached is None else self.cached
+        uncached = max(0, usage.prompt_tokens - usage.cached_tokens)
+        return (
+            uncached * self.prompt + usage.cached_tokens * cached_price + usage.completion_tokens * self.completion
+        ) / 1_000_000
+
+
+@dataclass(frozen=True)
+class RunBudget:
+    max_cost: Optional[float] = None
+    deadline_seconds: Optional[float] = None
+
+
+class BudgetScheduler:
+    """Admits rows only while the projected spend and finish time stay within the budget.
+
+    Cost per row and latency per row are running averages over the rows completed so far,
+    so the first wave of concurrent rows is admitted before any estimate exists. Once a limit
+    would be crossed no further rows are admitted; rows already in flight finish normally.
+    A cost budget also stops the run once a response reports token usage without a cost and
+    there are no ``prices`` to estimate it from, rather than counting that request as free.
+    Thread-safe.
+    """
+
+    def __init__(
+        self,
+        budget: RunBudget,
+        usage: PromptUsage,
+        prices: Optional[TokenPrices] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.budget = budget
+        self.usage = usage
+        self.prices = prices
+        self._clock = clock
+        self._started = clock()
+        self.admitted = 0
+        self.completed = 0
+        self.in_flight = 0
+        self.latency_total = 0.0
+        self.stop_reason: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def spent(self) -> float:
+        if self.prices is not None and self.usage.cost_reported < self.usage.reported:
+            return self.prices.estimate(self.usage)
+        return self.usage.cost
+
+    def _unpriced(self) -> bool:
+        return self.prices is None and self.usage.cost_reported < self.usage.reported
+
+    def elapsed(self) -> float:
+        return self._clock() - self._started
+
+    def _average_cost(self) -> Optional[float]:
+        return self.spent() / self.completed if self.completed else None
+
+    def _average_latency(self) -> Optional[float]:
+        return self.latency_total / self.completed if self.completed else None
+
+    def admit(self) -> bool:
+        with self._lock:
+            if self.stop_reason is not None:
+                return False
+            if self.budget.max_cost is not None and self._unpriced():
+                self.stop_reason = STOP_UNPRICED
+                return False
+            average_cost = self._average_cost()
+            if self.budget.max_cost is not None and average_cost is not None:
+                projected = self.spent() + (self.in_flight + 1) * average_cost
+                if projected > self.budget.max_cost:
+                    self.stop_reason = STOP_BUDGET
+                    return False
+            if self.budget.deadline_seconds is not None:
+                average_latency = self._average_latency() or 0.0
+                if self.elapsed() + average_latency > self.budget.deadline_seconds:
+                    self.stop_reason = STOP_DEADLINE
+                    return False
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+    def finish(self, latency_seconds: float, ok: bool = True) -> None:
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if ok:
+                self.completed += 1
+                self.latency_total += latency_seconds
+
+    def state(self, rows_total: int, rows_done: int) -> dict[str, object]:
+        with self._lock:
+            spent = self.spent()
+            average_cost = self._average_cost()
+            average_latency = self._average_latency()
+            remaining = rows_total - rows_done
+            return {
+                "stop_reason": self.stop_reason,
+                "rows_total": rows_total,
+                "rows_done": rows_done,
+                "rows_remaining": remaining,
+                "model_rows_completed": self.completed,
+                "spent": round(spent, 6),
+                "elapsed_seconds": round(self.elapsed(), 3),
+                "avg_cost_per_row": round(average_cost, 6) if average_cost is not None else None,
+                "avg_latency_seconds": round(average_latency, 3) if average_latency is not None else None,
+                "estimated_cost_remaining": (
+                    round(average_cost * remaining, 4) if average_cost is not None else None
+                ),
+                "max_cost": self.budget.max_cost,
+                "deadline_seconds": self.budget.deadline_seconds,
+            }
+
+
+def state_path_for(output_path: Path) -> Path:
+    return output_path.with_name(output_path.stem + ".state.json")
+
+
+def failures_path_for(output_path: Path) -> Path:
+    return output_path.with_name(output_path.stem + ".failures.json")
+
+
+def write_state(path: Path, state: dict[str, object]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(state, indent=2), encoding="utf-8")
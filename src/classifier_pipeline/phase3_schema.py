@@ -0,0 +1,274 @@
+﻿from __future__ import annotations
+
+import json
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from classifier_pipeline.phase3_streaming import JsonObjectScanner
+
+RESPONSE_KEYS = [
+    "identified_noun",
+    "conventional_classifier",
+    "conventional_classifier_zh",
+    "classifier_type",
+    "overuse_of_ge",
+    "rationale",
+    "flag_for_review",
+    "flag_reason",
+]
+
+FLAG_REASONS = frozenset(
+    {
+        "colloquial_tolerance",
+        "disputed_convention",
+        "implicit_noun_inference",
+        "multi_instance_disambiguation",
+    }
+)
+
+OMITTED = "OMITTED"
+NOT_APPLICABLE = "N/A"
+
+# Fields that are cheap to default instead of re-asking for.
+FIELD_DEFAULTS: dict[str, object] = {"rationale": "", "flag_reason": ""}
+
+# Fields judged for a particular noun; a re-asked noun brings them along so they cannot
+# describe a different noun than the one finally kept.
+NOUN_DEPENDENT_FIELDS = frozenset(
+    {
+        "conventional_classifier",
+        "conventional_classifier_zh",
+        "overuse_of_ge",
+        "rationale",
+        "flag_for_review",
+        "flag_reason",
+    }
+)
+
+_FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*\s*\n?(.*?)\n?\s*```", re.DOTALL)
+_HAN_RE = re.compile(r"^[\u3400-\u9fff\uf900-\ufaff]+$")
+_PINYIN_RE = re.compile(r"^[a-z:]+[1-5]?$")
+
+FIELD_HINTS = {
+    "identified_noun": "the noun in Simplified Chinese characters (not pinyin), or 'OMITTED'",
+    "conventional_classifier": "the conventional classifier in pinyin (e.g. 'ben'), or 'N/A'",
+    "conventional_classifier_zh": "the conventional classifier in Simplified Chinese (e.g. '本'), or 'N/A'",
+    "classifier_type": "'General' or 'Specific'",
+    "overuse_of_ge": "true or false",
+    "flag_for_review": "true or false",
+    "flag_reason": "one of " + ", ".join(sorted(FLAG_REASONS)) + ", or '' when not flagged",
+}
+
+
+@dataclass
+class SchemaResult:
+    """A repaired response plus the fields that are still missing or invalid."""
+
+    value: dict[str, object]
+    invalid: list[str] = field(default_factory=list)
+    repairs: list[str] = field(default_factory=list)
+
+
+class _Invalid(Exception):
+    pass
+
+
+def _as_bool(value: object) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in {"true", "yes", "1"}:
+            return True
+        if lowered in {"false", "no", "0"}:
+            return False
+    raise _Invalid
+
+
+def _as_text(value: object) -> str:
+    if not isinstance(value, str):
+        raise _Invalid
+    return value.strip()
+
+
+def _noun(value: object) -> str:
+    text = _as_text(value)
+    if text.upper() == OMITTED:
+        return OMITTED
+    if not _HAN_RE.match(text):
+        raise _Invalid
+    return text
+
+
+def _classifier_pinyin(value: object) -> str:
+    text = _as_text(value).lower()
+    # Tone marks are dropped so 'tiáo' and 'tiao' compare equal downstream.
+    text = "".join(char for char in unicodedata.normalize("NFD", text) if not unicodedata.combining(char))
+    if text.upper() == NOT_APPLICABLE:
+        return NOT_APPLICABLE
+    if not _PINYIN_RE.match(text):
+        raise _Invalid
+    return text
+
+
+def _classifier_zh(value: object) -> str:
+    text = _as_text(value)
+    if text.upper() == NOT_APPLICABLE:
+        return NOT_APPLICABLE
+    if not _HAN_RE.match(text) or len(text) > 2:
+        raise _Invalid
+    return text
+
+
+def _classifier_type(value: object) -> str:
+    text = _as_text(value).capitalize()
+    if text not in {"General", "Specific"}:
+        raise _Invalid
+    return text
+
+
+def _flag_reason(value: object) -> str:
+    text = _as_text(value).lower().replace(" ", "_").replace("-", "_")
+    if text and text not in FLAG_REASONS:
+        raise _Invalid
+    return text
+
+
+# Built once; each validator returns the normalised value or raises ``_Invalid``.
+VALIDATORS: dict[str, Callable[[object], object]] = {
+    "identified_noun": _noun,
+    "conventional_classifier": _classifier_pinyin,
+    "conventional_classifier_zh": _classifier_zh,
+    "classifier_type": _classifier_type,
+    "overuse_of_ge": _as_bool,
+    "rationale": _as_text,
+    "flag_for_review": _as_bool,
+    "flag_reason": _flag_reason,
+}
+
+
+def extract_payload(text: str) -> tuple[dict[str, object], list[str]]:
+    """Pull the response object out of raw model text.
+
+    Strips code fences and trailing prose, and unwraps a list holding exactly one object
+    with response keys. Raises ``ValueError`` (``json.JSONDecodeError``) when no object is found.
+    """
+    repairs: list[str] = []
+    fenced = _FENCE_RE.match(text)
+    if fenced:
+        text = fenced.group(1)
+        repairs.append("code_fence")
+    try:
+        data = json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        scanner = JsonObjectScanner()
+        candidate = scanner.feed(text)
+        if candidate is None:
+            raise
+        data = json.loads(candidate, strict=False)
+        repairs.append("surrounding_text")
+    if isinstance(data, list):
+        matches = [item for item in data if isinstance(item, dict) and set(item) & set(RESPONSE_KEYS)]
+        if len(matches) != 1:
+            raise ValueError(f"Expected one response object, got a list of {len(data)}")
+        data = matches[0]
+        repairs.append("single_item_list")
+    if not isinstance(data, dict):
+        raise ValueError("Response is not a JSON object")
+    return data, repairs
+
+
+def validate_response(
+    data: dict[str, object],
+    skip: frozenset[str] = frozenset(),
+) -> SchemaResult:
+    """Normalise every response key; keys in ``skip`` are supplied elsewhere and not checked."""
+    value: dict[str, object] = dict(data)
+    invalid: list[str] = []
+    for key in RESPONSE_KEYS:
+        if key in skip:
+            continue
+        if key not in data or data[key] is None:
+            if key in FIELD_DEFAULTS:
+                value[key] = FIELD_DEFAULTS[key]
+            else:
+                invalid.append(key)
+            continue
+        try:
+            value[key] = VALIDATORS[key](data[key])
+        except _Invalid:
+            invalid.append(key)
+    if value.get("identified_noun") == OMITTED:
+        for key in ("conventional_classifier", "conventional_classifier_zh"):
+            value[key] = NOT_APPLICABLE
+            if key in invalid:
+                invalid.remove(key)
+    if value.get("flag_for_review") is False:
+        value["flag_reason"] = ""
+        if "flag_reason" in invalid:
+            invalid.remove("flag_reason")
+    return SchemaResult(value, invalid)
+
+
+def parse_response(text: str, skip: frozenset[str] = frozenset()) -> SchemaResult:
+    data, repairs = extract_payload(text)
+    result = validate_response(data, skip)
+    result.repairs = repairs
+    return result
+
+
+def followup_fields(invalid: list[str], fixed: frozenset[str] = frozenset()) -> list[str]:
+    """The fields to re-ask: ``invalid`` plus, for a re-asked noun, the fields that follow from it."""
+    fields = set(invalid)
+    if "identified_noun" in fields:
+        fields |= NOUN_DEPENDENT_FIELDS
+    return [key for key in RESPONSE_KEYS if key in fields and key not in fixed]
+
+
+def build_followup_messages(
+    messages: list[dict[str, object]],
+    accepted: dict[str, object],
+    fields: list[str],
+) -> list[dict[str, object]]:
+    """The original system turn plus a short turn asking for only ``fields`` of the same row.
+
+    The row context is repeated with the ``accepted`` values as fixed context; the rejected
+    answer is not resent. The system turn is unchanged, so a cached prefix still applies.
+    """
+    row_context = str(messages[-1]["content"]).rstrip()
+    kept = {key: accepted[key] for key in RESPONSE_KEYS if key in accepted and key not in fields}
+    lines = [f"- {name}: {FIELD_HINTS.get(name, 'a value')}" for name in fields]
+    request = row_context + "\n\n"
+    if kept:
+        request += "Already decided for this phrase (keep these):\n" + json.dumps(kept, ensure_ascii=False) + "\n\n"
+    request += (
+        "Give only these fields, consistent with the decided values:\n"
+        + "\n".join(lines)
+        + "\nReturn ONLY a JSON object with exactly these keys: "
+        + ", ".join(fields)
+        + "."
+    )
+    return [*messages[:-1], {"role": "user", "content": request}]
+
+
+def merge_followup(result: SchemaResult, text: Optional[str], fields: Optional[list[str]] = None) -> SchemaResult:
+    """Replace ``fields`` (default: the still-invalid ones) of ``result`` from a follow-up answer.
+
+    Requested fields the follow-up leaves out are invalid again rather than kept from the
+    first answer.
+    """
+    if not text:
+        return result
+    try:
+        data, _ = extract_payload(text)
+    except ValueError:
+        return result
+    fields = list(result.invalid if fields is None else fields)
+    merged = {key: value for key, value in result.value.items() if key not in fields}
+    merged.update({key: data[key] for key in fields if key in data})
+    skip = frozenset(key for key in RESPONSE_KEYS if key not in fields)
+    updated = validate_response(merged, skip)
+    updated.repairs = result.repairs + ["followup"]
+    return updated
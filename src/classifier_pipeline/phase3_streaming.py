@@ -0,0 +1,123 @@
+﻿from __future__ import annotations
+
+import json
+import time
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+
+class JsonObjectScanner:
+    """Incrementally tracks the first top-level JSON object in streamed text.
+
+    ``feed`` returns the object's text as soon as its closing brace arrives (braces inside
+    strings are ignored), so callers can stop reading the stream right there.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self._position = 0
+        self._start: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> Optional[str]:
+        self.text += chunk
+        text = self.text
+        for index in range(self._position, len(text)):
+            char = text[index]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"' and self._start is not None:
+                self._in_string = True
+            elif char == "{":
+                if self._start is None:
+                    self._start = index
+                self._depth += 1
+            elif char == "}" and self._start is not None:
+                self._depth -= 1
+                if self._depth == 0:
+                    start, self._start = self._start, None
+                    self._position = index + 1
+                    return text[start : index + 1]
+        self._position = len(text)
+        return None
+
+
+def iter_sse_data(lines: Iterable[str]) -> Iterator[str]:
+    """Yield the payload of each ``data:`` line of a server-sent event stream."""
+    for line in lines:
+        if not line or line.startswith(":"):
+            continue
+        if line.startswith("data:"):
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            yield data
+
+
+@dataclass
+class StreamResult:
+    content: str
+    ttft_seconds: Optional[float]
+    total_seconds: float
+    completed_early: bool
+    usage: Optional[dict[str, object]] = None
+
+
+class StreamError(RuntimeError):
+    """The provider reported an error inside the event stream, or sent a malformed event."""
+
+
+def consume_chat_stream(lines: Iterable[str], started: float, wait_for_usage: bool = False) -> StreamResult:
+    """Accumulate streamed chat-completion deltas until the JSON answer is complete.
+
+    Stops at the first complete top-level object that parses as JSON; otherwise returns
+    everything received once the stream ends. With ``wait_for_usage`` the rest of the stream
+    is read (and its content ignored) until the ``usage`` chunk the provider sends last.
+    ``started`` is a ``time.monotonic`` value; ``total_seconds`` is the time to the answer.
+    """
+    scanner = JsonObjectScanner()
+    ttft: Optional[float] = None
+    usage: Optional[dict[str, object]] = None
+    answer: Optional[str] = None
+    answered = 0.0
+    for data in iter_sse_data(lines):
+        try:
+            event = json.loads(data)
+        except json.JSONDecodeError as exc:
+            raise StreamError(f"Malformed stream event: {data[:80]!r}") from exc
+        if "error" in event:
+            raise StreamError(str(event["error"]))
+        if event.get("usage"):
+            usage = event["usage"]
+            if answer is not None:
+                return StreamResult(answer, ttft, answered, True, usage)
+        choices = event.get("choices") or []
+        if answer is not None or not choices:
+            continue
+        delta = choices[0].get("delta") or {}
+        content = delta.get("content") or ""
+        if ttft is None and (content or delta.get("reasoning")):
+            ttft = time.monotonic() - started
+        if not content:
+            continue
+        candidate = scanner.feed(content)
+        if candidate is None:
+            continue
+        try:
+            json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            continue
+        answer, answered = candidate, time.monotonic() - started
+        if not wait_for_usage or usage is not None:
+            return StreamResult(answer, ttft, answered, True, usage)
+    if answer is not None:
+        return StreamResult(answer, ttft, answered, True, usage)
+    return StreamResult(scanner.text, ttft, time.monotonic() - started, False, usage)
@@ -0,0 +1,388 @@
+﻿from __future__ import annotations
+
+import ast
+import hashlib
+import importlib.util
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Sequence
+
+DEFAULT_CACHE_DIR = Path("reports/.pipeline_cache")
+
+STATUS_CACHED = "cached"
+STATUS_RAN = "ran"
+STATUS_STALE = "stale"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+
+
+@dataclass
+class Stage:
+    """One pipeline step.
+
+    ``run`` must (re)create every path in ``outputs``. The cache key covers the stage name,
+    ``params``, the content of every file in ``inputs``, the source of every module in
+    ``code_modules`` and of the package modules they import (see ``module_closure``), and
+    any ``extra`` strings (e.g. the prompt text).
+    """
+
+    name: str
+    run: Callable[[], object]
+    outputs: list[Path]
+    inputs: list[Path] = field(default_factory=list)
+    params: dict[str, object] = field(default_factory=dict)
+    deps: list[str] = field(default_factory=list)
+    code_modules: list[str] = field(default_factory=list)
+    extra: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class StageResult:
+    name: str
+    status: str
+    key: str = ""
+    seconds: float = 0.0
+    error: str = ""
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _module_source(module_name: str) -> Path:
+    spec = importlib.util.find_spec(module_name)
+    if spec is None or not spec.origin or not Path(spec.origin).is_file():
+        raise ValueError(f"Cannot locate source for module {module_name}")
+    return Path(spec.origin)
+
+
+def module_digest(module_name: str) -> str:
+    """Hash of a module's source file, found without importing it."""
+    return file_digest(_module_source(module_name))
+
+
+def _package_imports(module_name: str, package: str) -> set[str]:
+    # Every import in the file counts, including the lazy ones inside functions.
+    tree = ast.parse(_module_source(module_name).read_text(encoding="utf-8-sig"))
+    found: set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            found.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            found.add(node.module)
+            if node.module == package:  # from classifier_pipeline import instrumentation
+                found.update(f"{package}.{alias.name}" for alias in node.names)
+    return {
+        name
+        for name in found
+        if name.startswith(package + ".") and importlib.util.find_spec(name) is not None
+    }
+
+
+def module_closure(module_names: Iterable[str]) -> list[str]:
+    """``module_names`` plus every module of their package they import, transitively."""
+    pending = list(module_names)
+    seen: set[str] = set()
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        package = name.split(".")[0]
+        pending.extend(_package_imports(name, package) - seen)
+    return sorted(seen)
+
+
+def stage_key(stage: Stage) -> str:
+    digest = hashlib.sha256()
+    parts: dict[str, object] = {
+        "name": stage.name,
+        "params": stage.params,
+        "inputs": {str(path): file_digest(path) for path in stage.inputs},
+        "code": {name: module_digest(name) for name in module_closure(stage.code_modules)},
+        "extra": {name: hashlib.sha256(text.encode("utf-8")).hexdigest() for name, text in stage.extra.items()},
+    }
+    digest.update(json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class StageCache:
+    """Per-stage manifests recording the key and output digests of the last successful run."""
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR) -> None:
+        self.cache_dir = cache_dir
+
+    def _manifest_path(self, stage: Stage) -> Path:
+        return self.cache_dir / f"{stage.name}.json"
+
+    def is_fresh(self, stage: Stage, key: str) -> bool:
+        path = self._manifest_path(stage)
+        if not path.exists():
+            return False
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        if manifest.get("key") != key:
+            return False
+        recorded = manifest.get("outputs", {})
+        for output in stage.outputs:
+            if not output.exists() or recorded.get(str(output)) != file_digest(output):
+                return False
+        return True
+
+    def record(self, stage: Stage, key: str, seconds: float) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {
+            "stage": stage.name,
+            "key": key,
+            "params": stage.params,
+            "outputs": {str(output): file_digest(output) for output in stage.outputs if output.exists()},
+            "seconds": round(seconds, 3),
+            "completed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self._manifest_path(stage).write_text(
+            json.dumps(manifest, indent=2, default=str, ensure_ascii=False), encoding="utf-8"
+        )
+
+
+def select_stages(stages: Sequence[Stage], targets: Optional[Iterable[str]] = None) -> list[Stage]:
+    """The targets plus everything they depend on, in topological order."""
+    by_name = {stage.name: stage for stage in stages}
+    wanted = list(targets) if targets else list(by_name)
+    unknown = [name for name in wanted if name not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(unknown)}")
+    ordered: list[Stage] = []
+    visiting: set[str] = set()
+    done: set[str] = set()
+
+    def _visit(name: str) -> None:
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle at stage {name}")
+        visiting.add(name)
+        for dep in by_name[name].deps:
+            if dep not in by_name:
+                raise ValueError(f"Stage {name} depends on unknown stage {dep}")
+            _visit(dep)
+        visiting.discard(name)
+        done.add(name)
+        ordered.append(by_name[name])
+
+    for name in wanted:
+        _visit(name)
+    return ordered
+
+
+def run_pipeline(
+    stages: Sequence[Stage],
+    targets: Optional[Iterable[str]] = None,
+    cache: Optional[StageCache] = None,
+    force: Iterable[str] = (),
+    max_workers: int = 2,
+    dry_run: bool = False,
+) -> list[StageResult]:
+    """Run stale stages, each as soon as its dependencies finish; fresh stages are skipped.
+
+    Keys are computed when a stage becomes ready, so a stage whose upstream output changed
+    is re-run even if its own parameters did not. ``force`` re-runs the named stages
+    regardless of the cache. With ``dry_run`` nothing runs; stages whose inputs are not
+    built yet are reported stale.
+    """
+    cache = cache or StageCache()
+    selected = select_stages(stages, targets)
+    forced = set(force)
+    results: dict[str, StageResult] = {}
+
+    if dry_run:
+        for stage in selected:
+            upstream_stale = any(results[dep].status != STATUS_CACHED for dep in stage.deps)
+            if upstream_stale or stage.name in forced or any(not path.exists() for path in stage.inputs):
+                results[stage.name] = StageResult(stage.name, STATUS_STALE)
+                continue
+            key = stage_key(stage)
+            status = STATUS_CACHED if cache.is_fresh(stage, key) else STATUS_STALE
+            results[stage.name] = StageResult(stage.name, status, key)
+        return [results[stage.name] for stage in selected]
+
+    def _execute(stage: Stage, key: str) -> StageResult:
+        started = time.monotonic()
+        stage.run()
+        seconds = time.monotonic() - started
+        cache.record(stage, key, seconds)
+        return StageResult(stage.name, STATUS_RAN, key, seconds)
+
+    remaining = list(selected)
+    running: dict[Future, Stage] = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        while remaining or running:
+            for stage in list(remaining):
+                dep_results = [results.get(dep) for dep in stage.deps]
+                if any(result is None for result in dep_results):
+                    continue
+                remaining.remove(stage)
+                if any(result.status in {STATUS_FAILED, STATUS_SKIPPED} for result in dep_results):
+                    results[stage.name] = StageResult(stage.name, STATUS_SKIPPED, error="upstream stage failed")
+                    continue
+                key = stage_key(stage)
+                if stage.name not in forced and cache.is_fresh(stage, key):
+                    results[stage.name] = StageResult(stage.name, STATUS_CACHED, key)
+                    continue
+                running[pool.submit(_execute, stage, key)] = stage
+            if not running:
+                continue
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    results[stage.name] = StageResult(stage.name, STATUS_FAILED, error=f"{type(error).__name__}: {error}")
+                else:
+                    results[stage.name] = future.result()
+    return [results[stage.name] for stage in selected]
+
+
+def default_stages(
+    classifiers: Sequence[str],
+    sample_mode: str = "random",
+    sample_total: int = 20,
+    sample_seed: int = 42,
+    annotate_limit: int = 20,
+    db_name: Optional[str] = None,
+    phase1_dir: Path = Path("reports/phase1"),
+    phase2_path: Path = Path("reports/phase2/phase2_extraction.csv"),
+    rejected_path: Path = Path("reports/phase2/rejected_samples.csv"),
+    sample_path: Path = Path("reports/phase3/phase3_pipeline_sample.csv"),
+    results_path: Path = Path("reports/phase3/phase3_pipeline_results.csv"),
+    cubes_path: Path = Path("website/data/profile_cubes.json"),
+    env_path: Path = Path(".env"),
+) -> list[Stage]:
+    """Phase 1 inventory and Phase 2 extraction (independent) -> Phase 3 sample -> annotation.
+
+    The website profile cubes are built from the Phase 2 output joined to the annotation
+    results, so they are rebuilt whenever either changes.
+
+    Stage code is imported only when a stage actually runs.
+    """
+    from classifier_pipeline.prompts import SYSTEM_INSTRUCTION
+
+    classifiers = list(classifiers)
+
+    def _phase1() -> None:
+        from classifier_pipeline.phase1_inventory import DEFAULT_LANGUAGE_FILTER, run_phase1_inventory_db
+
+        run_phase1_inventory_db(
+            output_dir=str(phase1_dir),
+            classifiers=classifiers,
+            languages=list(DEFAULT_LANGUAGE_FILTER),
+            db_name=db_name,
+        )
+
+    def _phase2() -> None:
+        from classifier_pipeline.phase2_extraction import write_phase2_csv
+
+        phase2_path.parent.mkdir(parents=True, exist_ok=True)
+        write_phase2_csv(
+            output_path=str(phase2_path),
+            classifiers=classifiers,
+            rejected_output_path=str(rejected_path),
+            db_name=db_name,
+        )
+
+    def _sample() -> None:
+        from classifier_pipeline.phase3_sampling import (
+            read_rows,
+            select_focus_samples,
+            select_random_samples,
+            write_rows,
+        )
+
+        rows = read_rows(phase2_path)
+        if sample_mode == "focus":
+            sample = select_focus_samples(rows, total=sample_total, flower_min=5, flower_max=10, seed=sample_seed)
+        else:
+            sample = select_random_samples(rows, total=sample_total, seed=sample_seed)
+        write_rows(sample_path, sample)
+
+    def _cubes() -> None:
+        from classifier_pipeline.cubes import build_cubes, write_cubes
+        from classifier_pipeline.phase3_sampling import iter_rows
+
+        write_cubes(
+            cubes_path,
+            build_cubes(iter_rows(phase2_path), iter_rows(results_path)),
+            {"phase2": phase2_path.as_posix(), "phase3": results_path.as_posix()},
+        )
+
+    def _annotate() -> None:
+        from classifier_pipeline.phase3_pilot import run_pilot
+
+        run_pilot(sample_path, results_path, limit=annotate_limit, env_path=env_path)
+
+    db_params = {"db_name": db_name, "classifiers": classifiers}
+    return [
+        Stage(
+            name="phase1_inventory",
+            run=_phase1,
+            outputs=[
+                phase1_dir / "phase1_corpus_stats.csv",
+                phase1_dir / "phase1_corpus_stats.json",
+                phase1_dir / "phase1_summary.md",
+            ],
+            params=db_params,
+            code_modules=["classifier_pipeline.phase1_inventory"],
+        ),
+        Stage(
+            name="phase2_extraction",
+            run=_phase2,
+            outputs=[phase2_path, rejected_path],
+            params=db_params,
+            code_modules=["classifier_pipeline.phase2_extraction"],
+        ),
+        Stage(
+            name="phase3_sample",
+            run=_sample,
+            outputs=[sample_path],
+            inputs=[phase2_path],
+            params={"mode": sample_mode, "total": sample_total, "seed": sample_seed},
+            deps=["phase2_extraction"],
+            code_modules=["classifier_pipeline.phase3_sampling"],
+        ),
+        Stage(
+            name="phase3_annotate",
+            run=_annotate,
+            outputs=[results_path],
+            inputs=[sample_path],
+            params={"limit": annotate_limit, "provider_env": _provider_fingerprint(env_path)},
+            deps=["phase3_sample"],
+            code_modules=["classifier_pipeline.phase3_pilot"],
+            extra={"system_instruction": SYSTEM_INSTRUCTION},
+        ),
+        Stage(
+            name="profile_cubes",
+            run=_cubes,
+            outputs=[cubes_path],
+            inputs=[phase2_path, results_path],
+            deps=["phase2_extraction", "phase3_annotate"],
+            code_modules=["classifier_pipeline.cubes", "classifier_pipeline.phase3_sampling"],
+        ),
+    ]
+
+
+# Settings that change annotation output; secrets are deliberately left out of the key.
+_PROVIDER_SETTINGS = ("LLM_PROVIDER", "OPENROUTER_MODEL", "LM_STUDIO_MODEL", "OPENROUTER_BASE_URL", "LM_STUDIO_BASE_URL")
+
+
+def _provider_fingerprint(env_path: Path) -> dict[str, str]:
+    import os
+
+    from classifier_pipeline.phase3_pilot import load_env
+
+    load_env(env_path)
+    return {name: os.environ.get(name, "") for name in _PROVIDER_SETTINGS}
@@ -1,5 +1,7 @@
 ﻿from __future__ import annotations
 
+from classifier_pipeline.phase3_cache import CACHE_CONTROL
+
 SYSTEM_INSTRUCTION = """You are an expert linguist specializing in Mandarin Child Language Acquisition. Your task is to analyze the classifier usage in the provided utterance.
 
 Analysis Rules:
@@ -74,13 +76,24 @@ Classifier Semantic Class: {specific_semantic_class}
 """
 
 
+def system_message(cache_control: bool = False) -> dict[str, object]:
+    """The static system turn; with ``cache_control`` it is marked as a cacheable prefix."""
+    if not cache_control:
+        return {"role": "system", "content": SYSTEM_INSTRUCTION}
+    return {
+        "role": "system",
+        "content": [{"type": "text", "text": SYSTEM_INSTRUCTION, "cache_control": dict(CACHE_CONTROL)}],
+    }
+
+
 def build_messages(
     utterance: str,
     classifier_token: str,
     determiner_or_number: str,
     pos_tags: str,
     specific_semantic_class: str = "",
-) -> list[dict[str, str]]:
+    cache_control: bool = False,
+) -> list[dict[str, object]]:
     user_content = USER_TEMPLATE.format(
         utterance=utterance,
         pos_tags=pos_tags or "",
@@ -89,6 +102,6 @@ def build_messages(
         specific_semantic_class=specific_semantic_class or "",
     )
     return [
-        {"role": "system", "content": SYSTEM_INSTRUCTION},
+        system_message(cache_control),
         {"role": "user", "content": user_content},
     ]
@@ -0,0 +1,88 @@
+﻿import gzip
+import json
+
+import pytest
+
+from classifier_pipeline.artifact_io import (
+    CsvArtifactWriter,
+    artifact_name,
+    manifest_path,
+    part_paths,
+    resolve_artifact,
+)
+from classifier_pipeline.phase3_pilot import _read_rows
+from classifier_pipeline.phase3_sampling import iter_rows, read_rows, write_rows
+
+FIELDS = ["utterance_id", "Utterance", "Classifier"]
+
+
+def _rows(n: int) -> list[dict[str, str]]:
+    # Quoted newlines and commas must survive compression and part boundaries.
+    return [{"utterance_id": str(i), "Utterance": f"一 个\n书, {i}", "Classifier": "个"} for i in range(n)]
+
+
+def test_gzip_output_is_read_through_the_plain_path(tmp_path):
+    rows = _rows(50)
+    write_rows(tmp_path / "sample.csv.gz", rows)
+
+    with gzip.open(tmp_path / "sample.csv.gz", "rt", encoding="utf-8", newline="") as handle:
+        assert handle.readline().strip() == ",".join(FIELDS)
+    assert resolve_artifact(tmp_path / "sample.csv") == tmp_path / "sample.csv.gz"
+    assert read_rows(tmp_path / "sample.csv") == rows
+    assert artifact_name(tmp_path / "sample.csv.gz") == "sample"
+
+
+def test_chunked_parts_have_headers_a_manifest_and_read_part_by_part(tmp_path, monkeypatch):
+    rows = _rows(20000)
+    path = tmp_path / "phase2.csv.gz"
+    with CsvArtifactWriter(path, FIELDS, max_part_bytes=4096) as writer:
+        writer.writerows([row[field] for field in FIELDS] for row in rows)
+
+    manifest = json.loads(manifest_path(path).read_text(encoding="utf-8"))
+    parts = part_paths(tmp_path / "phase2.csv")
+    assert len(parts) > 1 and [part.name for part in parts][0] == "phase2.part-00000.csv.gz"
+    assert manifest["rows"] == 20000 == sum(part["rows"] for part in manifest["parts"])
+    assert manifest["compression"] == "gzip"
+
+    assert list(iter_rows(tmp_path / "phase2.csv")) == rows
+    monkeypatch.setattr("os.cpu_count", lambda: 2)
+    assert read_rows(tmp_path / "phase2.csv", workers=2) == rows
+    assert _read_rows(tmp_path / "phase2.csv", limit=15000) == rows[:15000]
+
+
+def test_rewriting_removes_only_shadowing_variants(tmp_path, caplog):
+    with CsvArtifactWriter(tmp_path / "out.csv", FIELDS, max_part_bytes=1024) as writer:
+        writer.writerows([[str(i), "x" * 50, "个"] for i in range(200)])
+    old_parts = part_paths(tmp_path / "out.csv")
+    write_rows(tmp_path / "out.csv", _rows(1))
+
+    write_rows(tmp_path / "out.csv.gz", _rows(3))
+
+    # The plain file would be read before the .gz and goes; the manifest comes after it and stays.
+    assert not (tmp_path / "out.csv").exists() and "would be read instead" in caplog.text
+    assert manifest_path(tmp_path / "out.csv").exists() and all(part.exists() for part in old_parts)
+    assert read_rows(tmp_path / "out.csv") == _rows(3)
+
+    with CsvArtifactWriter(tmp_path / "out.csv", FIELDS, max_part_bytes=1024) as writer:
+        writer.writerows([[str(i), "y", "个"] for i in range(5)])
+    assert not (tmp_path / "out.csv.gz").exists()
+    assert part_paths(tmp_path / "out.csv") == old_parts[:1] and not any(part.exists() for part in old_parts[1:])
+
+
+def test_failed_write_leaves_the_previous_artifact(tmp_path):
+    write_rows(tmp_path / "out.csv", _rows(3))
+
+    with pytest.raises(RuntimeError):
+        with CsvArtifactWriter(tmp_path / "out.csv", FIELDS) as writer:
+            writer.writerows([[str(i), "z", "个"] for i in range(10)])
+            raise RuntimeError("query failed")
+
+    assert read_rows(tmp_path / "out.csv") == _rows(3)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["out.csv"]
+
+
+def test_zstd_round_trip(tmp_path):
+    pytest.importorskip("zstandard")
+    write_rows(tmp_path / "sample.csv.zst", _rows(20))
+
+    assert read_rows(tmp_path / "sample.csv") == _rows(20)
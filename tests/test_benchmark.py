@@ -0,0 +1,44 @@
+﻿import csv
+
+from classifier_pipeline.benchmark import (
+    CORPORA,
+    SQLiteConnection,
+    append_results,
+    build_fixture,
+    load_results,
+    previous_result,
+    run_case,
+    translate_query,
+)
+from classifier_pipeline.childes_db import fetch_transcript_metadata
+from classifier_pipeline.phase2_extraction import OUTPUT_HEADERS
+
+
+def test_translate_query_rewrites_mysql_dialect():
+    query = "SELECT GROUP_CONCAT(DISTINCT language ORDER BY language SEPARATOR '; ') FROM t WHERE a LIKE %s"
+
+    assert translate_query(query) == "SELECT group_concat_sorted(language, '; ') FROM t WHERE a LIKE ?"
+
+
+def test_fixture_runs_extraction_and_phase1_queries(tmp_path):
+    fixture = build_fixture(tmp_path / "fixture.sqlite", tokens=3000, seed=1)
+
+    with SQLiteConnection(fixture) as conn:
+        metadata = fetch_transcript_metadata(conn, ["zho", "yue"])
+    assert metadata and all(row["n_transcripts"] >= 1 for row in metadata)
+    assert all(row["languages"] == CORPORA[row["corpus"]][1] for row in metadata)
+
+    result = run_case("phase2_extraction", fixture, 3000, tmp_path / "out")
+    with (tmp_path / "out" / "phase2_3000.csv").open(encoding="utf-8", newline="") as handle:
+        rows = list(csv.DictReader(handle))
+    assert result.rows == len(rows) > 0
+    assert list(rows[0]) == OUTPUT_HEADERS
+    # Only Mandarin rows from the Chinese collection, with a number/determiner before the classifier.
+    assert {row["Collection_Type"] for row in rows} == {"Chinese"}
+    assert 0 <= result.first_row_seconds <= result.seconds
+
+    append_results(tmp_path / "results.jsonl", [result], "abc123")
+    history = load_results(tmp_path / "results.jsonl")
+    assert history[0]["git"] == "abc123" and history[0]["rows"] == result.rows
+    assert previous_result(history, "phase2_extraction", 3000, "def456") == history[0]
+    assert previous_result(history, "phase2_extraction", 3000, "abc123") is None
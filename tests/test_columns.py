@@ -0,0 +1,23 @@
+﻿from classifier_pipeline.columns import ANNOTATED_HEADERS, compute_age_band, compute_age_fields, enrich_columns
+
+
+def test_enrich_columns_matches_per_row_computation():
+    rows = [
+        {"Age": "1156.625", "Determiner/Numbers": "这", "Classifier": "只"},
+        {"Age": "", "Determiner/Numbers": "三", "Classifier": "个"},
+        {"Age": "abc", "Determiner/Numbers": "这", "Classifier": "只", "determiner_type": "kept"},
+        {"Age": " 3000 ", "Determiner/Numbers": "第一", "Classifier": "未知"},
+        {"Age": "nan", "Determiner/Numbers": "这", "Classifier": "只"},
+    ]
+    expected = [compute_age_fields(row) for row in rows]
+
+    assert enrich_columns(rows) is rows
+    assert rows == expected
+    assert [row["age_band"] for row in rows] == ["3-4 yrs", "unknown", "unknown", "7+ yrs", "unknown"]
+    assert rows[4]["age_available"] is False
+    assert rows[2]["determiner_type"] == "kept"
+    assert compute_age_band("inf") == compute_age_band("-inf") == "unknown"
+
+
+def test_annotated_headers_include_age_band():
+    assert ANNOTATED_HEADERS.index("age_available") + 1 == ANNOTATED_HEADERS.index("age_band")
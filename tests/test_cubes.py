@@ -0,0 +1,79 @@
+﻿import json
+
+import pytest
+
+from classifier_pipeline.cubes import build_cubes, load_cubes, rollup, write_cubes
+
+
+def _row(utterance_id, classifier, determiner, age, role="Target_Child", utterance="这 个", file_name="Mandarin/Zhou1/01.xml"):
+    return {
+        "File Name": file_name,
+        "Speaker_Role": role,
+        "Age": age,
+        "Utterance": utterance,
+        "Determiner/Numbers": determiner,
+        "Classifier": classifier,
+        "utterance_id": str(utterance_id),
+        "classifier_token_order": "2",
+    }
+
+
+def test_build_cubes_profiles_rows_and_joins_annotations(tmp_path):
+    rows = [
+        _row(1, "个", "这", "1156.625"),
+        _row(2, "个", "这", "1156.625", role="Mother"),
+        _row(3, "只", "一", "", utterance="一 只 狗", file_name="Mandarin/Tong/02.xml"),
+        {**_row(3, "个", "两", "800", utterance="一 只 狗"), "classifier_token_order": "5"},
+    ]
+    annotations = [
+        {"utterance_id": "1", "classifier_token_order": "2", "overuse_of_ge": "False", "identified_noun": "OMITTED"},
+        {"utterance_id": "3", "classifier_token_order": "2", "overuse_of_ge": "False", "identified_noun": "狗"},
+    ]
+
+    cubes = build_cubes(rows, annotations)
+    summary = cubes["summary"]
+    profile = cubes["cubes"]["profile"]
+
+    assert summary["rows"] == 4
+    assert summary["annotated_rows"] == 2
+    assert summary["corpora"] == 2 and summary["classifiers"] == 2
+    assert summary["missing_age"] == 1
+    assert summary["age_min"] == 2.2 and summary["age_max"] == 3.2 and summary["age_median"] == 3.2
+    assert summary["duplicate_rows"] == 1
+    assert summary["top_triple"]["Utterance"] == "这 个" and summary["top_triple_count"] == 2
+    assert summary["multi_classifier_rows"] == 2 and summary["multi_classifier_utterances"] == 1
+    assert summary["omitted_rows"] == 1
+
+    assert rollup(profile, ["Classifier"]) == {("个",): 3, ("只",): 1}
+    assert rollup(profile, ["age_band"])[("3-4 yrs",)] == 2
+    assert rollup(profile, ["corpus", "overuse_of_ge"])[("Zhou1", "")] == 2
+    assert rollup(cubes["cubes"]["nouns"], ["identified_noun"]) == {("OMITTED",): 1, ("狗",): 1}
+    assert rollup(cubes["cubes"]["determiners"], ["determiner_type"])[("numeral",)] == 2
+
+    path = tmp_path / "cubes.json"
+    write_cubes(path, cubes, {"phase2": "phase2.csv"})
+    loaded = load_cubes(path)
+    assert loaded["cubes"] == cubes["cubes"] and loaded["sources"] == {"phase2": "phase2.csv"}
+
+    path.write_text('{"version": 0}', encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_cubes(path)
+
+
+def test_written_cubes_load_as_frames_the_way_the_profile_page_does(tmp_path):
+    path = tmp_path / "profile_cubes.json"
+    write_cubes(path, build_cubes([_row(1, "个", "这", "1156.625"), _row(2, "只", "一", "")]))
+    cubes = json.loads(path.read_text(encoding="utf-8"))
+
+    for name, cube in cubes["cubes"].items():
+        # website/profiling.qmd: pd.DataFrame(cubes["cubes"][name]) -> one column per key
+        assert "count" in cube and len({len(values) for values in cube.values()}) == 1, name
+
+    pd = pytest.importorskip("pandas")
+    profile = pd.DataFrame(cubes["cubes"]["profile"])
+    assert profile.groupby("Classifier")["count"].sum().to_dict() == {"个": 1, "只": 1}
+
+
+def test_non_finite_ages_count_as_missing():
+    summary = build_cubes([_row(1, "个", "这", "nan"), _row(2, "个", "这", "inf"), _row(3, "个", "这", "800")])["summary"]
+    assert summary["missing_age"] == 2 and summary["age_max"] == 2.2
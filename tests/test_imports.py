@@ -0,0 +1,77 @@
+﻿import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+DB = {"pymysql"}
+HTTP = {"requests", "urllib3"}
+TALKBANK = {"bs4", "lxml", "pylangacq"}
+
+# Heavy dependencies each entry point must not load just to start up (``--help``).
+SCRIPT_FORBIDDEN = {
+    "benchmark_phase2.py": DB | HTTP | TALKBANK,
+    "build_cubes.py": DB | HTTP | TALKBANK,
+    "phase1_inventory.py": DB | HTTP | TALKBANK,
+    "phase2_extraction.py": DB | HTTP | TALKBANK,
+    "phase3_compare.py": DB | HTTP | TALKBANK,
+    "phase3_contexts.py": DB | HTTP | TALKBANK,
+    "phase3_focus_sample.py": DB | HTTP | TALKBANK,
+    "phase3_lexicon.py": DB | HTTP | TALKBANK,
+    "phase3_review_sample.py": DB | HTTP | TALKBANK,
+    "phase3_pilot.py": DB | TALKBANK,
+    "phase3_daemon.py": DB | TALKBANK,
+    "run_pipeline.py": DB | HTTP | TALKBANK,
+}
+
+# Cold-start budget (ms) for the package's imports, measured at 10-70 ms (125 ms for the
+# daemon, which loads requests). Wall-clock timings are noisy on shared machines, so the
+# budget is only checked when CHECK_STARTUP_BUDGET is set; the backend checks always run.
+STARTUP_BUDGET_MS = 500
+STARTUP_BUDGET_OVERRIDES_MS = {"phase3_daemon.py": 1500, "phase3_pilot.py": 1500}
+CHECK_STARTUP_BUDGET = bool(os.environ.get("CHECK_STARTUP_BUDGET"))
+
+
+def _imported_modules(args: list[str]) -> dict[str, int]:
+    """Top-level package -> cumulative import time (us) from ``python -X importtime``."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        timeout=60,
+    )
+    assert completed.returncode == 0, completed.stderr[-2000:]
+    modules: dict[str, int] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        top = name.strip().split(".")[0]
+        modules[top] = max(modules.get(top, 0), int(cumulative.strip()))
+    return modules
+
+
+@pytest.mark.parametrize("script", sorted(SCRIPT_FORBIDDEN))
+def test_script_startup_does_not_load_unused_backends(script):
+    modules = _imported_modules([str(ROOT / "scripts" / script), "--help"])
+    assert "classifier_pipeline" in modules
+    assert not SCRIPT_FORBIDDEN[script] & set(modules)
+    if CHECK_STARTUP_BUDGET:
+        budget_ms = STARTUP_BUDGET_OVERRIDES_MS.get(script, STARTUP_BUDGET_MS)
+        assert modules["classifier_pipeline"] / 1000 < budget_ms, f"{script} imports took {modules['classifier_pipeline'] / 1000:.0f} ms"
+
+
+def test_light_modules_import_without_backends():
+    code = (
+        "import sys; sys.path.insert(0, 'src'); "
+        "import classifier_pipeline.columns, classifier_pipeline.phase2_extraction, "
+        "classifier_pipeline.phase1_inventory, classifier_pipeline.phase3_contexts, "
+        "classifier_pipeline.phase3_rules, classifier_pipeline.pipeline"
+    )
+    modules = _imported_modules(["-c", code])
+    assert not (DB | HTTP | TALKBANK) & set(modules)
@@ -0,0 +1,92 @@
+﻿import json
+import threading
+import time
+from pathlib import Path
+
+from classifier_pipeline import phase3_pilot
+from classifier_pipeline.instrumentation import RECORDER, Recorder, count, session, timed
+
+
+def test_timed_as_block_and_thread_safe_decorator():
+    recorder = Recorder()
+
+    @timed("work", recorder)
+    def work() -> None:
+        time.sleep(0.01)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with timed("block", recorder):
+        recorder.count("items", 3)
+
+    report = recorder.report()
+    assert report["timers"]["work"]["calls"] == 4
+    assert 0.01 <= report["timers"]["work"]["max_ms"] / 1000 <= report["timers"]["work"]["total_seconds"]
+    assert list(report["timers"]) == ["work", "block"]
+    assert report["counters"] == {"items": 3}
+
+
+def test_session_writes_timing_report_and_profiles(tmp_path: Path, capsys):
+    report_path = tmp_path / "timing.json"
+    with session("demo", str(report_path), "cprofile", str(tmp_path / "demo.prof")):
+        with timed("demo.step"):
+            count("demo.rows", 2)
+    with session("demo", profile="sample", profile_path=str(tmp_path / "demo.folded")):
+        time.sleep(0.05)
+
+    report = json.loads(report_path.read_text(encoding="utf-8"))
+    assert set(report["timers"]) == {"demo.total", "demo.step"}
+    assert report["counters"] == {"demo.rows": 2}
+    assert (tmp_path / "demo.prof").stat().st_size > 0
+    assert "test_session_writes_timing_report_and_profiles" in (tmp_path / "demo.folded").read_text(encoding="utf-8")
+    assert "demo.step: calls=1" in capsys.readouterr().out
+
+
+class _Response:
+    def __init__(self, status_code: int, content: str = ""):
+        self.status_code = status_code
+        self.headers = {"Retry-After": "0"}
+        self._content = content
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise phase3_pilot.requests.HTTPError(response=self)
+
+    def json(self) -> dict[str, object]:
+        return {"choices": [{"message": {"content": self._content}}]}
+
+
+def test_run_pilot_records_request_parse_and_apply(tmp_path: Path, monkeypatch):
+    input_path = tmp_path / "input.csv"
+    input_path.write_text(
+        "Age,Utterance,%gra,Determiner/Numbers,Classifier\n,一 个 书,num cl n,一,个\n", encoding="utf-8"
+    )
+    content = json.dumps(
+        {
+            "identified_noun": "书",
+            "conventional_classifier": "ben",
+            "conventional_classifier_zh": "本",
+            "classifier_type": "General",
+            "overuse_of_ge": True,
+            "rationale": "Books take ben.",
+            "flag_for_review": False,
+            "flag_reason": "",
+        }
+    )
+    responses = [_Response(429), _Response(200, content)]
+    monkeypatch.setattr(phase3_pilot.requests, "post", lambda *args, **kwargs: responses.pop(0))
+    monkeypatch.setenv("OPEN_ROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("OPENROUTER_RETRY_BASE_SECONDS", "0")
+    RECORDER.reset()
+
+    phase3_pilot.run_pilot(input_path, tmp_path / "output.csv", env_path=tmp_path / ".env")
+
+    report = RECORDER.report()
+    assert report["timers"]["phase3.request"]["calls"] == 2
+    for name in ("phase3.read_input", "phase3.parse", "phase3.apply", "phase3.annotate", "phase3.write_output"):
+        assert report["timers"][name]["calls"] == 1
+    assert report["counters"]["phase3.rate_limited"] == 1
+    assert report["counters"]["phase3.rows.llm"] == 1
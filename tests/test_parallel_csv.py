@@ -0,0 +1,63 @@
+﻿import csv
+import io
+
+import pytest
+
+from classifier_pipeline.artifact_io import CsvArtifactWriter
+from classifier_pipeline.parallel_csv import read_table, record_boundaries
+from classifier_pipeline.phase3_sampling import read_rows
+
+UTTERANCES = ["一 个 书", '他说"好"\n然后', "x,y", '""', "\n", "个\r\n个", ""]
+
+
+def _write(path, n: int) -> list[dict[str, str]]:
+    rows = [{"utterance_id": str(i), "Utterance": UTTERANCES[i % len(UTTERANCES)], "Classifier": "个只"[i % 2]} for i in range(n)]
+    with path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def test_boundaries_skip_newlines_inside_quotes():
+    data = 'a,b\n1,"x\ny"\n2,"z"""\n3,w\n'.encode()
+
+    bounds = record_boundaries(data, chunk_bytes=1)
+
+    assert bounds == [4, 12, 20, 24]
+    for start, end in zip(bounds, bounds[1:]):
+        assert len(list(csv.reader(io.StringIO(data[start:end].decode(), newline="")))) == 1
+
+
+@pytest.mark.parametrize("chunk_bytes", [1, 50, 10_000])
+def test_read_table_matches_dict_reader(tmp_path, monkeypatch, chunk_bytes):
+    rows = _write(tmp_path / "phase2.csv", 700)
+    monkeypatch.setattr("os.cpu_count", lambda: 2)
+
+    table = read_table(tmp_path / "phase2.csv", workers=2, chunk_bytes=chunk_bytes)
+
+    assert len(table) == 700 and table.to_dicts() == rows
+    assert table.column("Classifier")[:3] == ["个", "只", "个"]
+    view = table.row(1)
+    assert view["Utterance"] == '他说"好"\n然后' and view.get("missing") is None and dict(view) == rows[1]
+
+
+def test_read_table_handles_compressed_parts(tmp_path):
+    rows = [{"a": str(i), "b": "个" * (i % 5)} for i in range(3000)]
+    with CsvArtifactWriter(tmp_path / "out.csv.gz", ["a", "b"], max_part_bytes=2048) as writer:
+        writer.writerows([row["a"], row["b"]] for row in rows)
+    assert read_table(tmp_path / "out.csv").to_dicts() == rows
+    assert read_rows(tmp_path / "out.csv", workers=4) == rows
+
+
+@pytest.mark.parametrize("chunk_bytes", [1, 10_000])
+def test_blank_lines_and_short_rows_read_as_dict_reader_does(tmp_path, monkeypatch, chunk_bytes):
+    path = tmp_path / "ragged.csv"
+    path.write_bytes("a,b,c\r\n1,2,3\r\n\r\n4,5\r\n6\r\n\r\n".encode())
+    monkeypatch.setattr("os.cpu_count", lambda: 2)
+
+    expected = read_rows(path)
+
+    assert expected == [{"a": "1", "b": "2", "c": "3"}, {"a": "4", "b": "5", "c": None}, {"a": "6", "b": None, "c": None}]
+    assert read_table(path, workers=2, chunk_bytes=chunk_bytes).to_dicts() == expected
+    assert read_rows(path, workers=2) == expected
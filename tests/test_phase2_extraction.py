@@ -2,9 +2,11 @@
     FULL_CLASSIFIERS,
     OUTPUT_HEADERS,
     REJECTED_HEADERS,
+    ExtractedRow,
     build_collection_clause,
     build_mandarin_language_clause,
     build_output_row,
+    build_output_values,
     build_rejected_row,
     compute_determiner_type,
     compute_specific_semantic_class,
@@ -102,6 +104,27 @@ def test_build_output_row_defaults_missing_sql_columns():
     assert row["determiner_type"] == "numeral"
 
 
+def test_build_output_values_matches_build_output_row():
+    rows = [
+        ExtractedRow("C/a.cha", "Chinese", "CHI", "Target_Child", 30.5, "这 个 苹果", "det clf n",
+                     "这", "det", "个", 12345, 5, 2, 678),
+        ExtractedRow("C/b.cha", "Chinese", "MOT", "Mother", None, "第一 本 书", "num clf n",
+                     "第一", "num", "本", 1, 2, 3, 4),
+        ExtractedRow("C/c.cha", "Chinese", "MOT", "Mother", None, "三 条 鱼", None,
+                     None, "num", "条", None, None, None, None),
+    ]
+    determiner_types: dict[object, str] = {}
+    semantic_classes = {"个": "general"}
+
+    for row in rows:
+        values = build_output_values(row, determiner_types, semantic_classes)
+        expected = build_output_row(row._asdict())
+        assert values == tuple(expected[header] for header in OUTPUT_HEADERS)
+
+    assert determiner_types == {"这": "demonstrative", "第一": "ordinal", "": "unknown"}
+    assert semantic_classes["本"] == "artifact_function"
+
+
 def test_build_rejected_row_includes_new_columns():
     record = {
         "file_name": "Corpus/File.cha",
@@ -0,0 +1,103 @@
+﻿import csv
+import json
+from pathlib import Path
+
+from classifier_pipeline import phase3_pilot
+from classifier_pipeline.phase3_cache import PromptUsage, cached_tokens_from_usage, order_by_prefix
+from classifier_pipeline.prompts import SYSTEM_INSTRUCTION, build_messages
+
+
+def test_cache_control_keeps_system_prefix_identical():
+    plain = build_messages("一 个 书", "个", "一", "num cl n")
+    cached = build_messages("一 条 鱼", "条", "一", "num cl n", cache_control=True)
+
+    part = cached[0]["content"][0]
+    assert plain[0]["content"] == part["text"] == SYSTEM_INSTRUCTION
+    assert part["cache_control"] == {"type": "ephemeral"}
+    assert isinstance(cached[1]["content"], str)
+
+
+def test_prompt_usage_reports_cached_ratio():
+    usage = PromptUsage()
+    usage.record({"prompt_tokens": 1000, "completion_tokens": 50, "prompt_tokens_details": {"cached_tokens": 0}})
+    usage.record({"prompt_tokens": 1000, "completion_tokens": 50, "prompt_tokens_details": {"cached_tokens": 900}})
+    usage.record(None)
+
+    summary = usage.summary()
+    assert summary["requests"] == 3
+    assert summary["requests_with_usage"] == 2
+    assert summary["cached_ratio"] == 0.45
+    assert cached_tokens_from_usage({"cache_read_input_tokens": 12}) == 12
+
+
+def test_order_by_prefix_is_stable():
+    items = ["b", "a2", "a1", "b"]
+    assert order_by_prefix(list(enumerate(items)), lambda item: item[1][:1]) == [
+        (1, "a2"),
+        (2, "a1"),
+        (0, "b"),
+        (3, "b"),
+    ]
+
+
+class _UsageResponse:
+    status_code = 200
+    headers: dict[str, str] = {}
+
+    def __init__(self, content: str):
+        self._content = content
+
+    def raise_for_status(self) -> None:
+        return None
+
+    def json(self) -> dict[str, object]:
+        return {
+            "choices": [{"message": {"content": self._content}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 20, "prompt_tokens_details": {"cached_tokens": 80}},
+        }
+
+
+def test_run_pilot_prompt_cache_groups_rows_and_collects_usage(tmp_path: Path, monkeypatch):
+    input_path = tmp_path / "input.csv"
+    output_path = tmp_path / "output.csv"
+    rows = [
+        {"Utterance": "一 条 鱼", "Determiner/Numbers": "一", "Classifier": "条"},
+        {"Utterance": "一 个 书", "Determiner/Numbers": "一", "Classifier": "个"},
+        {"Utterance": "一 条 鱼", "Determiner/Numbers": "一", "Classifier": "条"},
+    ]
+    with input_path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    answer = json.dumps(
+        {
+            "identified_noun": "鱼",
+            "conventional_classifier": "tiao",
+            "conventional_classifier_zh": "条",
+            "classifier_type": "Specific",
+            "overuse_of_ge": False,
+            "rationale": "Fish take tiao.",
+            "flag_for_review": False,
+            "flag_reason": "",
+        }
+    )
+    sent = []
+
+    def fake_post(url, headers, json, timeout):
+        sent.append(json["messages"])
+        return _UsageResponse(answer)
+
+    monkeypatch.setattr(phase3_pilot.requests, "post", fake_post)
+    monkeypatch.setenv("OPEN_ROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("MAX_CONCURRENT", "1")
+    usage = PromptUsage()
+
+    written = phase3_pilot.run_pilot(
+        input_path, output_path, env_path=tmp_path / ".env", prompt_cache=True, usage=usage
+    )
+
+    utterances = [messages[1]["content"].splitlines()[1] for messages in sent]
+    assert written == 3
+    assert utterances == ["Utterance: 一 个 书 (POS Structure: )"] + ["Utterance: 一 条 鱼 (POS Structure: )"] * 2
+    assert all(messages[0]["content"][0]["cache_control"] for messages in sent)
+    assert usage.summary()["cached_ratio"] == 0.8
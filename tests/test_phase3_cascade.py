@@ -0,0 +1,138 @@
+﻿import csv
+import json
+from json import dumps
+from pathlib import Path
+
+from classifier_pipeline import phase3_pilot
+from classifier_pipeline.phase3_cascade import (
+    CascadeConfig,
+    CascadeStats,
+    CascadeTier,
+    cascade_report_path,
+    escalation_reasons,
+    run_cascade_row,
+)
+from classifier_pipeline.phase3_scheduler import RunBudget, state_path_for
+
+ROW = {
+    "Classifier": "条",
+    "identified_noun": "鱼",
+    "conventional_classifier": "tiao",
+    "conventional_classifier_zh": "条",
+    "classifier_type": "Specific",
+    "overuse_of_ge": False,
+    "rationale": "Fish take tiao.",
+    "flag_for_review": False,
+    "flag_reason": "",
+}
+
+
+def test_escalation_reasons():
+    assert escalation_reasons([ROW]) == []
+    assert escalation_reasons([dict(ROW, flag_for_review=True, flag_reason="disputed_convention")]) == ["flagged"]
+    assert escalation_reasons([dict(ROW, identified_noun="yu")]) == ["malformed"]
+    # 本 (artifact_function) is not a shape classifier like 条.
+    assert escalation_reasons([dict(ROW, conventional_classifier="ben", conventional_classifier_zh="本")]) == ["prior"]
+    ge_row = dict(ROW, Classifier="个", classifier_type="General", overuse_of_ge=False)
+    assert escalation_reasons([ge_row]) == ["inconsistent"]
+    assert escalation_reasons([ROW, dict(ROW, identified_noun="金鱼")]) == ["self_consistency"]
+
+
+def test_run_cascade_row_escalates_malformed_and_reports_savings():
+    config = CascadeConfig(CascadeTier("cheap", "low"), CascadeTier("strong", "medium"))
+    stats = CascadeStats(config)
+    calls = []
+
+    def call_tier(tier, usage):
+        calls.append(tier.model)
+        usage.record({"prompt_tokens": 100 if tier.model == "cheap" else 400, "completion_tokens": 0})
+        if tier.model == "cheap" and len(calls) == 3:
+            raise ValueError("unparseable")
+        return dict(ROW)
+
+    sources = [run_cascade_row({}, config, stats, call_tier)["annotation_source"] for _ in range(3)]
+
+    assert sources == ["cascade:cheap", "cascade:cheap", "cascade:strong:malformed"]
+    report = stats.report()
+    assert report["escalation_rate"] == round(1 / 3, 4)
+    assert report["reasons"] == {"malformed": 1}
+    assert report["tokens_actual"] == 700
+    assert report["tokens_all_strong_estimate"] == 1200
+    assert report["tokens_savings"] == round(1 - 700 / 1200, 4)
+
+
+class _Response:
+    status_code = 200
+    headers: dict[str, str] = {}
+
+    def __init__(self, content: str):
+        self._content = content
+
+    def raise_for_status(self) -> None:
+        return None
+
+    def json(self) -> dict[str, object]:
+        return {"choices": [{"message": {"content": self._content}}]}
+
+
+def test_run_pilot_cascade_uses_effort_per_tier(tmp_path: Path, monkeypatch):
+    input_path = tmp_path / "input.csv"
+    output_path = tmp_path / "output.csv"
+    with input_path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=["Utterance", "Determiner/Numbers", "Classifier"])
+        writer.writeheader()
+        writer.writerow({"Utterance": "一 条 鱼", "Determiner/Numbers": "一", "Classifier": "条"})
+        writer.writerow({"Utterance": "一 条 怪物", "Determiner/Numbers": "一", "Classifier": "条"})
+    efforts = []
+
+    def fake_post(url, headers, json, timeout):
+        efforts.append(json["reasoning"]["effort"])
+        flagged = "怪物" in json["messages"][1]["content"] and json["reasoning"]["effort"] == "low"
+        answer = dict(ROW, flag_for_review=flagged, flag_reason="disputed_convention" if flagged else "")
+        return _Response(dumps(answer, ensure_ascii=False))
+
+    monkeypatch.setattr(phase3_pilot.requests, "post", fake_post)
+    monkeypatch.setenv("OPEN_ROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("MAX_CONCURRENT", "1")
+    config = CascadeConfig(CascadeTier(None, "low"), CascadeTier(None, "medium"))
+
+    phase3_pilot.run_pilot(input_path, output_path, env_path=tmp_path / ".env", cascade=config)
+
+    with output_path.open("r", encoding="utf-8", newline="") as handle:
+        out = list(csv.DictReader(handle))
+    report = json.loads(cascade_report_path(output_path).read_text(encoding="utf-8"))
+    assert efforts == ["low", "low", "medium"]
+    assert [row["annotation_source"] for row in out] == ["cascade:cheap", "cascade:strong:flagged"]
+    assert out[1]["flag_for_review"] == "False"
+    assert report["escalated"] == 1
+    assert report["strong_tier"].endswith("@medium")
+
+
+class _CostResponse(_Response):
+    def json(self) -> dict[str, object]:
+        return {"choices": [{"message": {"content": self._content}}], "usage": {"prompt_tokens": 100, "cost": 0.01}}
+
+
+def test_run_pilot_cascade_spend_counts_against_the_budget(tmp_path: Path, monkeypatch):
+    input_path = tmp_path / "input.csv"
+    output_path = tmp_path / "output.csv"
+    with input_path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=["utterance_id", "Utterance", "Determiner/Numbers", "Classifier"])
+        writer.writeheader()
+        for i in range(4):
+            writer.writerow({"utterance_id": str(i), "Utterance": f"一 条 鱼{i}", "Determiner/Numbers": "一", "Classifier": "条"})
+
+    monkeypatch.setattr(
+        phase3_pilot.requests, "post", lambda url, headers, json, timeout: _CostResponse(dumps(ROW, ensure_ascii=False))
+    )
+    monkeypatch.setenv("OPEN_ROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("MAX_CONCURRENT", "1")
+    config = CascadeConfig(CascadeTier(None, "low"), CascadeTier(None, "medium"))
+
+    written = phase3_pilot.run_pilot(
+        input_path, output_path, env_path=tmp_path / ".env", cascade=config, budget=RunBudget(max_cost=0.025)
+    )
+
+    state = json.loads(state_path_for(output_path).read_text(encoding="utf-8"))
+    assert written == 2
+    assert state["stop_reason"] == "budget" and state["spent"] == 0.02
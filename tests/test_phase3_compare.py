@@ -0,0 +1,62 @@
+﻿from collections import Counter
+
+import pytest
+
+from classifier_pipeline.phase3_compare import (
+    cohens_kappa,
+    compare_runs,
+    confusion_table,
+    diff_rows,
+    fleiss_kappa,
+)
+from classifier_pipeline.phase3_review import index_rows
+
+
+def _row(utterance_id: str, noun: str, overuse: str) -> dict[str, str]:
+    return {
+        "utterance_id": utterance_id,
+        "classifier_token_order": "2",
+        "Utterance": "一 个 书",
+        "Classifier": "个",
+        "identified_noun": noun,
+        "overuse_of_ge": overuse,
+    }
+
+
+def test_kappas_match_hand_computed_values():
+    # 50 rows: 20 yes/yes, 5 yes/no, 10 no/yes, 15 no/no -> po=0.7, pe=0.5, kappa=0.4.
+    table = Counter({("yes", "yes"): 20, ("yes", "no"): 5, ("no", "yes"): 10, ("no", "no"): 15})
+    assert cohens_kappa(table) == pytest.approx(0.4)
+    assert cohens_kappa(Counter({("a", "a"): 3})) == 1.0
+    assert cohens_kappa(Counter()) is None
+
+    # Two raters: Fleiss' kappa uses pooled marginals -> po=0.7, pe=0.505.
+    items = [("yes", "yes")] * 20 + [("yes", "no")] * 5 + [("no", "yes")] * 10 + [("no", "no")] * 15
+    assert fleiss_kappa(items) == pytest.approx((0.7 - 0.505) / 0.495)
+    with pytest.raises(ValueError):
+        fleiss_kappa([("a", "a"), ("a",)])
+
+
+def test_compare_runs_joins_on_row_key_and_normalises_booleans():
+    runs = {
+        "kimi": index_rows([_row("1", "书", "True"), _row("2", "猫", "False"), _row("3", "狗", "True")]),
+        "deepseek": index_rows([_row("1", "书", "true"), _row("2", "猫", "True")]),
+        "codex": index_rows([_row("2", "猫", "False"), _row("1", "书", "TRUE")]),
+    }
+    report = compare_runs(runs, fields=["identified_noun", "overuse_of_ge"])
+
+    assert report["rows_any_run"] == 3 and report["rows_all_runs"] == 2
+    noun, overuse = report["fields"]
+    assert noun["agreement_all_runs"] == 1.0
+    assert overuse["agreement_all_runs"] == 0.5
+    pairs = {(pair["left"], pair["right"]): pair for pair in overuse["pairs"]}
+    assert pairs["kimi", "codex"]["agreement"] == 1.0 and pairs["kimi", "codex"]["rows"] == 2
+    assert pairs["kimi", "deepseek"]["agreement"] == 0.5
+
+    assert confusion_table(runs, "kimi", "deepseek", "overuse_of_ge") == Counter(
+        {("true", "true"): 1, ("false", "true"): 1}
+    )
+    diffs = list(diff_rows(runs, fields=["identified_noun", "overuse_of_ge"]))
+    assert [row["utterance_id"] for row in diffs] == ["2"]
+    assert diffs[0]["differing_fields"] == "overuse_of_ge"
+    assert diffs[0]["overuse_of_ge__deepseek"] == "True"
@@ -0,0 +1,47 @@
+﻿from classifier_pipeline.phase3_contexts import compact_rows, context_id, context_strata, expand_annotations
+
+
+def _phase2_row(utterance: str, speaker: str, utterance_id: str) -> dict[str, str]:
+    return {
+        "Speaker_Role": speaker,
+        "Age": "365.25",
+        "Utterance": utterance,
+        "%gra": "det cl",
+        "Determiner/Numbers": "这",
+        "Classifier": "个",
+        "utterance_id": utterance_id,
+        "classifier_token_order": "2",
+    }
+
+
+def test_compact_rows_counts_multiplicity_and_maps_rows():
+    rows = [
+        _phase2_row("这 个", "Mother", "1"),
+        _phase2_row("这 个 呢", "Target_Child", "2"),
+        _phase2_row("这 个", "Target_Child", "3"),
+    ]
+
+    contexts, mapping = compact_rows(rows)
+
+    assert [c["multiplicity"] for c in contexts] == [2, 1]
+    assert contexts[0]["specific_semantic_class"] == "general"
+    assert contexts[0]["determiner_type"] == "demonstrative"
+    assert mapping[0]["context_id"] == mapping[2]["context_id"] == contexts[0]["context_id"]
+    assert mapping[1]["utterance_id"] == "2"
+    assert contexts[0]["Speaker_Role"] == "Mother" and contexts[0]["Age"] == "365.25"
+    assert context_strata(contexts[0]) == [("Mother", "1-2 yrs", "", 1), ("Target_Child", "1-2 yrs", "", 1)]
+
+
+def test_expand_annotations_joins_on_context_fields():
+    rows = [_phase2_row("这 个", "Mother", "1"), _phase2_row("这 个", "Target_Child", "3")]
+    contexts, _ = compact_rows(rows)
+    annotated = [dict(contexts[0], identified_noun="OMITTED", rationale="No noun.")]
+    annotated[0].pop("context_id")
+
+    expanded, missing = expand_annotations(rows, annotated)
+
+    assert missing == 0
+    assert [row["identified_noun"] for row in expanded] == ["OMITTED", "OMITTED"]
+    assert expanded[1]["Speaker_Role"] == "Target_Child"
+    assert expanded[0]["age_years"] == 1.0
+    assert context_id(expanded[0]) == contexts[0]["context_id"]
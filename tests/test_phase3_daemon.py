@@ -0,0 +1,80 @@
+﻿import csv
+import json
+from pathlib import Path
+
+from classifier_pipeline import phase3_daemon
+from classifier_pipeline.phase3_daemon import AnnotationDaemon, Job, RowQueue, submit_job
+
+
+def _write_input(path: Path, nouns: list[str]) -> None:
+    with path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=["Utterance", "Determiner/Numbers", "Classifier"])
+        writer.writeheader()
+        for noun in nouns:
+            writer.writerow({"Utterance": f"一 个 {noun}", "Determiner/Numbers": "一", "Classifier": "个"})
+
+
+def test_row_queue_serves_by_priority_and_keeps_reserved_slots_off_bulk():
+    queue = RowQueue()
+    bulk = Job("bulk", Path("b.csv"), Path("b_out.csv"), priority="bulk")
+    interactive = Job("fast", Path("f.csv"), Path("f_out.csv"), priority="interactive")
+    queue.put_job(bulk, [0, 1])
+    queue.put_job(interactive, [0])
+
+    assert queue.get(allow_bulk=False, timeout=0) == (interactive, 0)
+    assert queue.get(allow_bulk=False, timeout=0) is None
+    assert queue.get(timeout=0) == (bulk, 0)
+
+
+def test_daemon_runs_interactive_job_before_queued_bulk_rows(tmp_path: Path, monkeypatch):
+    queue_dir = tmp_path / "queue"
+    _write_input(tmp_path / "bulk.csv", ["书", "车", "鱼", "花"])
+    _write_input(tmp_path / "focus.csv", ["人"])
+    monkeypatch.setenv("LLM_PROVIDER", "lmstudio")
+    monkeypatch.setenv("LM_STUDIO_MODEL", "local-model")
+    order = []
+
+    def fake_process_row(provider, api_key, model, base_url, row, *args, **kwargs):
+        noun = row["Utterance"].split()[-1]
+        order.append(noun)
+        return {**row, "identified_noun": noun, "annotation_source": "llm"}
+
+    monkeypatch.setattr(phase3_daemon, "_sync_process_row", fake_process_row)
+    submit_job(queue_dir, tmp_path / "bulk.csv", tmp_path / "bulk_out.csv", priority="bulk")
+    submit_job(queue_dir, tmp_path / "focus.csv", tmp_path / "focus_out.csv", priority="interactive")
+
+    daemon = AnnotationDaemon(queue_dir, env_path=tmp_path / ".env", max_concurrent=1, reserved_slots=0)
+    daemon.claim_pending()
+    daemon.serve(poll_seconds=0.01, until_idle=True)
+
+    assert order[0] == "人"
+    with (tmp_path / "bulk_out.csv").open("r", encoding="utf-8", newline="") as handle:
+        assert [row["identified_noun"] for row in csv.DictReader(handle)] == ["书", "车", "鱼", "花"]
+    summaries = [json.loads(path.read_text(encoding="utf-8")) for path in (queue_dir / "done").glob("*.json")]
+    assert sorted(summary["priority"] for summary in summaries) == ["bulk", "interactive"]
+    assert all(summary["failed_rows"] == 0 for summary in summaries)
+    assert not list((queue_dir / "running").glob("*.json"))
+
+
+def test_undecodable_input_fails_its_job_and_keeps_serving(tmp_path: Path, monkeypatch):
+    queue_dir = tmp_path / "queue"
+    (tmp_path / "broken.csv").write_bytes(b"Utterance,Classifier\n\xff\xfe \xe4\xb8,\xff\n")
+    _write_input(tmp_path / "good.csv", ["书"])
+    monkeypatch.setenv("LLM_PROVIDER", "lmstudio")
+    monkeypatch.setenv("LM_STUDIO_MODEL", "local-model")
+    monkeypatch.setattr(
+        phase3_daemon,
+        "_sync_process_row",
+        lambda provider, api_key, model, base_url, row, *args, **kwargs: {**row, "annotation_source": "llm"},
+    )
+    broken = submit_job(queue_dir, tmp_path / "broken.csv", tmp_path / "broken_out.csv", priority="interactive")
+    submit_job(queue_dir, tmp_path / "good.csv", tmp_path / "good_out.csv")
+
+    daemon = AnnotationDaemon(queue_dir, env_path=tmp_path / ".env", max_concurrent=1, reserved_slots=0)
+    daemon.serve(poll_seconds=0.01, until_idle=True)
+
+    summary = json.loads((queue_dir / "failed" / f"{broken}.json").read_text(encoding="utf-8"))
+    assert "UnicodeDecodeError" in summary["errors"][0]
+    assert not list((queue_dir / "running").glob("*.json"))
+    assert len(list((queue_dir / "done").glob("*.json"))) == 1
+    assert (tmp_path / "good_out.csv").exists()
@@ -0,0 +1,73 @@
+﻿from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+from classifier_pipeline.phase3_hedging import (
+    HedgeBudget,
+    HedgePolicy,
+    LatencyTracker,
+    hedge_delay,
+    run_hedged,
+)
+
+
+def test_latency_tracker_percentile():
+    tracker = LatencyTracker()
+    for value in range(1, 101):
+        tracker.record(float(value))
+
+    assert tracker.percentile(0.95) == 95.0
+    assert tracker.percentile(0.5) == 50.0
+
+
+def test_hedge_delay_waits_for_history():
+    policy = HedgePolicy(percentile=0.9, min_samples=3, min_delay_seconds=0.0)
+    tracker = LatencyTracker()
+    tracker.record(1.0)
+
+    assert hedge_delay(policy, tracker) is None
+
+    tracker.record(2.0)
+    tracker.record(3.0)
+
+    assert hedge_delay(policy, tracker) == 3.0
+
+
+def test_run_hedged_duplicate_wins_and_cancels_primary():
+    policy = HedgePolicy(percentile=0.5, min_samples=1, min_delay_seconds=0.0, max_hedge_fraction=1.0)
+    tracker = LatencyTracker()
+    tracker.record(0.01)
+    budget = HedgeBudget(max_hedges=1)
+    calls = []
+    cancelled = []
+
+    def call(cancel_event: threading.Event) -> str:
+        attempt = len(calls)
+        calls.append(attempt)
+        if attempt == 0:
+            cancelled.append(cancel_event.wait(2.0))
+            return "primary"
+        return "hedge"
+
+    result = asyncio.run(run_hedged(call, policy, tracker, budget))
+
+    assert result == "hedge"
+    assert budget.issued == 1
+    assert budget.won == 1
+    assert cancelled == [True]
+
+
+def test_run_hedged_respects_budget():
+    policy = HedgePolicy(percentile=0.5, min_samples=1, min_delay_seconds=0.0)
+    tracker = LatencyTracker()
+    tracker.record(0.001)
+    budget = HedgeBudget(max_hedges=0)
+
+    def call(cancel_event: threading.Event) -> str:
+        time.sleep(0.02)
+        return "primary"
+
+    assert asyncio.run(run_hedged(call, policy, tracker, budget)) == "primary"
+    assert budget.issued == 0
@@ -0,0 +1,59 @@
+﻿from classifier_pipeline.phase3_lanes import LaneDispatcher, build_lanes
+
+
+def test_build_lanes_names_keys_by_position():
+    lanes = build_lanes(["a/model", "b/model"], ["secret-1", "secret-2"], "https://example.test/v1")
+
+    assert [lane.name for lane in lanes] == ["a/model#k1", "a/model#k2", "b/model#k1", "b/model#k2"]
+    assert "secret" not in repr(lanes[0])
+    assert lanes[0].url == "https://example.test/v1/chat/completions"
+
+
+def test_dispatcher_spreads_in_flight_requests():
+    dispatcher = LaneDispatcher(build_lanes(["a", "b"], ["k"], "http://x"))
+
+    first, _ = dispatcher.reserve()
+    second, _ = dispatcher.reserve()
+
+    assert {first.name, second.name} == {"a#k1", "b#k1"}
+
+
+def test_dispatcher_shifts_traffic_away_from_rate_limited_lane():
+    dispatcher = LaneDispatcher(build_lanes(["a", "b"], ["k"], "http://x"))
+    lane_a, lane_b = dispatcher.lanes
+
+    lane, _ = dispatcher.reserve()
+    dispatcher.report(lane, ok=False, latency_seconds=0.1, rate_limited=True, cooldown_seconds=30)
+    picks = []
+    for _ in range(3):
+        picked, _ = dispatcher.reserve()
+        picks.append(picked.name)
+        dispatcher.report(picked, ok=True, latency_seconds=0.5)
+
+    assert lane.rate_limited == 1
+    assert lane.health < 1.0
+    other = lane_b if lane is lane_a else lane_a
+    assert picks == [other.name] * 3
+
+
+def test_dispatcher_waits_when_all_lanes_cool_down():
+    dispatcher = LaneDispatcher(build_lanes(["a"], ["k"], "http://x"))
+    lane, _ = dispatcher.reserve()
+    dispatcher.report(lane, ok=False, latency_seconds=0.1, rate_limited=True, cooldown_seconds=5)
+
+    picked, delay = dispatcher.reserve()
+
+    assert picked is None
+    assert 0 < delay <= 5
+
+
+def test_dispatcher_applies_lane_rate_limit_interval():
+    dispatcher = LaneDispatcher(build_lanes(["a"], ["k"], "http://x"))
+    lane, _ = dispatcher.reserve()
+    dispatcher.report(lane, ok=True, latency_seconds=0.2, min_interval=3.0)
+
+    _, first_delay = dispatcher.reserve()
+    _, second_delay = dispatcher.reserve()
+
+    assert first_delay < 0.5
+    assert 2.5 < second_delay <= 3.0
@@ -0,0 +1,63 @@
+﻿from pathlib import Path
+
+from classifier_pipeline.phase3_lexicon import NounLexicon, candidate_head_noun, resolve_from_lexicon
+
+
+def _annotation(noun: str, pinyin: str, zh: str, flag: str = "False") -> dict[str, str]:
+    return {
+        "identified_noun": noun,
+        "conventional_classifier": pinyin,
+        "conventional_classifier_zh": zh,
+        "flag_for_review": flag,
+    }
+
+
+def test_lexicon_settles_after_agreeing_annotations():
+    lexicon = NounLexicon(min_count=3, min_agreement=0.9)
+    lexicon.update_from_rows([_annotation("书", "ben", "本")] * 2 + [_annotation("OMITTED", "N/A", "N/A")])
+
+    assert lexicon.settled("书") is None
+
+    lexicon.update_from_rows([_annotation("书", "ben", "本")])
+
+    assert lexicon.settled("书") == ("ben", "本")
+
+
+def test_lexicon_does_not_settle_disputed_or_flagged_nouns():
+    lexicon = NounLexicon(min_count=3, min_agreement=0.9)
+    lexicon.update_from_rows([_annotation("怪物", "ge", "个"), _annotation("怪物", "zhi", "只")] * 2)
+    lexicon.update_from_rows([_annotation("杯子", "zhi", "只", flag="True")] * 3)
+
+    assert lexicon.settled("怪物") is None
+    assert lexicon.settled("杯子") is None
+
+
+def test_lexicon_round_trips_through_csv(tmp_path: Path):
+    lexicon = NounLexicon()
+    lexicon.update_from_rows([_annotation("鱼", "tiao", "条")] * 3 + [_annotation("鱼", "tiao", "条", flag="True")])
+    path = tmp_path / "lexicon.csv"
+    lexicon.save(path)
+
+    reloaded = NounLexicon()
+    reloaded.load(path)
+
+    assert reloaded.export_rows() == lexicon.export_rows()
+
+
+def test_candidate_head_noun_requires_bare_noun_phrase():
+    assert candidate_head_noun({"Utterance": "一 个 书", "%gra": "num cl n", "Determiner/Numbers": "一", "Classifier": "个"}) == "书"
+    assert candidate_head_noun({"Utterance": "一 个 图画 书", "%gra": "num cl n n", "Determiner/Numbers": "一", "Classifier": "个"}) is None
+    assert candidate_head_noun({"Utterance": "一 个 红 球", "%gra": "num cl adj n", "Determiner/Numbers": "一", "Classifier": "个"}) is None
+
+
+def test_resolve_from_lexicon_marks_overuse():
+    lexicon = NounLexicon(min_count=1)
+    lexicon.update_from_rows([_annotation("书", "ben", "本")])
+    row = {"Utterance": "一 个 书 啊", "%gra": "num cl n sfp", "Determiner/Numbers": "一", "Classifier": "个"}
+
+    parsed = resolve_from_lexicon(row, lexicon)
+
+    assert parsed["identified_noun"] == "书"
+    assert parsed["conventional_classifier_zh"] == "本"
+    assert parsed["classifier_type"] == "General"
+    assert parsed["overuse_of_ge"] is True
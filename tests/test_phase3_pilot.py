@@ -1,16 +1,24 @@
-﻿import os
+﻿import csv
+import json
+import os
 from pathlib import Path
 
 import pytest
 
+from classifier_pipeline import phase3_pilot
+from classifier_pipeline.columns import compute_age_fields
+from classifier_pipeline.phase3_lanes import LaneDispatcher, build_lanes
 from classifier_pipeline.phase3_pilot import (
     OUTPUT_HEADERS,
-    _compute_age_fields,
     _apply_response,
     _build_messages,
+    _load_provider_config,
+    _request_headers,
     _request_payload_for_row,
     compute_throttle_delay,
     ensure_model_allowed,
+    get_default_concurrency,
+    get_request_timeout,
     get_temperature,
     get_retry_delay,
     load_env,
@@ -103,6 +111,39 @@ def test_ensure_model_allowed_rejects_other():
         ensure_model_allowed("kimi-k2.5", provider="openrouter")
 
 
+def test_ensure_model_allowed_accepts_any_local_model():
+    ensure_model_allowed("qwen2.5-7b-instruct", provider="lmstudio")
+    with pytest.raises(ValueError):
+        ensure_model_allowed("", provider="lmstudio")
+
+
+def test_load_provider_config_local(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "lmstudio")
+    monkeypatch.setenv("LM_STUDIO_MODEL", "qwen2.5-7b-instruct")
+    monkeypatch.delenv("LM_STUDIO_BASE_URL", raising=False)
+    monkeypatch.delenv("LM_STUDIO_API_KEY", raising=False)
+
+    provider, api_key, model, base_url = _load_provider_config()
+
+    assert provider == "lmstudio"
+    assert api_key == ""
+    assert model == "qwen2.5-7b-instruct"
+    assert base_url == "http://localhost:1234/v1"
+
+
+def test_local_provider_request_settings(monkeypatch):
+    monkeypatch.setenv("LM_STUDIO_PARALLEL", "2")
+    monkeypatch.delenv("LM_STUDIO_TIMEOUT_SECONDS", raising=False)
+    payload = _request_payload_for_row("lmstudio", "qwen2.5-7b-instruct", [{"role": "user", "content": "x"}])
+
+    assert _request_headers("", provider="lmstudio") == {"Content-Type": "application/json"}
+    assert "reasoning" not in payload
+    assert "response_format" not in payload
+    assert get_default_concurrency("lmstudio") == 2
+    assert get_default_concurrency("openrouter") == 10
+    assert get_request_timeout("lmstudio") == 600
+
+
 def test_compute_throttle_delay_from_limit():
     delay = compute_throttle_delay({"X-RateLimit-Limit": "20"})
 
@@ -132,33 +173,33 @@ def test_normalize_overuse_value():
 
 
 def test_compute_age_fields_from_age_days():
-    row = _compute_age_fields({"Age": "1156.625"})
+    row = compute_age_fields({"Age": "1156.625"})
 
     assert row["age_available"] is True
     assert row["age_years"] == 3.2
 
 
 def test_compute_age_fields_with_missing_age():
-    row = _compute_age_fields({"Age": ""})
+    row = compute_age_fields({"Age": ""})
 
     assert row["age_available"] is False
     assert row["age_years"] == ""
 
 
 def test_compute_age_fields_backfills_determiner_type():
-    row = _compute_age_fields({"Age": "365.25", "Determiner/Numbers": "这"})
+    row = compute_age_fields({"Age": "365.25", "Determiner/Numbers": "这"})
 
     assert row["determiner_type"] == "demonstrative"
 
 
 def test_compute_age_fields_preserves_existing_determiner_type():
-    row = _compute_age_fields({"Age": "365.25", "Determiner/Numbers": "这", "determiner_type": "demonstrative"})
+    row = compute_age_fields({"Age": "365.25", "Determiner/Numbers": "这", "determiner_type": "demonstrative"})
 
     assert row["determiner_type"] == "demonstrative"
 
 
 def test_compute_age_fields_backfills_specific_semantic_class():
-    row = _compute_age_fields({"Age": "365.25", "Classifier": "只"})
+    row = compute_age_fields({"Age": "365.25", "Classifier": "只"})
 
     assert row["specific_semantic_class"] == "animacy"
 
@@ -172,7 +213,7 @@ def test_build_messages_backfills_specific_semantic_class():
 
 
 def test_apply_response_extracts_conventional_classifier_zh():
-    row = {"Age": "365.25", "Classifier type": "", "Over use of Ge...": ""}
+    row = compute_age_fields({"Age": "365.25", "Classifier type": "", "Over use of Ge...": ""})
     parsed = {
         "identified_noun": "书",
         "conventional_classifier": "ben",
@@ -190,7 +231,7 @@ def test_apply_response_extracts_conventional_classifier_zh():
 
 
 def test_apply_response_extracts_flag_fields():
-    row = {"Age": "365.25", "Classifier type": "", "Over use of Ge...": ""}
+    row = compute_age_fields({"Age": "365.25", "Classifier type": "", "Over use of Ge...": ""})
     parsed = {
         "identified_noun": "杯子",
         "conventional_classifier": "ge",
@@ -209,7 +250,7 @@ def test_apply_response_extracts_flag_fields():
 
 
 def test_apply_response_defaults_flag_to_false():
-    row = {"Age": "365.25", "Classifier type": "", "Over use of Ge...": ""}
+    row = compute_age_fields({"Age": "365.25", "Classifier type": "", "Over use of Ge...": ""})
     parsed = {
         "identified_noun": "人",
         "conventional_classifier": "ge",
@@ -223,3 +264,145 @@ def test_apply_response_defaults_flag_to_false():
 
     assert out["flag_for_review"] is False
     assert out["flag_reason"] == ""
+
+
+def _write_phase2_rows(path: Path, rows: list[dict[str, str]]) -> None:
+    with path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_run_pilot_routes_rule_rows_around_the_model(tmp_path: Path, monkeypatch):
+    input_path = tmp_path / "input.csv"
+    output_path = tmp_path / "output.csv"
+    _write_phase2_rows(
+        input_path,
+        [
+            {"Age": "365.25", "Utterance": "这 个 是 我的", "%gra": "det cl v:cop pro:per", "Determiner/Numbers": "这", "Classifier": "个"},
+            {"Age": "365.25", "Utterance": "一 本 书", "%gra": "num cl n", "Determiner/Numbers": "一", "Classifier": "本"},
+        ],
+    )
+    sent = []
+
+    def fake_send_request(url, headers, payload, max_retries, base_retry_seconds, cancel_event=None):
+        sent.append(payload["messages"][1]["content"])
+        return json.dumps(
+            {
+                "identified_noun": "书",
+                "conventional_classifier": "ben",
+                "conventional_classifier_zh": "本",
+                "classifier_type": "General",
+                "overuse_of_ge": True,
+                "rationale": "example",
+                "flag_for_review": False,
+                "flag_reason": "",
+            }
+        )
+
+    monkeypatch.setattr(phase3_pilot, "_send_request", fake_send_request)
+    monkeypatch.setenv("OPEN_ROUTER_API_KEY", "test-key")
+
+    written = phase3_pilot.run_pilot(input_path, output_path, env_path=tmp_path / ".env", fast_path=True)
+
+    with output_path.open("r", encoding="utf-8", newline="") as handle:
+        out = list(csv.DictReader(handle))
+    assert written == 2
+    assert len(sent) == 1
+    assert [row["annotation_source"] for row in out] == ["rule", "llm"]
+    assert out[0]["identified_noun"] == "OMITTED"
+    assert out[1]["classifier_type"] == "Specific"
+    assert out[1]["overuse_of_ge"] == "False"
+
+
+def test_run_pilot_recomputes_age_columns_carried_by_the_input(tmp_path: Path, monkeypatch):
+    input_path = tmp_path / "input.csv"
+    output_path = tmp_path / "output.csv"
+    rule_row = {"Utterance": "这 个 是 我的", "%gra": "det cl v:cop pro:per", "Determiner/Numbers": "这", "Classifier": "个"}
+    _write_phase2_rows(
+        input_path,
+        [
+            {"Age": "365.25", "age_years": "", "age_band": "", **rule_row},
+            {"Age": "1156.625", "age_years": "9.0", "age_band": "stale", **rule_row},
+        ],
+    )
+    monkeypatch.setenv("OPEN_ROUTER_API_KEY", "test-key")
+
+    phase3_pilot.run_pilot(input_path, output_path, env_path=tmp_path / ".env", fast_path=True)
+
+    with output_path.open("r", encoding="utf-8", newline="") as handle:
+        out = list(csv.DictReader(handle))
+    expected = [compute_age_fields({"Age": "365.25"}), compute_age_fields({"Age": "1156.625"})]
+    assert [row["age_band"] for row in out] == [row["age_band"] for row in expected]
+    assert out[1]["age_years"] == str(expected[1]["age_years"])
+
+
+class _FakeResponse:
+    def __init__(self, status_code: int, content: str = "", headers: dict[str, str] | None = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._content = content
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise phase3_pilot.requests.HTTPError(response=self)
+
+    def json(self) -> dict[str, object]:
+        return {"choices": [{"message": {"content": self._content}}]}
+
+
+def test_run_pilot_lanes_record_lane_and_avoid_rate_limited_model(tmp_path: Path, monkeypatch):
+    input_path = tmp_path / "input.csv"
+    output_path = tmp_path / "output.csv"
+    _write_phase2_rows(
+        input_path,
+        [{"Age": "", "Utterance": "一 个 书", "%gra": "num cl n", "Determiner/Numbers": "一", "Classifier": "个"}],
+    )
+    content = json.dumps(
+        {
+            "identified_noun": "书",
+            "conventional_classifier": "ben",
+            "conventional_classifier_zh": "本",
+            "classifier_type": "General",
+            "overuse_of_ge": True,
+            "rationale": "Books take ben.",
+            "flag_for_review": False,
+            "flag_reason": "",
+        }
+    )
+    models = []
+
+    def fake_post(url, headers, json, timeout):
+        models.append(json["model"])
+        if json["model"] == "moonshotai/kimi-k2.5":
+            return _FakeResponse(429, headers={"Retry-After": "30"})
+        return _FakeResponse(200, content)
+
+    monkeypatch.setattr(phase3_pilot.requests, "post", fake_post)
+    monkeypatch.setenv("OPEN_ROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("OPENROUTER_MODELS", "moonshotai/kimi-k2.5,deepseek/deepseek-v3.2-speciale")
+
+    phase3_pilot.run_pilot(input_path, output_path, env_path=tmp_path / ".env", use_lanes=True)
+
+    with output_path.open("r", encoding="utf-8", newline="") as handle:
+        out = list(csv.DictReader(handle))
+    assert models == ["moonshotai/kimi-k2.5", "deepseek/deepseek-v3.2-speciale"]
+    assert out[0]["annotation_source"] == "llm:deepseek/deepseek-v3.2-speciale#k1"
+
+
+class _EmptyChoicesResponse(_FakeResponse):
+    def json(self) -> dict[str, object]:
+        return {"choices": []}
+
+
+def test_malformed_lane_response_releases_the_lane(monkeypatch):
+    dispatcher = LaneDispatcher(build_lanes(["deepseek/deepseek-v3.2-speciale"], ["k"], "http://x"))
+    monkeypatch.setattr(phase3_pilot.requests, "post", lambda *args, **kwargs: _EmptyChoicesResponse(200))
+
+    for _ in range(3):
+        with pytest.raises(IndexError):
+            phase3_pilot._send_lane_request(dispatcher, "openrouter", [{"role": "user", "content": "q"}], 0, 0)
+
+    lane = dispatcher.lanes[0]
+    assert lane.in_flight == 0
+    assert lane.failures == 3
@@ -0,0 +1,69 @@
+﻿from pathlib import Path
+
+import pytest
+
+from classifier_pipeline.phase3_review import (
+    index_rows,
+    load_result_runs,
+    row_key,
+    run_names,
+    select_review_samples,
+)
+from classifier_pipeline.phase3_sampling import write_rows
+
+
+def _row(utterance: str, noun: str, zh: str, overuse: str, flag: str = "False") -> dict[str, str]:
+    return {
+        "File Name": "Mandarin/Tong/001.xml",
+        "Utterance": utterance,
+        "Determiner/Numbers": "一",
+        "Classifier": "个",
+        "identified_noun": noun,
+        "conventional_classifier_zh": zh,
+        "overuse_of_ge": overuse,
+        "flag_for_review": flag,
+    }
+
+
+def test_row_key_prefers_childes_ids():
+    assert row_key({"utterance_id": "12", "classifier_token_order": "3"}) == ("id", "12", "3")
+    assert row_key({"Utterance": "一 个 书", "Classifier": "个"})[0] == "ctx"
+
+
+def test_index_rows_keeps_repeated_contexts():
+    rows = [_row("一 个 书", "书", "本", "True"), _row("一 个 书", "书", "本", "True")]
+
+    assert len(index_rows(rows)) == 2
+
+
+def test_select_review_samples_ranks_disagreeing_clusters_first():
+    run_a = [
+        _row("一 个 书", "书", "本", "True"),
+        _row("一 个 杯子", "杯子", "只", "True", flag="True"),
+        _row("一 个 人", "人", "个", "False"),
+    ]
+    run_b = [
+        _row("一 个 书", "书", "本", "True"),
+        _row("一 个 杯子", "杯子", "个", "false"),
+        _row("一 个 人", "人", "个", "false"),
+    ]
+    runs = {"a": index_rows(run_a), "b": index_rows(run_b)}
+
+    sample = select_review_samples(runs, total=5)
+
+    assert [row["review_cluster_noun"] for row in sample] == ["杯子"]
+    assert sample[0]["conventional_classifier_zh__a"] == "只"
+    assert sample[0]["conventional_classifier_zh__b"] == "个"
+
+
+def test_result_runs_with_the_same_file_name_are_kept_apart(tmp_path: Path):
+    for run, noun in (("a", "书"), ("b", "狗")):
+        write_rows(tmp_path / run / "results.csv.gz", [_row("一 个 书", noun, "本", "True")])
+
+    runs = load_result_runs([tmp_path / "a" / "results.csv", tmp_path / "b" / "results.csv.gz"])
+
+    assert list(runs) == ["a/results", "b/results"]
+    assert [next(iter(rows.values()))["identified_noun"] for rows in runs.values()] == ["书", "狗"]
+    assert run_names([Path("x/one.csv"), Path("x/two.csv")]) == ["one", "two"]
+    with pytest.raises(ValueError):
+        run_names([Path("x/one.csv"), Path("x/one.csv.gz")])
@@ -0,0 +1,54 @@
+﻿from classifier_pipeline.phase3_rules import (
+    RULE_DEMONSTRATIVE_COPULA,
+    RULE_UTTERANCE_FINAL,
+    deterministic_fields,
+    locate_target,
+    match_omission_rule,
+    pre_annotate,
+)
+
+
+def _row(utterance: str, gra: str, determiner: str, classifier: str, order: str = "") -> dict[str, str]:
+    return {
+        "Utterance": utterance,
+        "%gra": gra,
+        "Determiner/Numbers": determiner,
+        "Classifier": classifier,
+        "classifier_token_order": order,
+    }
+
+
+def test_locate_target_uses_token_order_then_unique_pair():
+    tokens = "这 个 是 这 个".split()
+
+    assert locate_target(tokens, _row("", "", "这", "个", order="5")) == 4
+    assert locate_target(tokens, _row("", "", "这", "个")) is None
+    assert locate_target("我 要 这 个".split(), _row("", "", "这", "个")) == 3
+
+
+def test_match_omission_rule_utterance_final_and_particles():
+    assert match_omission_rule(_row("一 个", "num cl", "一", "个")) == RULE_UTTERANCE_FINAL
+    assert match_omission_rule(_row("这 个 吗", "det cl sfp", "这", "个")) == RULE_UTTERANCE_FINAL
+    assert match_omission_rule(_row("一 个 书", "num cl n", "一", "个")) is None
+
+
+def test_match_omission_rule_demonstrative_copula():
+    assert match_omission_rule(_row("这 个 是 我的", "det cl v:cop pro:per", "这", "个")) == RULE_DEMONSTRATIVE_COPULA
+    assert match_omission_rule(_row("这 只 不 是 蛮 好吗", "det cl adv v:cop adv co:int", "这", "只")) == RULE_DEMONSTRATIVE_COPULA
+    assert match_omission_rule(_row("一 个 是 我的", "num cl v:cop pro:per", "一", "个")) is None
+
+
+def test_pre_annotate_returns_full_response_for_omitted_rows():
+    parsed = pre_annotate(_row("好 再 给 你 一 张", "adj adv v pro:per num cl", "一", "张", order="6"))
+
+    assert parsed["identified_noun"] == "OMITTED"
+    assert parsed["conventional_classifier_zh"] == "N/A"
+    assert parsed["classifier_type"] == "Specific"
+    assert parsed["overuse_of_ge"] is False
+    assert parsed["flag_for_review"] is False
+    assert pre_annotate(_row("这 个 颜色", "det cl n", "这", "个")) is None
+
+
+def test_deterministic_fields_by_classifier():
+    assert deterministic_fields({"Classifier": "个"}) == {"classifier_type": "General"}
+    assert deterministic_fields({"Classifier": "本"}) == {"classifier_type": "Specific", "overuse_of_ge": False}
@@ -1,4 +1,12 @@
-﻿from classifier_pipeline.phase3_sampling import select_focus_samples, select_random_samples
+﻿from classifier_pipeline.phase3_sampling import (
+    TermMatcher,
+    build_term_index,
+    compute_age_band,
+    corpus_from_file_name,
+    select_focus_samples,
+    select_random_samples,
+    select_stratified_samples,
+)
 
 
 def test_select_focus_samples_prefers_flowers():
@@ -30,3 +38,64 @@ def test_select_random_samples_is_reproducible():
 
     assert len(sample_a) == 20
     assert sample_a == sample_b
+
+
+def test_term_matcher_finds_overlapping_terms():
+    matcher = TermMatcher(["花", "花瓶", "瓶子", "书"])
+
+    found = {matcher.terms[i] for i in matcher.find("一 个 花瓶子")}
+
+    assert found == {"花", "花瓶", "瓶子"}
+
+
+def test_build_term_index_maps_terms_to_row_ids():
+    index = build_term_index(["一 本 书", "一 朵 花", "书 和 花"], ["花", "书", "猫"])
+
+    assert index == {"花": [1, 2], "书": [0, 2], "猫": []}
+
+
+def test_select_focus_samples_uses_custom_terms():
+    rows = [{"Utterance": f"一 个 东西 {idx}"} for idx in range(50)]
+    rows[7] = {"Utterance": "一 只 兔子"}
+    rows[31] = {"Utterance": "一 颗 星星"}
+    rows[40] = {"Utterance": "一 只 兔子 跑"}
+
+    sample = select_focus_samples(
+        rows,
+        total=4,
+        flower_min=1,
+        flower_max=2,
+        seed=3,
+        focus_terms=["星星"],
+        priority_terms=["兔子"],
+    )
+    utterances = [row["Utterance"] for row in sample]
+
+    assert len(sample) == 4
+    assert "一 只 兔子" in utterances
+    assert "一 只 兔子 跑" in utterances
+    assert "一 颗 星星" in utterances
+
+
+def test_compute_age_band():
+    assert compute_age_band("365.25") == "1-2 yrs"
+    assert compute_age_band("1156.625") == "3-4 yrs"
+    assert compute_age_band("3000") == "7+ yrs"
+    assert compute_age_band("") == "unknown"
+
+
+def test_corpus_from_file_name():
+    assert corpus_from_file_name("Mandarin/Erbaugh/Kang/17.xml") == "Erbaugh"
+    assert corpus_from_file_name("Mandarin/Tong/010.xml") == "Tong"
+
+
+def test_select_stratified_samples_caps_each_stratum():
+    rows = [{"Classifier": "个", "Utterance": f"ge-{idx}"} for idx in range(40)]
+    rows += [{"Classifier": "只", "Utterance": f"zhi-{idx}"} for idx in range(3)]
+
+    sample_a = select_stratified_samples(iter(rows), strata=["Classifier"], per_stratum=5, seed=7)
+    sample_b = select_stratified_samples(iter(rows), strata=["Classifier"], per_stratum=5, seed=7)
+
+    assert sample_a == sample_b
+    assert sum(1 for row in sample_a if row["Classifier"] == "个") == 5
+    assert sum(1 for row in sample_a if row["Classifier"] == "只") == 3
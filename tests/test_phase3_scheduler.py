@@ -0,0 +1,188 @@
+﻿import csv
+import json
+from pathlib import Path
+
+import pytest
+
+from classifier_pipeline import phase3_pilot
+from classifier_pipeline.phase3_cache import PromptUsage
+from classifier_pipeline.phase3_scheduler import (
+    BudgetScheduler,
+    RunBudget,
+    TokenPrices,
+    failures_path_for,
+    prioritize,
+    state_path_for,
+)
+
+
+def test_prioritize_orders_by_keys_and_keeps_input_order_within_ties():
+    rows = [
+        {"Speaker_Code": "MOT", "Classifier": "个", "Utterance": "a"},
+        {"Speaker_Code": "CHI", "Classifier": "个", "Utterance": "a"},
+        {"Speaker_Code": "MOT", "Classifier": "条", "Utterance": "b"},
+        {"Speaker_Code": "CHI", "Classifier": "个", "Utterance": "c"},
+    ]
+    items = list(enumerate(rows))
+
+    assert [i for i, _ in prioritize(items, ["chi_first", "non_ge_first"])] == [1, 3, 2, 0]
+    assert [i for i, _ in prioritize(items, ["unique_first"])] == [0, 2, 3, 1]
+    with pytest.raises(ValueError):
+        prioritize(items, ["largest_first"])
+
+
+def test_scheduler_stops_before_projected_spend_exceeds_budget():
+    usage = PromptUsage()
+    scheduler = BudgetScheduler(RunBudget(max_cost=0.05), usage)
+
+    assert scheduler.admit()
+    usage.record({"prompt_tokens": 10, "cost": 0.02})
+    scheduler.finish(1.0)
+    assert scheduler.admit()
+    usage.record({"prompt_tokens": 10, "cost": 0.02})
+    scheduler.finish(1.0)
+
+    assert not scheduler.admit()
+    assert scheduler.stop_reason == "budget"
+    state = scheduler.state(rows_total=10, rows_done=2)
+    assert state["avg_cost_per_row"] == 0.02
+    assert state["estimated_cost_remaining"] == 0.16
+
+
+def test_scheduler_deadline_and_token_price_estimate():
+    now = [0.0]
+    usage = PromptUsage()
+    prices = TokenPrices(prompt=1.0, completion=2.0, cached=0.1)
+    scheduler = BudgetScheduler(RunBudget(deadline_seconds=10), usage, prices, clock=lambda: now[0])
+
+    assert scheduler.admit()
+    usage.record({"prompt_tokens": 1_000_000, "completion_tokens": 500_000, "prompt_tokens_details": {"cached_tokens": 500_000}})
+    now[0] = 4.0
+    scheduler.finish(4.0)
+    assert scheduler.spent() == pytest.approx(0.5 + 0.05 + 1.0)
+    assert scheduler.admit()
+    now[0] = 7.0
+    assert not scheduler.admit()
+    assert scheduler.stop_reason == "deadline"
+
+
+def test_cost_budget_stops_when_cost_is_not_reported():
+    usage = PromptUsage()
+    scheduler = BudgetScheduler(RunBudget(max_cost=1.0), usage)
+
+    assert scheduler.admit()
+    usage.record({"prompt_tokens": 10})
+    scheduler.finish(1.0)
+    assert not scheduler.admit()
+    assert scheduler.stop_reason == "cost_unreported"
+
+    priced = BudgetScheduler(RunBudget(max_cost=1.0), usage, TokenPrices(prompt=1.0, completion=2.0))
+    assert priced.admit()
+
+
+def test_run_pilot_refuses_cost_budget_for_provider_without_cost(tmp_path: Path, monkeypatch):
+    input_path = tmp_path / "input.csv"
+    input_path.write_text("Utterance,Classifier\n一 个 书,个\n", encoding="utf-8")
+    monkeypatch.setenv("LLM_PROVIDER", "lmstudio")
+    monkeypatch.setenv("LM_STUDIO_MODEL", "local-model")
+
+    with pytest.raises(ValueError, match="token prices"):
+        phase3_pilot.run_pilot(
+            input_path, tmp_path / "output.csv", env_path=tmp_path / ".env", budget=RunBudget(max_cost=1.0)
+        )
+
+
+class _CostResponse:
+    status_code = 200
+    headers: dict[str, str] = {}
+
+    def raise_for_status(self) -> None:
+        return None
+
+    def json(self) -> dict[str, object]:
+        content = json.dumps(
+            {
+                "identified_noun": "书",
+                "conventional_classifier": "ben",
+                "conventional_classifier_zh": "本",
+                "classifier_type": "General",
+                "overuse_of_ge": True,
+                "rationale": "Books take ben.",
+                "flag_for_review": False,
+                "flag_reason": "",
+            }
+        )
+        return {"choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 100, "cost": 0.01}}
+
+
+def test_run_pilot_stops_on_budget_and_resumes(tmp_path: Path, monkeypatch):
+    input_path = tmp_path / "input.csv"
+    output_path = tmp_path / "output.csv"
+    with input_path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=["utterance_id", "classifier_token_order", "Utterance", "Classifier"])
+        writer.writeheader()
+        for i in range(5):
+            writer.writerow({"utterance_id": str(i), "classifier_token_order": "1", "Utterance": f"一 个 书{i}", "Classifier": "个"})
+    posts = []
+
+    def fake_post(url, headers, json, timeout):
+        posts.append(json["usage"])
+        return _CostResponse()
+
+    monkeypatch.setattr(phase3_pilot.requests, "post", fake_post)
+    monkeypatch.setenv("OPEN_ROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("MAX_CONCURRENT", "1")
+
+    written = phase3_pilot.run_pilot(
+        input_path, output_path, env_path=tmp_path / ".env", budget=RunBudget(max_cost=0.025)
+    )
+    state = json.loads(state_path_for(output_path).read_text(encoding="utf-8"))
+    assert written == 2
+    assert posts[0] == {"include": True}
+    assert state["stop_reason"] == "budget"
+    assert state["rows_remaining"] == 3
+
+    written = phase3_pilot.run_pilot(input_path, output_path, env_path=tmp_path / ".env", resume=True)
+    with output_path.open("r", encoding="utf-8", newline="") as handle:
+        out = list(csv.DictReader(handle))
+    assert written == 5
+    assert len(posts) == 5
+    assert [row["utterance_id"] for row in out] == ["0", "1", "2", "3", "4"]
+
+
+class _BrokenResponse(_CostResponse):
+    def json(self) -> dict[str, object]:
+        return {"error": "no choices"}
+
+
+def test_run_pilot_keeps_finished_rows_when_a_row_fails(tmp_path: Path, monkeypatch):
+    input_path = tmp_path / "input.csv"
+    output_path = tmp_path / "output.csv"
+    with input_path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=["utterance_id", "classifier_token_order", "Utterance", "Classifier"])
+        writer.writeheader()
+        for i in range(3):
+            writer.writerow({"utterance_id": str(i), "classifier_token_order": "1", "Utterance": f"一 个 书{i}", "Classifier": "个"})
+    broken = {"书1"}
+
+    def fake_post(url, headers, json, timeout):
+        text = json["messages"][-1]["content"]
+        return _BrokenResponse() if any(word in text for word in broken) else _CostResponse()
+
+    monkeypatch.setattr(phase3_pilot.requests, "post", fake_post)
+    monkeypatch.setenv("OPEN_ROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("MAX_CONCURRENT", "1")
+
+    written = phase3_pilot.run_pilot(
+        input_path, output_path, env_path=tmp_path / ".env", budget=RunBudget(max_cost=10.0)
+    )
+    failures = json.loads(failures_path_for(output_path).read_text(encoding="utf-8"))
+    assert written == 2
+    assert failures["rows_failed"] == 1 and failures["failures"][0]["row"] == 1
+    assert "KeyError" in failures["failures"][0]["error"]
+    assert json.loads(state_path_for(output_path).read_text(encoding="utf-8"))["rows_remaining"] == 1
+
+    broken.clear()
+    written = phase3_pilot.run_pilot(input_path, output_path, env_path=tmp_path / ".env", resume=True)
+    assert written == 3
+    assert not failures_path_for(output_path).exists()
@@ -0,0 +1,123 @@
+﻿import json
+
+import pytest
+
+from classifier_pipeline import phase3_pilot
+from classifier_pipeline.phase3_schema import (
+    RESPONSE_KEYS,
+    build_followup_messages,
+    followup_fields,
+    merge_followup,
+    parse_response,
+)
+
+VALID = {
+    "identified_noun": "书",
+    "conventional_classifier": "ben",
+    "conventional_classifier_zh": "本",
+    "classifier_type": "General",
+    "overuse_of_ge": True,
+    "rationale": "Books take ben.",
+    "flag_for_review": False,
+    "flag_reason": "",
+}
+
+
+def test_parse_response_repairs_fence_prose_and_single_item_list():
+    fenced = "```json\n" + json.dumps(VALID, ensure_ascii=False) + "\n```"
+    assert parse_response(fenced).repairs == ["code_fence"]
+
+    prose = json.dumps(VALID, ensure_ascii=False) + "\nNote: {this} is a book."
+    result = parse_response(prose)
+    assert result.value["identified_noun"] == "书"
+    assert result.repairs == ["surrounding_text"]
+
+    listed = json.dumps([VALID, "extra"], ensure_ascii=False)
+    result = parse_response(listed)
+    assert result.invalid == []
+    assert result.repairs == ["single_item_list"]
+
+    with pytest.raises(ValueError):
+        parse_response(json.dumps([VALID, VALID]))
+
+
+def test_parse_response_normalises_and_reports_invalid_fields():
+    data = dict(VALID, conventional_classifier="Tiáo", classifier_type="general", overuse_of_ge="yes")
+    data["identified_noun"] = "shu"
+    del data["flag_for_review"]
+    result = parse_response(json.dumps(data, ensure_ascii=False))
+
+    assert result.value["conventional_classifier"] == "tiao"
+    assert result.value["classifier_type"] == "General"
+    assert result.value["overuse_of_ge"] is True
+    assert result.invalid == ["identified_noun", "flag_for_review"]
+
+
+def test_omitted_noun_fills_classifier_fields_and_skip_ignores_fixed_keys():
+    data = {"identified_noun": "omitted", "overuse_of_ge": False, "flag_for_review": False}
+    result = parse_response(json.dumps(data), skip=frozenset({"classifier_type"}))
+    assert result.invalid == []
+    assert result.value["conventional_classifier_zh"] == "N/A"
+    assert result.value["rationale"] == ""
+
+
+def test_followup_keeps_the_system_turn_and_the_accepted_values():
+    result = parse_response(json.dumps(dict(VALID, classifier_type="Generic"), ensure_ascii=False))
+    fields = followup_fields(result.invalid)
+    system = {"role": "system", "content": [{"type": "text", "text": "rules", "cache_control": {"type": "ephemeral"}}]}
+    messages = build_followup_messages([system, {"role": "user", "content": "Utterance: 一 个 书\n"}], result.value, fields)
+
+    assert fields == ["classifier_type"]
+    assert messages[0] is system and [message["role"] for message in messages] == ["system", "user"]
+    assert messages[1]["content"].startswith("Utterance: 一 个 书\n\nAlready decided")
+    assert '"identified_noun": "书"' in messages[1]["content"]
+    assert '"classifier_type"' not in messages[1]["content"]
+
+    merged = merge_followup(result, '{"classifier_type": "General", "overuse_of_ge": false}', fields)
+    assert merged.invalid == []
+    assert merged.value["overuse_of_ge"] is True
+    assert set(RESPONSE_KEYS) <= set(merged.value)
+
+
+def test_reasked_noun_brings_its_dependent_fields():
+    result = parse_response(json.dumps(dict(VALID, identified_noun="shu"), ensure_ascii=False))
+    fields = followup_fields(result.invalid, fixed=frozenset({"overuse_of_ge"}))
+    assert fields == [
+        "identified_noun",
+        "conventional_classifier",
+        "conventional_classifier_zh",
+        "rationale",
+        "flag_for_review",
+        "flag_reason",
+    ]
+    content = build_followup_messages([{"role": "user", "content": "q"}], result.value, fields)[-1]["content"]
+    assert '"classifier_type": "General"' in content and '"本"' not in content
+
+    merged = merge_followup(result, '{"identified_noun": "图画书", "flag_for_review": false}', fields)
+    assert merged.value["identified_noun"] == "图画书"
+    assert merged.invalid == ["conventional_classifier", "conventional_classifier_zh"]
+
+
+def test_sync_process_row_reasks_the_noun_with_its_dependent_fields(monkeypatch):
+    calls = []
+
+    def fake_send_request(url, headers, payload, max_retries, base_retry_seconds, cancel_event=None):
+        calls.append(payload["messages"])
+        if len(calls) == 1:
+            return json.dumps(dict(VALID, identified_noun="shu"), ensure_ascii=False)
+        return json.dumps({key: VALID[key] for key in VALID if key != "classifier_type"}, ensure_ascii=False)
+
+    monkeypatch.setattr(phase3_pilot, "_send_request", fake_send_request)
+    row = {"Utterance": "一 个 书", "Determiner/Numbers": "一", "Classifier": "个"}
+
+    out = phase3_pilot._sync_process_row(
+        "openrouter", "key", "deepseek/deepseek-v3.2-speciale", "https://example.test", row, 0, 0
+    )
+
+    assert out["identified_noun"] == "书"
+    assert out["conventional_classifier_zh"] == "本"
+    assert len(calls) == 2
+    assert calls[1][0] == calls[0][0]
+    assert calls[1][-1]["content"].startswith(calls[0][-1]["content"].rstrip())
+    assert "shu" not in calls[1][-1]["content"]
+    assert '"classifier_type": "General"' in calls[1][-1]["content"]
@@ -0,0 +1,191 @@
+﻿import csv
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+from classifier_pipeline import phase3_pilot
+from classifier_pipeline.phase3_scheduler import RunBudget, state_path_for
+from classifier_pipeline.phase3_streaming import (
+    JsonObjectScanner,
+    StreamError,
+    consume_chat_stream,
+    iter_sse_data,
+)
+
+
+def _sse(*deltas: str, extra: list[str] | None = None) -> list[str]:
+    lines = [": OPENROUTER PROCESSING"]
+    for delta in deltas:
+        lines.append("data: " + json.dumps({"choices": [{"delta": {"content": delta}}]}))
+        lines.append("")
+    lines.extend(extra or [])
+    lines.append("data: [DONE]")
+    return lines
+
+
+def test_scanner_ignores_braces_inside_strings():
+    scanner = JsonObjectScanner()
+    assert scanner.feed('Sure: {"rationale": "uses } and {') is None
+    assert scanner.feed(' braces \\" here", "a": {"b": 1}') is None
+    assert scanner.feed("} trailing") == '{"rationale": "uses } and { braces \\" here", "a": {"b": 1}}'
+
+
+def test_iter_sse_data_skips_comments_and_stops_at_done():
+    lines = [": keep-alive", "data: {\"a\": 1}", "", "data: [DONE]", "data: {\"b\": 2}"]
+    assert list(iter_sse_data(lines)) == ['{"a": 1}']
+
+
+def test_consume_chat_stream_stops_at_completed_object():
+    consumed = []
+
+    def lines():
+        for line in _sse('{"identified_noun": ', '"书"}', "\n\nextra prose"):
+            consumed.append(line)
+            yield line
+
+    result = consume_chat_stream(lines(), time.monotonic())
+
+    assert result.content == '{"identified_noun": "书"}'
+    assert result.completed_early
+    assert result.ttft_seconds is not None
+    assert not any("extra prose" in line for line in consumed)
+
+
+def test_consume_chat_stream_waits_for_the_usage_chunk():
+    usage = "data: " + json.dumps({"choices": [], "usage": {"prompt_tokens": 9, "cost": 0.01}})
+    lines = _sse('{"a": 1}', " trailing", extra=[usage])
+
+    assert consume_chat_stream(lines, time.monotonic()).usage is None
+    result = consume_chat_stream(lines, time.monotonic(), wait_for_usage=True)
+    assert result.content == '{"a": 1}'
+    assert result.usage == {"prompt_tokens": 9, "cost": 0.01}
+
+
+def test_consume_chat_stream_returns_full_text_and_raises_on_error_event():
+    result = consume_chat_stream(_sse("not ", "json"), time.monotonic())
+    assert result.content == "not json"
+    assert not result.completed_early
+
+    with pytest.raises(StreamError):
+        consume_chat_stream(["data: " + json.dumps({"error": {"message": "overloaded"}})], time.monotonic())
+
+
+class _FakeStreamResponse:
+    def __init__(self, lines: list[str]):
+        self.status_code = 200
+        self.headers: dict[str, str] = {}
+        self.encoding = None
+        self._lines = lines
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self) -> None:
+        return None
+
+    def iter_lines(self, decode_unicode: bool = False):
+        return iter(self._lines)
+
+
+def test_truncated_stream_event_is_retried():
+    streams = [["data: {\"choices\": [{\"delta\": {\"cont"], _sse('{"a": 1}')]
+
+    class _Session:
+        def post(self, url, **kwargs):
+            return _FakeStreamResponse(streams.pop(0))
+
+    with pytest.raises(StreamError):
+        consume_chat_stream(["data: {\"choices\": [{\"delta\": {\"cont"], time.monotonic())
+    content, _ = phase3_pilot._send_request_streaming("u", {}, {}, 1, 0, session=_Session())
+    assert content == '{"a": 1}' and not streams
+
+
+def test_run_pilot_stream_records_ttft_and_request_log(tmp_path: Path, monkeypatch):
+    input_path = tmp_path / "input.csv"
+    output_path = tmp_path / "output.csv"
+    log_path = tmp_path / "requests.jsonl"
+    with input_path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=["utterance_id", "Utterance", "Determiner/Numbers", "Classifier"])
+        writer.writeheader()
+        writer.writerow({"utterance_id": "7", "Utterance": "一 个 书", "Determiner/Numbers": "一", "Classifier": "个"})
+    answer = json.dumps(
+        {
+            "identified_noun": "书",
+            "conventional_classifier": "ben",
+            "conventional_classifier_zh": "本",
+            "classifier_type": "General",
+            "overuse_of_ge": True,
+            "rationale": "Books take ben.",
+            "flag_for_review": False,
+            "flag_reason": "",
+        }
+    )
+    payloads = []
+
+    def fake_post(url, headers, json, timeout, stream=False):
+        payloads.append(json)
+        return _FakeStreamResponse(_sse(answer[:10], answer[10:]))
+
+    monkeypatch.setattr(phase3_pilot.requests, "post", fake_post)
+    monkeypatch.setenv("OPEN_ROUTER_API_KEY", "test-key")
+
+    phase3_pilot.run_pilot(
+        input_path, output_path, env_path=tmp_path / ".env", stream=True, request_log_path=log_path
+    )
+
+    with output_path.open("r", encoding="utf-8", newline="") as handle:
+        out = list(csv.DictReader(handle))
+    entries = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+    assert payloads[0]["stream"] is True
+    assert out[0]["conventional_classifier_zh"] == "本"
+    assert entries[0]["utterance_id"] == "7"
+    assert entries[0]["streamed"] is True
+    assert entries[0]["ttft_seconds"] is not None
+    assert entries[0]["latency_seconds"] is not None
+
+
+def test_run_pilot_stream_stops_on_cost_budget(tmp_path: Path, monkeypatch):
+    input_path = tmp_path / "input.csv"
+    output_path = tmp_path / "output.csv"
+    with input_path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=["utterance_id", "classifier_token_order", "Utterance", "Classifier"])
+        writer.writeheader()
+        for i in range(5):
+            writer.writerow({"utterance_id": str(i), "classifier_token_order": "1", "Utterance": f"一 个 书{i}", "Classifier": "个"})
+    answer = json.dumps(
+        {
+            "identified_noun": "书",
+            "conventional_classifier": "ben",
+            "conventional_classifier_zh": "本",
+            "classifier_type": "General",
+            "overuse_of_ge": True,
+            "rationale": "Books take ben.",
+            "flag_for_review": False,
+            "flag_reason": "",
+        }
+    )
+    usage = "data: " + json.dumps({"choices": [], "usage": {"prompt_tokens": 100, "cost": 0.01}})
+    payloads = []
+
+    def fake_post(url, headers, json, timeout, stream=False):
+        payloads.append(json)
+        return _FakeStreamResponse(_sse(answer, extra=[usage]))
+
+    monkeypatch.setattr(phase3_pilot.requests, "post", fake_post)
+    monkeypatch.setenv("OPEN_ROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("MAX_CONCURRENT", "1")
+
+    written = phase3_pilot.run_pilot(
+        input_path, output_path, env_path=tmp_path / ".env", stream=True, budget=RunBudget(max_cost=0.025)
+    )
+
+    state = json.loads(state_path_for(output_path).read_text(encoding="utf-8"))
+    assert written == 2
+    assert payloads[0]["stream_options"] == {"include_usage": True}
+    assert state["stop_reason"] == "budget"
+    assert state["spent"] == 0.02
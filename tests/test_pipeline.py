@@ -0,0 +1,159 @@
+﻿import threading
+from pathlib import Path
+
+import pytest
+
+from classifier_pipeline.pipeline import (
+    STATUS_CACHED,
+    STATUS_FAILED,
+    STATUS_RAN,
+    STATUS_SKIPPED,
+    STATUS_STALE,
+    Stage,
+    StageCache,
+    default_stages,
+    module_closure,
+    run_pipeline,
+    select_stages,
+    stage_key,
+)
+
+
+def _toy_stages(tmp_path: Path, calls: list[str], params: dict | None = None) -> list[Stage]:
+    source = tmp_path / "source.txt"
+    upper = tmp_path / "upper.txt"
+    count = tmp_path / "count.txt"
+
+    def _upper() -> None:
+        calls.append("upper")
+        upper.write_text(source.read_text(encoding="utf-8").upper(), encoding="utf-8")
+
+    def _count() -> None:
+        calls.append("count")
+        count.write_text(str(len(upper.read_text(encoding="utf-8"))), encoding="utf-8")
+
+    return [
+        Stage("upper", _upper, outputs=[upper], inputs=[source], params=params or {}),
+        Stage("count", _count, outputs=[count], inputs=[upper], deps=["upper"]),
+    ]
+
+
+def test_second_run_is_cached_and_input_change_reruns_downstream(tmp_path):
+    (tmp_path / "source.txt").write_text("abc", encoding="utf-8")
+    cache = StageCache(tmp_path / "cache")
+    calls: list[str] = []
+
+    first = run_pipeline(_toy_stages(tmp_path, calls), cache=cache)
+    assert [r.status for r in first] == [STATUS_RAN, STATUS_RAN]
+
+    second = run_pipeline(_toy_stages(tmp_path, calls), cache=cache)
+    assert [r.status for r in second] == [STATUS_CACHED, STATUS_CACHED]
+    assert calls == ["upper", "count"]
+
+    (tmp_path / "source.txt").write_text("abcd", encoding="utf-8")
+    assert [r.status for r in run_pipeline(_toy_stages(tmp_path, calls), cache=cache, dry_run=True)] == [
+        STATUS_STALE,
+        STATUS_STALE,
+    ]
+    run_pipeline(_toy_stages(tmp_path, calls), cache=cache)
+    assert (tmp_path / "count.txt").read_text(encoding="utf-8") == "4"
+    assert calls == ["upper", "count", "upper", "count"]
+
+
+def test_param_change_forced_stage_and_edited_output_rerun(tmp_path):
+    (tmp_path / "source.txt").write_text("abc", encoding="utf-8")
+    cache = StageCache(tmp_path / "cache")
+    calls: list[str] = []
+    run_pipeline(_toy_stages(tmp_path, calls), cache=cache)
+
+    calls.clear()
+    run_pipeline(_toy_stages(tmp_path, calls, params={"mode": "x"}), cache=cache)
+    # Same upstream output, so the downstream stage stays cached.
+    assert calls == ["upper"]
+
+    calls.clear()
+    run_pipeline(_toy_stages(tmp_path, calls, params={"mode": "x"}), cache=cache, force=["count"])
+    assert calls == ["count"]
+
+    calls.clear()
+    (tmp_path / "count.txt").write_text("tampered", encoding="utf-8")
+    run_pipeline(_toy_stages(tmp_path, calls, params={"mode": "x"}), cache=cache)
+    assert calls == ["count"]
+
+
+def test_independent_stages_run_concurrently(tmp_path):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def _make(name: str) -> Stage:
+        output = tmp_path / f"{name}.txt"
+
+        def _run() -> None:
+            barrier.wait()  # deadlocks (and times out) unless both stages run at once
+            output.write_text(name, encoding="utf-8")
+
+        return Stage(name, _run, outputs=[output])
+
+    results = run_pipeline([_make("a"), _make("b")], cache=StageCache(tmp_path / "cache"), max_workers=2)
+    assert [r.status for r in results] == [STATUS_RAN, STATUS_RAN]
+
+
+def test_failure_skips_dependents_and_is_not_cached(tmp_path):
+    output = tmp_path / "out.txt"
+
+    def _boom() -> None:
+        raise RuntimeError("no database")
+
+    stages = [
+        Stage("extract", _boom, outputs=[output]),
+        Stage("sample", lambda: None, outputs=[tmp_path / "sample.txt"], deps=["extract"]),
+    ]
+    results = run_pipeline(stages, cache=StageCache(tmp_path / "cache"))
+    assert [r.status for r in results] == [STATUS_FAILED, STATUS_SKIPPED]
+    assert "no database" in results[0].error
+    assert not (tmp_path / "cache" / "extract.json").exists()
+
+
+def test_select_stages_orders_dependencies_and_rejects_cycles(tmp_path):
+    stages = [
+        Stage("c", lambda: None, outputs=[], deps=["b"]),
+        Stage("b", lambda: None, outputs=[], deps=["a"]),
+        Stage("a", lambda: None, outputs=[]),
+    ]
+    assert [s.name for s in select_stages(stages, ["c"])] == ["a", "b", "c"]
+    assert [s.name for s in select_stages(stages, ["b"])] == ["a", "b"]
+    with pytest.raises(ValueError):
+        select_stages(stages, ["missing"])
+    stages[2].deps = ["c"]
+    with pytest.raises(ValueError):
+        select_stages(stages, ["c"])
+
+
+def test_default_stages_key_annotation_on_prompt_and_provider(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "openrouter")
+    monkeypatch.setenv("OPENROUTER_MODEL", "model-a")
+    stages = {stage.name: stage for stage in default_stages(["个"], env_path=tmp_path / "missing.env")}
+
+    assert set(stages) == {"phase1_inventory", "phase2_extraction", "phase3_sample", "profile_cubes", "phase3_annotate"}
+    assert not stages["phase1_inventory"].deps and not stages["phase2_extraction"].deps
+    assert stages["profile_cubes"].deps == ["phase2_extraction", "phase3_annotate"]
+    annotate = stages["phase3_annotate"]
+    assert "system_instruction" in annotate.extra
+    assert annotate.params["provider_env"]["OPENROUTER_MODEL"] == "model-a"
+
+
+def test_stage_key_covers_transitively_imported_package_modules(tmp_path, monkeypatch):
+    package = tmp_path / "toypkg"
+    package.mkdir()
+    (package / "__init__.py").write_text("", encoding="utf-8")
+    (package / "entry.py").write_text("from toypkg import helper\n", encoding="utf-8")
+    (package / "helper.py").write_text("def run():\n    from toypkg.deep import VALUE\n", encoding="utf-8")
+    (package / "deep.py").write_text("import json\nVALUE = 1\n", encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    stage = Stage(name="toy", run=lambda: None, outputs=[], code_modules=["toypkg.entry"])
+
+    before = stage_key(stage)
+    (package / "deep.py").write_text("import json\nVALUE = 2\n", encoding="utf-8")
+
+    assert module_closure(["toypkg.entry"]) == ["toypkg.deep", "toypkg.entry", "toypkg.helper"]
+    assert stage_key(stage) != before
+    assert "classifier_pipeline.columns" in module_closure(["classifier_pipeline.phase2_extraction"])